@@ -32,6 +32,7 @@ set PYTHONHOME=%PYDIR%
 mkdir %OUTDIR% 2>NUL
 pyinstaller --specpath=%OUTDIR% --name=archiver --onefile --console archiver.py
 pyinstaller --specpath=%OUTDIR% --name=garchiver --onefile --windowed garchiver.py
+pyinstaller --specpath=%OUTDIR% --name=arcfind --onefile --console arcfind.py
 mv build %OUTDIR% 2>NUL
 mv dist %OUTDIR% 2>NUL
 mv *.log %OUTDIR% 2>NUL
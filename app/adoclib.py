@@ -34,6 +34,15 @@ def format_doc(title, body, date="", author="", add_date=False):
     doc += body
     return doc
 
+def format_section(title, body, level=1):
+    """Formats a document section as Asciidoc.
+    :param title: (str) Title of the section.
+    :param body: (str) Body of the section.
+    :param level: (int) Section level; level 1 sections are the top-level
+        sections of a document.
+    """
+    return "%s %s\n\n%s" % ("=" * (level + 1), title, body)
+
 ##==============================================================#
 ## SECTION: Main Body                                           #
 ##==============================================================#
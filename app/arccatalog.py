@@ -0,0 +1,227 @@
+"""Searchable catalog of archives and their members kept in a local SQLite
+database."""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+##==============================================================#
+## SECTION: Imports                                             #
+##==============================================================#
+
+import json
+import os
+import sqlite3
+import zipfile
+
+import arclib
+import arcscan
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Default path of the catalog database.
+CATALOG = os.path.join(os.path.expanduser("~"), ".arccatalog.db")
+
+#: Statements creating the catalog schema.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL,
+    size INTEGER,
+    ts REAL,
+    name TEXT,
+    log TEXT
+);
+CREATE TABLE IF NOT EXISTS members (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    file_size INTEGER,
+    compress_size INTEGER,
+    crc INTEGER
+);
+CREATE INDEX IF NOT EXISTS members_name ON members(name);
+CREATE INDEX IF NOT EXISTS members_archive ON members(archive_id);
+CREATE INDEX IF NOT EXISTS archives_ts ON archives(ts);
+"""
+
+#: Statement creating the full-text index of the logs, if FTS5 is available.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS logs USING fts5(
+    log, content='archives', content_rowid='id'
+);
+"""
+
+##==============================================================#
+## SECTION: Class Definitions                                   #
+##==============================================================#
+
+class Catalog:
+    """Catalog of archives and their members."""
+
+    def __init__(self, path=CATALOG):
+        #: Path of the catalog database.
+        self.path = path
+        #: Connection to the catalog database.
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        #: True if the logs have a full-text index; otherwise log searches
+        #: fall back to substring matching.
+        self.fts = True
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def close(self):
+        """Closes the catalog database."""
+        self.conn.close()
+
+    def add(self, arcpath):
+        """Adds or updates the record of the archive at the given path.
+
+        :Raises:
+          - OSError or zipfile.BadZipFile if the archive cannot be read.
+        """
+        arcpath = os.path.abspath(arcpath)
+        st = os.stat(arcpath)
+        members, log = scan_archive(arcpath)
+        ts, name = arclib.parse_outname(arcpath)
+        with self.conn:
+            self._remove(arcpath)
+            cur = self.conn.execute(
+                    "INSERT INTO archives (path, mtime, size, ts, name, log) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (arcpath, st.st_mtime, st.st_size, ts, name, log))
+            arcid = cur.lastrowid
+            self.conn.executemany(
+                    "INSERT INTO members (archive_id, name, file_size, "
+                    "compress_size, crc) VALUES (?, ?, ?, ?, ?)",
+                    ((arcid,) + m for m in members))
+            if self.fts:
+                self.conn.execute("INSERT INTO logs (rowid, log) VALUES (?, ?)",
+                        (arcid, log))
+
+    def remove(self, arcpath):
+        """Removes the record of the archive at the given path."""
+        with self.conn:
+            self._remove(os.path.abspath(arcpath))
+
+    def _remove(self, arcpath):
+        """Removes the record of the archive at the given absolute path; must be
+        called within a transaction."""
+        row = self.conn.execute("SELECT id, log FROM archives WHERE path = ?",
+                (arcpath,)).fetchone()
+        if not row:
+            return
+        if self.fts:
+            self.conn.execute(
+                    "INSERT INTO logs (logs, rowid, log) VALUES ('delete', ?, ?)",
+                    row)
+        self.conn.execute("DELETE FROM archives WHERE id = ?", (row[0],))
+
+    def crawl(self, dirs):
+        """Indexes the archives found under the given directories. Archives
+        already recorded with the same modification time and size are not
+        read again, and records of archives no longer present are removed.
+
+        :Returns:
+          - Tuple with the following:
+              - List of archive paths added or updated.
+              - List of tuples of archive paths that could not be read and
+                the error.
+        """
+        known = dict(((p, (m, s)) for p, m, s in self.conn.execute(
+                "SELECT path, mtime, size FROM archives")))
+        updated = []
+        failed = []
+        for d in dirs:
+            d = os.path.abspath(d)
+            seen = set()
+            for path, _ in arclib.walk_systarget(d, nodirs=True):
+                if not path.lower().endswith(".zip"):
+                    continue
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                    if known.get(path) == (st.st_mtime, st.st_size):
+                        continue
+                    self.add(path)
+                    updated.append(path)
+                except (OSError, ValueError, zipfile.BadZipFile,
+                        NotImplementedError) as e:
+                    failed.append((path, e))
+            prefix = os.path.join(d, "")
+            for path in known:
+                if path.startswith(prefix) and path not in seen:
+                    self.remove(path)
+        return (updated, failed)
+
+    def search_logs(self, query, limit=100):
+        """Searches the archive logs. With a full-text index, the query uses the
+        SQLite FTS5 query syntax; otherwise it is matched as a substring.
+
+        :Returns:
+          - List of tuples of archive path, timestamp and name, newest first.
+        """
+        if self.fts:
+            sql = ("SELECT a.path, a.ts, a.name FROM logs JOIN archives a "
+                    "ON a.id = logs.rowid WHERE logs MATCH ? "
+                    "ORDER BY a.ts DESC LIMIT ?")
+        else:
+            sql = ("SELECT path, ts, name FROM archives WHERE log LIKE ? "
+                    "ORDER BY ts DESC LIMIT ?")
+            query = "%" + query + "%"
+        return self.conn.execute(sql, (query, limit)).fetchall()
+
+    def find_members(self, pattern, limit=100):
+        """Finds archive members whose name matches the given glob pattern.
+
+        :Returns:
+          - List of tuples of archive path, member name, file size and CRC,
+            newest archive first.
+        """
+        sql = ("SELECT a.path, m.name, m.file_size, m.crc FROM members m "
+                "JOIN archives a ON a.id = m.archive_id WHERE m.name GLOB ? "
+                "ORDER BY a.ts DESC LIMIT ?")
+        return self.conn.execute(sql, (pattern, limit)).fetchall()
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def scan_archive(arcpath):
+    """Reads the member list and log of the archive at the given path using a
+    single pass over the central directory.
+
+    :Returns:
+      - Tuple with the following:
+          - List of tuples of member name, file size, compressed size and CRC.
+            Deduplicated members are listed with the values of the member
+            holding their content; those whose content member is missing
+            are left out.
+          - (str) The log text or empty if the archive has no log.
+    """
+    lognames = arclib.format_lognames(arcpath)
+    with open(arcpath, "rb") as fo:
+        cdoffset, cdsize, _ = arcscan.find_cdir(fo)
+        entries = dict((e.name, e) for e in arcscan.iter_cdir(fo, cdoffset, cdsize))
+        members = [(e.name, e.file_size, e.compress_size, e.crc)
+                for e in entries.values()]
+        if arclib.DEDUP_INDEX in entries:
+            refs = json.loads(arcscan.read_member(fo, entries[arclib.DEDUP_INDEX]).decode("utf-8"))
+            for name, stored in refs.items():
+                e = entries.get(stored)
+                if not e:
+                    continue
+                members.append((name, e.file_size, e.compress_size, e.crc))
+        log = b""
+        for name in lognames:
+            if name in entries:
+                log = arcscan.read_member(fo, entries[name])
+                break
+    return (members, log.decode("utf-8", "replace"))
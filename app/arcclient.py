@@ -0,0 +1,86 @@
+"""Lightweight client for the archiver server started with `archiver.py
+--serve=SOCKET`. The command line arguments are passed to the server, which
+runs them in a warm process, so short runs do not pay for starting Python and
+importing the archiver. The socket path is taken from the `ARCHIVER_SOCKET`
+environment variable, defaulting to `~/.archiver.sock`. If no server is
+listening, the request is run in this process instead.
+
+Usage:
+  arcclient.py <archiver arguments>...
+"""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+##==============================================================#
+## SECTION: Imports                                             #
+##==============================================================#
+
+# NOTE: Only modules needed to talk to the server are imported here; the
+# archiver itself is imported when no server is listening.
+
+import json
+import os
+import socket
+import sys
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Environment variable holding the path of the server socket.
+SOCKET_ENV = "ARCHIVER_SOCKET"
+
+#: Default path of the server socket.
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".archiver.sock")
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def request(argv, path=None):
+    """Sends the given archiver arguments to the server.
+
+    :Returns:
+      - (dict) Reply holding the `stdout` and `stderr` text and the exit
+        `status` of the request, or None if no server is listening.
+    """
+    path = path or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    with sock:
+        req = {"argv": list(argv), "cwd": os.getcwd()}
+        sock.sendall((json.dumps(req) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as fi:
+            line = fi.readline()
+    if not line:
+        # The request may have partly run, so it is not retried locally.
+        return {"stdout": "", "stderr": "ERROR: No reply from the server.\n",
+                "status": 1}
+    return json.loads(line.decode("utf-8"))
+
+def main():
+    """Runs the archiver request given on the command line."""
+    argv = sys.argv[1:]
+    reply = request(argv)
+    if reply is None:
+        import archiver
+        archiver.main(argv)
+        return
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    sys.exit(reply['status'])
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Filtering of walked paths with gitignore-style patterns. The patterns are
+compiled once so that they can be checked against every entry of a walk, which
+lets excluded directories be pruned rather than walked and discarded."""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+##==============================================================#
+## SECTION: Imports                                             #
+##==============================================================#
+
+import re
+
+##==============================================================#
+## SECTION: Class Definitions                                   #
+##==============================================================#
+
+class PathFilter:
+    """Set of gitignore-style exclusion patterns. Paths are given relative to
+    the walked target using `/` separators. As in gitignore:
+
+      - Blank lines and lines starting with `#` are ignored.
+      - A pattern starting with `!` re-includes paths excluded by an earlier
+        pattern; the last matching pattern decides.
+      - A pattern ending with `/` only matches directories.
+      - A pattern containing a `/` elsewhere is anchored to the target;
+        otherwise it matches the name at any depth.
+      - `*` and `?` do not match `/`, while `**` matches across directories.
+
+    A path inside an excluded directory cannot be re-included since excluded
+    directories are not walked.
+    """
+
+    def __init__(self, patterns=()):
+        #: List of the added patterns.
+        self.patterns = []
+        #: List of rule groups as tuples of the list of regular expressions,
+        #: the negation flag and the directory-only flag. Consecutive patterns
+        #: with the same flags are grouped to be matched by one regular
+        #: expression.
+        self.groups = []
+        #: List of rules as tuples of the compiled regular expression of a
+        #: group and its flags; None until compiled.
+        self._rules = None
+        for p in patterns:
+            self.add(p)
+
+    def __bool__(self):
+        return bool(self.groups)
+
+    def add(self, pattern):
+        """Adds a pattern.
+
+        :Raises:
+          - re.error if the pattern cannot be compiled.
+        """
+        parsed = _parse(pattern)
+        if not parsed:
+            return
+        regex, negate, dironly = parsed
+        re.compile(regex)
+        self.patterns.append(pattern)
+        if self.groups and self.groups[-1][1:] == (negate, dironly):
+            self.groups[-1][0].append(regex)
+        else:
+            self.groups.append(([regex], negate, dironly))
+        self._rules = None
+
+    def load(self, path):
+        """Adds the patterns in the given file, one per line.
+
+        :Raises:
+          - OSError if the file cannot be read.
+        """
+        with open(path) as fi:
+            for line in fi:
+                self.add(line.rstrip("\r\n"))
+
+    def rules(self):
+        """Returns the list of rules as tuples of the compiled regular
+        expression of each group and its flags. Each group is compiled once,
+        when first needed after patterns are added."""
+        rules = self._rules
+        if rules is None:
+            rules = [(re.compile("|".join(r)), negate, dironly)
+                    for r, negate, dironly in self.groups]
+            self._rules = rules
+        return rules
+
+    def excluded(self, relpath, isdir=False):
+        """Returns true if the given relative path is excluded."""
+        for regex, negate, dironly in reversed(self.rules()):
+            if (isdir or not dironly) and regex.fullmatch(relpath):
+                return not negate
+        return False
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def _parse(pattern):
+    """Parses a gitignore-style pattern.
+
+    :Returns:
+      - Tuple of the regular expression matching the whole relative path, the
+        negation flag and the directory-only flag, or None if the pattern is
+        blank or a comment.
+    """
+    # Trailing spaces are ignored unless escaped.
+    pattern = pattern.rstrip(" ")
+    if pattern.endswith("\\"):
+        pattern += " "
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+        pattern = pattern[1:]
+    dironly = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    prefix = "" if anchored else "(?:.*/)?"
+    return ("(?:%s%s)" % (prefix, _translate(pattern)), negate, dironly)
+
+def _translate(pattern):
+    """Translates the glob syntax of a pattern to a regular expression."""
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**", i) and (i == 0 or "/" == pattern[i - 1]):
+            if pattern.startswith("**/", i):
+                # Leading or inner `**/` matches zero or more directories.
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if i + 2 == n:
+                out.append(".*")
+                i += 2
+                continue
+        if "*" == c:
+            out.append("[^/]*")
+        elif "?" == c:
+            out.append("[^/]")
+        elif "[" == c:
+            j = pattern.find("]", i + 2)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                out.append("[%s]" % body.replace("\\", "\\\\"))
+                i = j
+        elif "\\" == c and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
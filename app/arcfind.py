@@ -0,0 +1,108 @@
+"""Utility for searching a catalog of archives.
+
+The catalog is a SQLite database recording the members and
+log of each archive. Archives are added to the catalog by
+crawling directories for them or when created by Archiver
+with the `--catalog` option. Crawling again only reads
+archives that changed since they were last recorded. The
+logs of given archives can also be shown without the
+catalog.
+
+Usage:
+  arcfind [options] crawl DIR...
+  arcfind [options] log QUERY
+  arcfind [options] member PATTERN
+  arcfind [options] show ARCHIVE...
+  arcfind -h | --help
+  arcfind --version
+
+Arguments:
+  DIR       Directory to search for archives.
+  QUERY     Text to search the archive logs for.
+  PATTERN   Glob pattern matched against archive member names.
+  ARCHIVE   Path of an archive whose log is shown.
+
+Options:
+  --catalog=DB   Path of the catalog database.
+  --limit=NUM    Maximum number of results [default: 100].
+  --jobs=NUM     Number of archives read in parallel [default: 8].
+  -h --help      Show this help message and exit.
+  --version      Show version and exit.
+"""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+##==============================================================#
+## SECTION: Imports                                             #
+##==============================================================#
+
+import sqlite3
+import sys
+
+from docopt import docopt
+
+import arccatalog
+import arclib
+from appinfo import ARCHIVER_NAME, ARCHIVER_VER
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Combined application name and version string.
+NAMEVER = "%s %s" % (ARCHIVER_NAME, ARCHIVER_VER)
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+#: Function to print an error message to the console.
+print_error = lambda s: sys.stderr.write("ERROR: " + s)
+
+#: Function to print an warning message to the console.
+print_warning = lambda s: sys.stderr.write("WARNING: " + s)
+
+def show_logs(paths, jobs):
+    """Prints the logs of the archives at the given paths, reading them in
+    parallel."""
+    for path, log in arclib.read_logs(paths, max(jobs, 1)):
+        if isinstance(log, Exception):
+            print_warning("Archive `%s` could not be read: %s\n" % (path, log))
+            continue
+        print("==> %s <==" % path)
+        print(log.decode("utf-8", "replace").rstrip())
+
+def main():
+    """The application main logic."""
+    args = docopt(__doc__, version=NAMEVER)
+    limit = int(args['--limit'])
+    if args['show']:
+        show_logs(args['ARCHIVE'], int(args['--jobs']))
+        return
+    catalog = arccatalog.Catalog(args['--catalog'] or arccatalog.CATALOG)
+    try:
+        if args['crawl']:
+            updated, failed = catalog.crawl(args['DIR'])
+            print("%d archive(s) updated." % len(updated))
+            for path, e in failed:
+                print_warning("Archive `%s` could not be read: %s\n" % (path, e))
+        elif args['log']:
+            for path, ts, _ in catalog.search_logs(args['QUERY'], limit):
+                tstxt = arclib.format_ts(ts) if ts else "-" * 12
+                print("%s  %s" % (tstxt, path))
+        elif args['member']:
+            for path, name, size, _ in catalog.find_members(args['PATTERN'], limit):
+                print("%12d  %s  %s" % (size, path, name))
+    except sqlite3.OperationalError as e:
+        print_error("Catalog query failed! %s\n" % e)
+    finally:
+        catalog.close()
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    main()
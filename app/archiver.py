@@ -13,7 +13,10 @@ name for the archive is not explicitly given, the archive
 name will be based on the name of the first target.
 
 Usage:
-  archiver [options] TARGET...
+  archiver [options] [--exclude=PAT]... TARGET...
+  archiver [options] [--exclude=PAT]... --batch=MANIFEST
+  archiver [options] --extract=DIR [--include=PAT]... [--exclude=PAT]... TARGET...
+  archiver --serve=SOCKET
   archiver -h | --help
   archiver --version
 
@@ -23,13 +26,62 @@ Arguments:
 Options:
   -m LOGMSG         Archive log message.
   --outdir=OUTDIR   Directory to place generated files [default: .].
+  --stdout          Write the archive to standard output instead of OUTDIR.
   --name=NAME       Archive name.
   --no_ts           Do not include timestamp in archive name.
   --short_ts        Only timestamp to the day (hour:min otherwise).
   --long_ts         Timestamp to the second (hour:min otherwise).
+  --append          Add the targets to an existing archive of the same name,
+                    appending to its log; only the new data is written.
   --delete          Delete original targets from file system after archiving.
   --flatten         Flatten directory structure in the zip archive.
   --flatten_ld      Flatten leading directory; only if single directory target.
+  --jobs=JOBS       Number of parallel compression workers [default: 1].
+  --method=METHOD   Compression method (deflate|store|bzip2|lzma)
+                    [default: deflate].
+  --level=LEVEL     Compression level; method default if not given.
+  --sample          Store files whose leading block does not compress.
+  --chunk_size=N    Size in bytes of reads from target files [default: 1048576].
+  --mmap            Read target files by memory mapping them.
+  --nocache         Drop target file pages from the OS page cache once read.
+  --volume_size=N   Split the archive into volumes of at most N bytes each; N
+                    may end with K, M or G and must be at least 256K, more
+                    for a log message over about 64K. A master log listing
+                    the members of each volume is written next to them.
+  --walk_cache=F    Cache directory listings in file F so later runs skip
+                    reading directories that are unchanged.
+  --manifest        Store a content manifest for later incremental archives.
+  --base=ARCHIVE    Only archive targets new or changed since the given archive.
+  --dedup           Store files with identical content only once.
+  --catalog=DB      Record the created archive in the given catalog database.
+  --progress        Show creation progress on standard error.
+  --stats_json=OUT  Write creation statistics as JSON to the given file, or
+                    the plan if planning.
+  --plan            Report the files, estimated archive size and creation
+                    time without creating the archive.
+  --batch=MANIFEST  Create the archives listed in a JSON lines or CSV manifest;
+                    options given apply to every archive.
+  --workers=NUM     Number of archives created in parallel [default: 1].
+  --snapshot=OUT    Rebuild a full archive at OUT from the incremental archive
+                    TARGET instead of creating an archive.
+  --verify          Verify the archives TARGET instead of creating an archive.
+  --srcdir=DIR      Also check verified members against the files under DIR.
+  --no_verify       Do not verify the archive before deleting the targets.
+  --extract=DIR     Extract the archives TARGET into DIR instead of creating an
+                    archive.
+  --include=PAT     Only extract members matching a glob, or a regular
+                    expression if prefixed with `re:`; may be repeated.
+  --exclude=PAT     Leave out paths matching a gitignore-style pattern when
+                    archiving, or members matching PAT when extracting; may be
+                    repeated.
+  --exclude_from=F  Leave out paths matching the gitignore-style patterns in
+                    file F when archiving.
+  --with_log        Also extract the archive log.
+  --overwrite       Overwrite existing files when extracting.
+  --resume          Journal progress so an interrupted creation can be resumed
+                    by running the same command again.
+  --serve=SOCKET    Serve archiver requests on the Unix socket SOCKET from one
+                    warm process; see `arcclient.py`.
   -h --help         Show this help message and exit.
   --version         Show version and exit.
 """
@@ -42,8 +94,11 @@ Options:
 ## SECTION: Imports                                             #
 ##==============================================================#
 
+import json
 import os
+import stat
 import sys
+import time
 
 from docopt import docopt
 
@@ -57,6 +112,34 @@ from appinfo import ARCHIVER_NAME, ARCHIVER_VER
 #: Combined application name and version string.
 NAMEVER = "%s %s" % (ARCHIVER_NAME, ARCHIVER_VER)
 
+#: Minimum seconds between progress lines printed to the console.
+PROGRESS_INTERVAL = 0.5
+
+##==============================================================#
+## SECTION: Class Definitions                                   #
+##==============================================================#
+
+class ProgressPrinter:
+    """Prints archive creation progress to standard error, at most once per
+    ``PROGRESS_INTERVAL`` within a phase. The start and end of each phase
+    are always printed."""
+
+    def __init__(self):
+        #: Time the last progress line was printed.
+        self.last = 0.0
+        #: Phase of the last progress line printed.
+        self.phase = ""
+
+    def __call__(self, progress):
+        now = time.perf_counter()
+        if (not progress.ended and progress.phase == self.phase and
+                now - self.last < PROGRESS_INTERVAL):
+            return
+        self.last = now
+        self.phase = progress.phase
+        sys.stderr.write(format_progress(progress) + "\n")
+        sys.stderr.flush()
+
 ##==============================================================#
 ## SECTION: Function Definitions                                #
 ##==============================================================#
@@ -67,6 +150,31 @@ print_error = lambda s: sys.stderr.write("ERROR: " + s)
 #: Function to print an warning message to the console.
 print_warning = lambda s: sys.stderr.write("WARNING: " + s)
 
+def parse_size(text):
+    """Parses a size in bytes that may end with a K, M or G suffix for
+    KiB, MiB or GiB."""
+    text = text.strip().upper()
+    for power, suffix in enumerate("KMG", 1):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * 1024 ** power)
+    return int(text)
+
+def format_progress(progress):
+    """Formats a line describing the given ``arcmgr.Progress``."""
+    line = "%-8s %d" % (progress.phase, progress.files_done)
+    if progress.files_total:
+        line += "/%d" % progress.files_total
+    line += " files"
+    if progress.bytes_total:
+        line += ", %s/%s, %s/s" % (
+                arcmgr.format_size(progress.bytes_done),
+                arcmgr.format_size(progress.bytes_total),
+                arcmgr.format_size(progress.rate()))
+    eta = progress.eta()
+    if eta is not None:
+        line += ", ETA %d:%02d" % divmod(int(eta), 60)
+    return line
+
 def parse_args(args):
     """Parses command line arguments into a UtilData object."""
     arcctr = arcmgr.ArcCreator()
@@ -80,20 +188,253 @@ def parse_args(args):
     elif args['--no_ts']:
         arcctr.ts_style = "none"
     arcctr.delete = args['--delete']
+    arcctr.append = args['--append']
+    if args['--volume_size']:
+        arcctr.volume_size = parse_size(args['--volume_size'])
     arcctr.flatten = args['--flatten']
     arcctr.flatten_ld = args['--flatten_ld']
     arcctr.outdir = args['--outdir']
+    if args['--stdout']:
+        arcctr.stream = sys.stdout.buffer
+    arcctr.jobs = int(args['--jobs'])
+    arcctr.policy.method = args['--method']
+    if args['--level']:
+        arcctr.policy.level = int(args['--level'])
+    arcctr.policy.sample = args['--sample']
+    arcctr.reader.chunk_size = int(args['--chunk_size'])
+    arcctr.reader.use_mmap = args['--mmap']
+    arcctr.reader.nocache = args['--nocache']
+    arcctr.manifest = args['--manifest']
+    arcctr.basearc = args['--base']
+    arcctr.dedup = args['--dedup']
+    arcctr.catalog = args['--catalog']
+    arcctr.verify = not args['--no_verify']
+    arcctr.resume = args['--resume']
+    arcctr.exclude = args['--exclude']
+    arcctr.exclude_from = args['--exclude_from']
+    arcctr.walk_cache = args['--walk_cache']
+    if args['--progress']:
+        arcctr.on_progress = ProgressPrinter()
     return arcctr
 
-def main():
-    """The application main logic."""
-    args = docopt(__doc__, version=NAMEVER)
+def plan(args):
+    """Plans the archive creation without writing it, printing the
+    estimates."""
+    arcctr = parse_args(args)
+    result = arcctr.plan()
+    if result is None:
+        print_error("Archive could not be planned! %s" % arcctr.errmsg)
+        return
+    print("Archive:    %s" % result['outname'])
+    print("Files:      %d (%d directories)" % (result['files'], result['dirs']))
+    print("Size:       %s" % arcmgr.format_size(result['bytes_in']))
+    print("Estimated:  %s from %d sampled files" % (
+            arcmgr.format_size(result['est_bytes_out']),
+            result['sampled_files']))
+    print("Duration:   %d:%02d" % divmod(int(result['est_seconds']), 60))
+    if "volumes" in result:
+        print("Volumes:    %d" % result['volumes'])
+    for w in arcctr.warnmsgs:
+        print_warning(w)
+    if result['notfound']:
+        print_warning("Some system targets not found.")
+    if args['--stats_json']:
+        with open(args['--stats_json'], "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+def snapshot(args):
+    """Rebuilds a full archive from an incremental archive chain."""
+    builder = arcmgr.SnapshotBuilder(args['TARGET'][0], args['--snapshot'])
+    if not builder.build():
+        print_error("Snapshot could not be built! %s" % builder.errmsg)
+    if builder.missing:
+        print_warning("Some manifest members not found in archive chain.")
+
+def verify(args):
+    """Verifies archives, printing each member that fails. Exits with status 1
+    if any archive fails."""
+    anyfailed = False
+    for path in args['TARGET']:
+        failed = arcmgr.verify_archive(path, jobs=int(args['--jobs']),
+                srcdir=args['--srcdir'])
+        for f in failed:
+            print_error("%s: %s %s\n" % (path, f.name, f.reason))
+        print("%s: %s" % (path, "FAILED" if failed else "OK"))
+        anyfailed = anyfailed or bool(failed)
+    if anyfailed:
+        sys.exit(1)
+
+def extract(args):
+    """Extracts archives, printing each member that could not be
+    extracted."""
+    for path in args['TARGET']:
+        arcext = arcmgr.ArcExtractor(path, args['--extract'])
+        arcext.include = args['--include']
+        arcext.exclude = args['--exclude']
+        arcext.with_log = args['--with_log']
+        arcext.overwrite = args['--overwrite']
+        arcext.jobs = int(args['--jobs'])
+        ok = arcext.extract()
+        for f in arcext.failed:
+            print_error("%s: %s %s\n" % (path, f.name, f.reason))
+        if arcext.skipped:
+            print_warning("%s: %d existing file(s) skipped.\n" % (
+                    path, len(arcext.skipped)))
+        if not ok:
+            print_error("%s: Archive could not be extracted! %s\n" % (
+                    path, arcext.errmsg))
+        else:
+            print("%s: %d member(s) extracted." % (path, len(arcext.extracted)))
+
+def batch(args):
+    """Creates the archives of a batch manifest, printing a JSON result record
+    per archive."""
+    arcbatch = arcmgr.ArcBatch()
+    arcbatch.workers = int(args['--workers'])
+    if not arcbatch.load(args['--batch'], factory=lambda: parse_args(args)):
+        print_error(arcbatch.errmsg)
+        return
+    for arcctr, ok in arcbatch.run():
+        print(json.dumps(arcmgr.format_result(arcctr, ok)))
+        sys.stdout.flush()
+    if arcbatch.failed:
+        print_error("%d archive(s) could not be created!" %
+                len(arcbatch.failed))
+
+def serve(path):
+    """Serves archiver requests on the Unix socket at the given path until
+    interrupted or terminated. Each connection sends one JSON line holding the
+    command line arguments and working directory of a request, and receives
+    one JSON line holding its output and exit status. Requests are handled one
+    at a time since each changes the working directory of the process."""
+    import signal
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        print_error("Unix sockets are not supported on this platform.\n")
+        return
+    try:
+        # Only a socket left behind by a previous server is replaced.
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+    except OSError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The socket is only accessible to the user running the server.
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+        server.listen()
+    except OSError as e:
+        server.close()
+        print_error("Could not serve on `%s`! %s\n" % (path, e))
+        return
+    finally:
+        os.umask(umask)
+    # Terminating the server removes the socket; a request in progress is
+    # finished and replied to first.
+    accepting = False
+    stopping = False
+    def terminate(signum, frame):
+        nonlocal stopping
+        if accepting:
+            raise KeyboardInterrupt()
+        stopping = True
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        while not stopping:
+            accepting = True
+            conn, _ = server.accept()
+            accepting = False
+            with conn:
+                with conn.makefile("rb") as fi:
+                    line = fi.readline()
+                reply = handle_request(line)
+                conn.sendall((json.dumps(reply) + "\n").encode("utf-8"))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(path)
+
+def handle_request(line):
+    """Runs the archiver request in the given JSON line.
+
+    :Returns:
+      - (dict) Reply holding the captured `stdout` and `stderr` text and the
+        exit `status`.
+    """
+    import contextlib
+    import io
+    import traceback
+    out = io.StringIO()
+    err = io.StringIO()
+    status = 0
+    try:
+        request = json.loads(line.decode("utf-8"))
+        argv = [str(a) for a in request['argv']]
+        cwd = request.get('cwd') or os.getcwd()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return _reply("", "ERROR: Malformed request.\n", 2)
+    if any(a.startswith(("--stdout", "--serve")) for a in argv):
+        return _reply("", "ERROR: Option not supported by the server.\n", 2)
+    prevcwd = os.getcwd()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            os.chdir(cwd)
+            main(argv)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                status = e.code
+            elif e.code is not None:
+                err.write("%s\n" % e.code)
+                status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os.chdir(prevcwd)
+    return _reply(out.getvalue(), err.getvalue(), status)
+
+def _reply(stdout, stderr, status):
+    """Returns a server reply holding the given output and exit status."""
+    return {"stdout": stdout, "stderr": stderr, "status": status}
+
+def main(argv=None):
+    """The application main logic. The command line arguments are taken from
+    `sys.argv` unless given."""
+    args = docopt(__doc__, argv=argv, version=NAMEVER)
+    if args['--serve']:
+        serve(args['--serve'])
+        return
+    if args['--snapshot']:
+        snapshot(args)
+        return
+    if args['--batch']:
+        batch(args)
+        return
+    if args['--verify']:
+        verify(args)
+        return
+    if args['--extract']:
+        extract(args)
+        return
+    if args['--plan']:
+        plan(args)
+        return
     arcctr = parse_args(args)
     if not arcctr.create_archive():
         print_error("Archive could not be created! %s" % arcctr.errmsg)
+        for f in arcctr.verifyfail:
+            print_error("%s %s\n" % (f.name, f.reason))
     if arcctr.warnmsgs:
         for w in arcctr.warnmsgs:
             print_warning(w)
+    if args['--progress'] and arcctr.stats.get('peak_rss'):
+        sys.stderr.write("Peak memory %s\n" %
+                arcmgr.format_size(arcctr.stats['peak_rss']))
+    if args['--stats_json']:
+        with open(args['--stats_json'], "w") as f:
+            json.dump(arcctr.stats, f, indent=2, sort_keys=True)
 
 ##==============================================================#
 ## SECTION: Main Body                                           #
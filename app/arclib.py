@@ -8,12 +8,30 @@
 ## SECTION: Imports                                             #
 ##==============================================================#
 
+# NOTE: Modules only some operations need are imported where used, to keep
+# the startup of short runs fast.
+
+import bz2
+import collections
 import datetime
+import errno
+import heapq
+import json
 import os
-import shutil
+import stat
+import sys
+import threading
 import time
 import zipfile
-from zipfile import ZIP_STORED, ZIP_DEFLATED
+import zlib
+from zipfile import ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+
+import arcscan
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 ##==============================================================#
 ## SECTION: Global Definitions                                  #
@@ -22,6 +40,93 @@ from zipfile import ZIP_STORED, ZIP_DEFLATED
 #: Default filename for the archive log.
 LOGNAME = "__arc_info__.txt"
 
+#: Filename of the archive log used by older versions.
+LEGACY_LOGNAME = "__archive_info__.txt"
+
+#: Filename of the archive content manifest. The manifest records the size,
+#: modification time and CRC of every archived target so that later
+#: incremental archives only need to contain what changed.
+MANIFEST = "__arc_manifest__.json"
+
+#: Filename of the archive deduplication index. The index maps member names
+#: whose content is identical to another member to the name of that member;
+#: only the latter is stored.
+DEDUP_INDEX = "__arc_dedup__.json"
+
+#: Size in bytes of reads from system target files.
+CHUNK_SIZE = 1024 * 1024
+
+#: Files larger than this size in bytes are not compressed by the parallel
+#: workers since their compressed data would be held in memory until written;
+#: they are streamed into the archive in order instead.
+PARALLEL_MAX_SIZE = 64 * 1024 * 1024
+
+#: Maximum total size in bytes of the files being compressed by the parallel
+#: workers or waiting to be written, whatever the number of workers.
+PARALLEL_BUDGET = 64 * 1024 * 1024
+
+#: Zip compression methods by name.
+METHODS = {
+        "store": ZIP_STORED,
+        "deflate": ZIP_DEFLATED,
+        "bzip2": ZIP_BZIP2,
+        "lzma": ZIP_LZMA,
+    }
+
+#: Valid compression levels by method name; the other methods ignore the level.
+LEVELS = {
+        "deflate": range(0, 10),
+        "bzip2": range(1, 10),
+    }
+
+#: Extensions of file types that are already compressed. Compressing these
+#: again costs CPU time and rarely makes them smaller so they are stored.
+STORE_EXTS = frozenset([
+        ".7z", ".aac", ".avi", ".bz2", ".cab", ".docx", ".flac", ".gif", ".gz",
+        ".jar", ".jpeg", ".jpg", ".lz", ".lzma", ".m4a", ".mkv", ".mov",
+        ".mp3", ".mp4", ".ogg", ".pdf", ".png", ".pptx", ".rar", ".tbz2",
+        ".tgz", ".txz", ".webm", ".webp", ".xlsx", ".xz", ".zip", ".zst",
+    ])
+
+#: Size in bytes of the leading block of a file sampled to estimate whether
+#: it is compressible.
+SAMPLE_SIZE = 64 * 1024
+
+#: Sampled blocks that do not compress below this ratio are stored.
+SAMPLE_RATIO = 0.95
+
+#: Default maximum number of entries held by a walk cache.
+WALK_CACHE_SIZE = 1000000
+
+#: Directory listings are not cached if the directory was modified within
+#: this many seconds of being read, since a later change within the same
+#: modification time granularity would go unnoticed.
+WALK_CACHE_RACY = 2.0
+
+#: Bytes of each volume reserved for its log and central directory end
+#: records when packing targets into volumes, besides the log message.
+VOLUME_RESERVE = 64 * 1024
+
+#: Worst-case expansion of incompressible data by each compression method name,
+#: as tuples of the divisor of the data size and the constant bytes added. The
+#: bzip2 bound is the one documented by libbzip2; lzma has no documented bound
+#: and expands random data by about 1.4%.
+EXPANSION = {
+        "store": (0, 0),
+        "deflate": (1000, 64),
+        "bzip2": (100, 600),
+        "lzma": (32, 1024),
+    }
+
+#: A system target that could not be deleted and the error (OSError) why.
+DeleteFailure = collections.namedtuple("DeleteFailure", "path error")
+
+#: An archive member that failed verification and a message describing why.
+VerifyFailure = collections.namedtuple("VerifyFailure", "name reason")
+
+#: An archive member that could not be extracted and a message describing why.
+ExtractFailure = collections.namedtuple("ExtractFailure", "name reason")
+
 ##==============================================================#
 ## SECTION: Class Definitions                                   #
 ##==============================================================#
@@ -33,56 +138,72 @@ class Archive:
         self.path = path
         #: Zip file object of the archive.
         self.zfile = None
+        #: Index of member names in the archive. This is kept in sync with the
+        #: zip file so membership checks do not need to rebuild the name list.
+        #: A dict is used as an insertion-ordered set.
+        self.index = {}
+        #: Policy choosing the compression of added members.
+        self.policy = CompressionPolicy()
+        #: Maps names of deduplicated members to the name of the stored member
+        #: holding their content. These names are also in the index.
+        self.refs = {}
+        #: Reader of the added files.
+        self.reader = SourceReader()
 
         # Open archive zip file if already exists.
         if self.exists():
             self.zfile = zipfile.ZipFile(self.path, "a")
+            self.index = dict.fromkeys(self.zfile.namelist())
+            self.refs = read_dedup_index(self.zfile)
+            self.index.update(dict.fromkeys(self.refs))
 
     def exists(self):
         """Returns true if the archive file exists on the filesystem, false
         otherwise.
         """
-        return os.path.exists(self.path)
+        return bool(self.path) and os.path.exists(self.path)
 
-    def create(self, compressed=True):
+    def create(self, compressed=True, policy=None, stream=None):
         """Creates the archive file on the filesystem.
 
+        :param compressed: (bool) If false, all members will be stored
+            uncompressed. Ignored if a policy is given.
+        :param policy: (CompressionPolicy) Policy choosing the compression of
+            each added member.
+        :param stream: File object to write the archive to instead of the
+            archive path. The stream does not need to be seekable; members are
+            then followed by data descriptors.
+
         :Postconditions:
           - If the archive file already existed, it will not be overwritten.
         """
-        if self.exists():
+        if self.exists() and not stream:
             return
-        compression = ZIP_STORED
-        if compressed:
-            compression = ZIP_DEFLATED
-        self.zfile = zipfile.ZipFile(self.path, "w", compression=compression)
+        if policy:
+            self.policy = policy
+        elif not compressed:
+            self.policy = CompressionPolicy("store")
+        compression = METHODS[self.policy.method]
+        self.zfile = zipfile.ZipFile(stream or self.path, "w", compression=compression)
+
+    def close(self):
+        """Closes the archive, writing the central directory if the archive was
+        modified."""
+        if self.zfile:
+            self.zfile.close()
 
     def contents(self):
         """Returns a list of archive contents."""
         if not self.zfile:
             return []
-        return self.zfile.namelist()
+        return list(self.index)
 
     def logname(self):
         """Returns the archives log filename, if any."""
-        # Determine the base name of the archive and derivatives in case
-        # default log does not exist.
-        base = os.path.splitext(os.path.basename(self.path))[0]
-        base_txt = base + ".txt"
-        base_log = base + ".log"
-        base_md = base + ".md"
-
-        log = ""
-        c = self.contents()
-        if LOGNAME in c:
-            log = LOGNAME
-        elif base_txt in c:
-            log = base_txt
-        elif base_log in c:
-            log = base_log
-        elif base_md in c:
-            log = base_md
-        return log
+        for log in format_lognames(self.path):
+            if log in self.index:
+                return log
+        return ""
 
     def read_log(self):
         """Returns the text from the archive log, if one exists."""
@@ -91,11 +212,20 @@ class Archive:
             return self.zfile.read(log)
         return ""
 
+    def read(self, name):
+        """Returns the content of the given member, resolving deduplicated
+        members to the member storing their content."""
+        return self.zfile.read(self.refs.get(name, name))
+
     def add(self, arctarget):
         """Adds an archiver target to the archive.
 
         :Returns:
           - (bool) True if the target was successfully added, false otherwise.
+
+        :Raises:
+          - OSError if the target exists but cannot be read; no member is left
+            in the archive.
         """
         if not self.zfile:
             return False
@@ -105,20 +235,481 @@ class Archive:
             return False
         if not os.path.exists(arctarget.syspath):
             return False
-        if arctarget.zippath in self.contents():
+        zipname = format_zipname(arctarget.syspath, arctarget.zippath, arctarget.isdir)
+        if zipname in self.index:
             return False
+        compression, level = self.policy.choose(arctarget.syspath)
+        if zipname.endswith("/"):
+            self.zfile.write(arctarget.syspath, arctarget.zippath,
+                    compress_type=compression, compresslevel=level)
         else:
-            self.zfile.write(arctarget.syspath, arctarget.zippath)
+            # NOTE: Files are copied through the reader rather than by
+            # `ZipFile.write()` so the read size and caching are controlled;
+            # memory use is bounded by the chunk size regardless of file size.
+            # The file is opened before the member so one that cannot be opened
+            # writes nothing; one that vanished since the walk is not added.
+            try:
+                zinfo = zipfile.ZipInfo.from_file(arctarget.syspath, arctarget.zippath)
+                fi = self.reader.open(arctarget.syspath)
+            except FileNotFoundError:
+                return False
+            zinfo.compress_type = compression
+            zinfo._compresslevel = level
+            with fi:
+                try:
+                    with self.zfile.open(zinfo, "w") as dest:
+                        self.reader.copy_from(fi, dest.write)
+                except BaseException:
+                    # A read error partway commits a truncated member, which
+                    # is taken out again.
+                    self.drop([zinfo.filename])
+                    raise
+        self.index[zipname] = None
+        return True
+
+    def drop(self, names):
+        """Takes the given members out of the archive. Their data is left in
+        place as unused space, except for members at the end of a seekable
+        archive, which are overwritten by the members added next. Only the
+        central directory is rewritten when the archive is closed.
+
+        :param names: List of member names; names not in the archive are
+            ignored.
+
+        :Returns:
+          - (bool) True if the members were dropped, false otherwise.
+        """
+        if not self.zfile or "r" == self.zfile.mode:
+            return False
+        infos = [self.zfile.NameToInfo[n] for n in names
+                if n in self.zfile.NameToInfo]
+        with self.zfile._lock:
+            for info in sorted(infos, key=lambda i: i.header_offset, reverse=True):
+                self.zfile.filelist.remove(info)
+                del self.zfile.NameToInfo[info.filename]
+                self.index.pop(info.filename, None)
+                if (self.zfile._seekable and all(i.header_offset < info.header_offset
+                        for i in self.zfile.filelist)):
+                    self.zfile.start_dir = info.header_offset
+            self.zfile._didModify = True
+        return True
+
+    def add_text(self, zippath, text):
+        """Adds a member containing the given text to the archive.
+
+        :Returns:
+          - (bool) True if the member was successfully added, false otherwise.
+        """
+        if not self.zfile:
+            return False
+        if zippath in self.index:
+            return False
+        self.zfile.writestr(zippath, text)
+        self.index[zippath] = None
+        return True
+
+    def hint(self, name):
+        """Records the offset of the given member in the archive comment so
+        readers can locate it without scanning the central directory (see
+        ``arcscan.find_member()``).
+
+        :Returns:
+          - (bool) True if the hint was recorded, false otherwise.
+        """
+        if not self.zfile or name not in self.zfile.NameToInfo:
+            return False
+        offset = self.zfile.getinfo(name).header_offset
+        self.zfile.comment = arcscan.format_hint(offset)
+        return True
+
+    def add_ref(self, arctarget, name):
+        """Adds an archiver target whose content is identical to an existing
+        member as a reference to that member rather than storing it again.
+
+        :param name: (str) Name of the member holding the content.
+
+        :Returns:
+          - (bool) True if the reference was successfully added, false
+            otherwise.
+        """
+        if not self.zfile:
+            return False
+        zipname = format_zipname(arctarget.syspath, arctarget.zippath, arctarget.isdir)
+        if zipname in self.index or name not in self.index:
+            return False
+        self.refs[zipname] = self.refs.get(name, name)
+        self.index[zipname] = None
+        return True
+
+    def add_dedup_index(self):
+        """Adds the deduplication index to the archive if any references were
+        added.
+
+        :Returns:
+          - (bool) True if the index was added or not needed, false otherwise.
+        """
+        if not self.refs:
+            return True
+        text = json.dumps(self.refs, separators=(",", ":"))
+        return self.add_text(DEDUP_INDEX, text)
+
+    def add_all(self, arctargets, jobs=1):
+        """Adds the given archiver targets to the archive. If more than one job
+        is requested, file members are compressed in a pool of worker threads
+        (zlib releases the GIL) and then written to the archive sequentially
+        in the given order.
+
+        :param arctargets: List of archiver targets.
+        :param jobs: (int) Number of worker threads used for compression.
+
+        :Returns:
+          - Generator of tuples, in the order of the given targets, with the
+            following:
+              - The archiver target.
+              - (bool) True if the target was successfully added, false
+                otherwise.
+        """
+        if jobs <= 1 or not self.zfile:
+            for a in arctargets:
+                yield (a, self.add(a))
+            return
+
+        # NOTE: The members in flight are bounded both in number and in total
+        # size (``PARALLEL_BUDGET``), so the memory held by compressed data
+        # waiting to be written does not grow with the number of jobs or
+        # targets. Each pending entry holds its target, future and file size.
+        pending = collections.deque()
+        inflight = 0
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for a in arctargets:
+                future = None
+                size = 0
+                if a.zippath and a.syspath and not a.isdir:
+                    try:
+                        st = os.stat(a.syspath)
+                    except OSError:
+                        st = None
+                    if st and stat.S_ISREG(st.st_mode) and st.st_size <= PARALLEL_MAX_SIZE:
+                        size = st.st_size
+                        while pending and inflight + size > PARALLEL_BUDGET:
+                            done, future, nbytes = pending.popleft()
+                            inflight -= nbytes
+                            yield self._add_pending(done, future)
+                        future = pool.submit(_compress_file, a.syspath,
+                                a.zippath, self.policy, self.reader)
+                        inflight += size
+                pending.append((a, future, size))
+                if len(pending) > 2 * jobs:
+                    done, future, nbytes = pending.popleft()
+                    inflight -= nbytes
+                    yield self._add_pending(done, future)
+            while pending:
+                done, future, _ = pending.popleft()
+                yield self._add_pending(done, future)
+
+    def _add_pending(self, arctarget, future):
+        """Adds an archiver target queued by ``add_all()``. Targets without a
+        future were not compressed by a worker and are added directly.
+
+        :Returns:
+          - Tuple of the archiver target and the add result.
+        """
+        if not future:
+            return (arctarget, self.add(arctarget))
+        compressed = future.result()
+        if not compressed:
+            return (arctarget, False)
+        zinfo, data = compressed
+        if zinfo.filename in self.index:
+            return (arctarget, False)
+        self._write_compressed(zinfo, data)
+        self.index[zinfo.filename] = None
+        return (arctarget, True)
+
+    def restore(self, zinfos, end):
+        """Restores the given members of a partially written archive whose
+        central directory was never written. The archive file is truncated
+        after the last member so members added next follow it.
+
+        :param zinfos: List of ``ZipInfo`` objects of the members committed
+            to the archive file (see ``read_journal()``).
+        :param end: (int) Offset just past the data of the last member.
+        """
+        zf = self.zfile
+        zf.filelist = []
+        zf.NameToInfo = {}
+        self.index = {}
+        self.refs = {}
+        zf.fp.seek(end)
+        zf.fp.truncate()
+        zf.start_dir = end
+        zf._didModify = True
+        for zinfo in zinfos:
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+            self.index[zinfo.filename] = None
+
+    def _write_compressed(self, zinfo, data):
+        """Writes an already compressed member to the archive. The CRC and
+        sizes must already be set on the given ``ZipInfo``, so the local header
+        is written once and no data descriptor is needed.
+        """
+        # NOTE: The zipfile module does not provide a public API for writing
+        # pre-compressed data; this mirrors what `ZipFile.mkdir()` and
+        # `ZipFile.open(mode="w")` do internally.
+        zf = self.zfile
+        with zf._lock:
+            if zf._seekable:
+                zf.fp.seek(zf.start_dir)
+            zinfo.header_offset = zf.fp.tell()
+            if ZIP_LZMA == zinfo.compress_type:
+                # Compressed data includes an end-of-stream marker.
+                zinfo.flag_bits |= 0x02
+            zf._writecheck(zinfo)
+            zf._didModify = True
+            zf.fp.write(zinfo.FileHeader(False))
+            zf.fp.write(data)
+            zf.start_dir = zf.fp.tell()
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+
+class SourceReader:
+    """Reads system target files in chunks into reusable buffers, so memory use
+    does not grow with the file size. Can hint the operating system that files
+    are read sequentially and once, so archiving does not evict the page cache
+    of other processes."""
+    def __init__(self, chunk_size=CHUNK_SIZE, use_mmap=False, nocache=False):
+        #: Size in bytes of each read.
+        self.chunk_size = chunk_size
+        #: True if files should be memory mapped instead of read into a
+        #: buffer; the chunk size is then rounded up to the mapping
+        #: granularity. Mapped pages count toward the resident memory unless
+        #: ``nocache`` is also set.
+        self.use_mmap = use_mmap
+        #: True if file pages should be dropped from the page cache once read;
+        #: only where ``os.posix_fadvise()`` is available.
+        self.nocache = nocache
+        #: Per-thread reusable read buffers.
+        self._local = threading.local()
+
+    def open(self, syspath):
+        """Opens the given file to be read by ``copy_from()``, hinting that it
+        is read sequentially.
+
+        :Returns:
+          - Unbuffered binary file object.
+
+        :Raises:
+          - OSError if the file cannot be opened.
+        """
+        fi = open(syspath, "rb", buffering=0)
+        _fadvise(fi.fileno(), 0, 0, "POSIX_FADV_SEQUENTIAL")
+        return fi
+
+    def copy(self, syspath, write):
+        """Reads the given file in chunks, passing each to the given write
+        function. A chunk is only valid during the call and must be copied if
+        kept.
+
+        :Returns:
+          - (int) Number of bytes read.
+
+        :Raises:
+          - OSError if the file cannot be opened or read.
+        """
+        with self.open(syspath) as fi:
+            return self.copy_from(fi, write)
+
+    def copy_from(self, fi, write):
+        """Reads the given file object returned by ``open()`` in chunks; see
+        ``copy()``."""
+        fd = fi.fileno()
+        if self.use_mmap:
+            size = os.fstat(fd).st_size
+            if size:
+                return self._copy_mmap(fd, size, write)
+        buf = getattr(self._local, "buf", None)
+        if buf is None or len(buf) != self.chunk_size:
+            buf = self._local.buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        offset = 0
+        try:
+            while True:
+                n = fi.readinto(buf)
+                if not n:
+                    break
+                write(view[:n])
+                if self.nocache:
+                    _fadvise(fd, offset, n, "POSIX_FADV_DONTNEED")
+                offset += n
+        finally:
+            view.release()
+        return offset
+
+    def _copy_mmap(self, fd, size, write):
+        """Passes chunks of the memory mapped file to the given write function.
+
+        :Returns:
+          - (int) Number of bytes read.
+        """
+        import mmap
+        gran = mmap.ALLOCATIONGRANULARITY
+        chunk = -(-self.chunk_size // gran) * gran
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        try:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, chunk):
+                    n = min(chunk, size - offset)
+                    write(view[offset:offset + n])
+                    if self.nocache:
+                        if hasattr(mm, "madvise"):
+                            mm.madvise(mmap.MADV_DONTNEED, offset, n)
+                        _fadvise(fd, offset, n, "POSIX_FADV_DONTNEED")
+            finally:
+                view.release()
+        finally:
+            mm.close()
+        return size
+
+class WalkCache:
+    """Cache of directory listings kept on disk between walks. A directory
+    whose modification time and inode are unchanged reuses its cached listing,
+    costing one stat instead of reading the directory. Adding, removing or
+    renaming an entry changes the directory's modification time, so only
+    listings are cached and never file metadata. The least recently used
+    directories are evicted once the cache holds more than ``max_entries``
+    entries in total."""
+    def __init__(self, path="", max_entries=WALK_CACHE_SIZE):
+        #: Path of the cache file; the cache is only kept in memory if empty.
+        self.path = path
+        #: Maximum number of directory entries held in total.
+        self.max_entries = max_entries
+        #: Maps directory paths to lists of the modification time in
+        #: nanoseconds, the inode and the entry names, in least recently used
+        #: order. Names of subdirectories end with `/`.
+        self.dirs = collections.OrderedDict()
+        #: Number of directory entries held.
+        self.size = 0
+        #: Number of listings reused from the cache.
+        self.hits = 0
+        #: Number of listings read from the filesystem.
+        self.misses = 0
+
+    def load(self):
+        """Loads the cache file. A missing or unreadable file leaves the cache
+        empty.
+
+        :Returns:
+          - (bool) True if the cache was loaded, false otherwise.
+        """
+        self.dirs.clear()
+        self.size = 0
+        try:
+            with open(self.path, encoding="utf-8") as fi:
+                data = json.load(fi)
+            for path, mtime, ino, names in data["dirs"]:
+                self.dirs[path] = [mtime, ino, names]
+                self.size += len(names)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.dirs.clear()
+            self.size = 0
+            return False
         return True
 
+    def save(self):
+        """Saves the cache file, replacing it atomically.
+
+        :Raises:
+          - OSError if the file cannot be written.
+        """
+        self._evict()
+        tmppath = self.path + ".tmp"
+        with open(tmppath, "w", encoding="utf-8") as fo:
+            json.dump({"dirs": [[p] + v for p, v in self.dirs.items()]}, fo,
+                    separators=(",", ":"))
+        os.replace(tmppath, self.path)
+
+    def listing(self, path):
+        """Returns the file and directory entries of the given directory,
+        from the cache if the directory is unchanged.
+
+        :Returns:
+          - List of tuples of the entry path and true if it is a directory.
+        """
+        st = os.stat(path)
+        cached = self.dirs.get(path)
+        if cached and cached[:2] == [st.st_mtime_ns, st.st_ino]:
+            self.hits += 1
+            self.dirs.move_to_end(path)
+            return [(os.path.join(path, n.rstrip("/")), n.endswith("/"))
+                    for n in cached[2]]
+        self.misses += 1
+        entries = _read_dir(path)
+        if cached:
+            self.size -= len(cached[2])
+            del self.dirs[path]
+        if time.time() - st.st_mtime >= WALK_CACHE_RACY:
+            names = [os.path.basename(p) + ("/" if d else "") for p, d in entries]
+            self.dirs[path] = [st.st_mtime_ns, st.st_ino, names]
+            self.size += len(names)
+            self._evict()
+        return entries
+
+    def _evict(self):
+        """Evicts the least recently used listings until the cache is within
+        its size bound; the most recent listing is always kept."""
+        while self.size > self.max_entries and len(self.dirs) > 1:
+            _, evicted = self.dirs.popitem(last=False)
+            self.size -= len(evicted[2])
+
+class CompressionPolicy:
+    """Chooses the compression method and level for each archive member."""
+    def __init__(self, method="deflate", level=None):
+        #: Name of the compression method; one of the keys of ``METHODS``.
+        self.method = method
+        #: Compression level or None for the method default. The meaning
+        #: depends on the method (0-9 for deflate, 1-9 for bzip2, ignored for
+        #: lzma and store).
+        self.level = level
+        #: Lowercase extensions of files that are always stored.
+        self.store_exts = STORE_EXTS
+        #: True if the leading block of each file should be sampled and the
+        #: file stored if the block does not compress.
+        self.sample = False
+
+    def choose(self, syspath):
+        """Chooses the compression for the given system target.
+
+        :Returns:
+          - Tuple with the following:
+              - (int) The zip compression method.
+              - (int) The compression level or None for the default.
+        """
+        compression = METHODS[self.method]
+        if ZIP_STORED == compression:
+            return (ZIP_STORED, None)
+        ext = os.path.splitext(syspath)[1].lower()
+        if ext in self.store_exts:
+            return (ZIP_STORED, None)
+        if self.sample and not is_compressible(syspath):
+            return (ZIP_STORED, None)
+        return (compression, self.level)
+
 class ArcTarget:
     """Object which maps a system target path to an archive target path."""
-    def __init__(self, syspath="", zippath=""):
+    def __init__(self, syspath="", zippath="", isdir=None):
         #: The filesystem path of the system target which will be copied to the
         #: archive.
         self.syspath = syspath
         #: The archive path for the system target.
         self.zippath = zippath
+        #: True if the system target is a directory, false if it is a file and
+        #: None if not known (the filesystem will be checked when needed).
+        self.isdir = isdir
 
     def __repr__(self):
         return "syspath=%s  zippath=%s" % (self.syspath, self.zippath)
@@ -127,6 +718,113 @@ class ArcTarget:
 ## SECTION: Function Definitions                                #
 ##==============================================================#
 
+def is_compressible(syspath):
+    """Estimates whether the given file is worth compressing by compressing its
+    leading block at the fastest level.
+
+    :Returns:
+      - (bool) False if the sampled block did not compress, true otherwise
+        (including if the file could not be read).
+    """
+    try:
+        with open(syspath, "rb") as fi:
+            sample = fi.read(SAMPLE_SIZE)
+    except OSError:
+        return True
+    if not sample:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * SAMPLE_RATIO
+
+def sample_compression(syspath, policy, limit=SAMPLE_SIZE):
+    """Compresses the leading bytes of the given file as it would be added
+    under the given policy, to estimate its compressed size.
+
+    :param policy: (CompressionPolicy) Policy choosing the compression.
+    :param limit: (int) Maximum number of bytes read.
+
+    :Returns:
+      - Tuple of the number of bytes read and their compressed size.
+
+    :Raises:
+      - OSError if the file cannot be read.
+    """
+    compression, level = policy.choose(syspath)
+    with open(syspath, "rb") as fi:
+        data = fi.read(limit)
+    compressor = _get_compressor(compression, level)
+    if not compressor:
+        return (len(data), len(data))
+    return (len(data), len(compressor.compress(data)) + len(compressor.flush()))
+
+def _get_compressor(compression, level=None):
+    """Returns a new compressor object for the given zip compression method or
+    None if the data is stored as is."""
+    if ZIP_DEFLATED == compression:
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    elif ZIP_BZIP2 == compression:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    elif ZIP_LZMA == compression:
+        # NOTE: Zip LZMA members carry a small properties header which the
+        # zipfile module compressor writes.
+        return zipfile.LZMACompressor()
+    return None
+
+def _compress_file(syspath, zippath, policy, reader=None):
+    """Reads and compresses the given file into memory using the compression
+    chosen by the given policy. This is the unit of work for the parallel
+    compression workers.
+
+    :param reader: (SourceReader) Reader of the file; a default reader is used
+        if not given.
+
+    :Returns:
+      - Tuple of the populated ``ZipInfo`` and the compressed data, or None if
+        the file no longer exists.
+
+    :Raises:
+      - OSError if the file exists but cannot be read.
+    """
+    reader = reader or SourceReader()
+    compression, level = policy.choose(syspath)
+    compressor = _get_compressor(compression, level)
+    crc = [0]
+    chunks = []
+
+    def write(chunk):
+        crc[0] = zlib.crc32(chunk, crc[0])
+        chunks.append(compressor.compress(chunk) if compressor else bytes(chunk))
+
+    try:
+        zinfo = zipfile.ZipInfo.from_file(syspath, zippath)
+        size = reader.copy(syspath, write)
+    except FileNotFoundError:
+        return None
+    if compressor:
+        chunks.append(compressor.flush())
+    data = b"".join(chunks)
+    zinfo.compress_type = compression
+    zinfo.CRC = crc[0]
+    zinfo.file_size = size
+    zinfo.compress_size = len(data)
+    return (zinfo, data)
+
+def _fadvise(fd, offset, length, advice):
+    """Gives the named ``os.posix_fadvise()`` advice if available on this
+    platform."""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+
+def peak_rss():
+    """Returns the peak resident memory of this process in bytes or None if not
+    available on this platform."""
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: The peak is reported in bytes on macOS and in KiB elsewhere.
+    return rss if "darwin" == sys.platform else rss * 1024
+
 def format_ts(ts, style="normal"):
     """Formats the given Unix timestamp.
 
@@ -143,46 +841,605 @@ def format_ts(ts, style="normal"):
         return time.strftime("%d %B %Y %I:%M%p (%Z)", ts).lstrip('0')
     return time.strftime("%Y%m%d%H%M", ts)
 
-def delete_from_filesys(arctargets, ignore=[]):
-    """Deletes the system target referenced by each archiver target from the
-    filesystem.
+def parse_outname(outname):
+    """Parses an archive filename formatted by ``ArcCreator.format_outname()``
+    back into its timestamp and name. The timestamp may be in any of the
+    normal, short or long styles of ``format_ts()``.
 
-    :param arctargets: List of archiver targets.
+    :Returns:
+      - Tuple with the following:
+          - (float) The Unix timestamp or None if the filename has none.
+          - (str) The archive name.
+    """
+    base = os.path.splitext(os.path.basename(outname))[0]
+    ts, sep, name = base.partition("-")
+    fmt = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}.get(len(ts))
+    if not sep or not fmt or not ts.isdigit():
+        return (None, base)
+    try:
+        return (time.mktime(time.strptime(ts, fmt)), name)
+    except ValueError:
+        return (None, base)
+
+def format_manifest(files, base="", deleted=[]):
+    """Formats the text of an archive content manifest.
+
+    :param files: (dict) Maps member names of all targets in the archived state
+        to lists of size, modification time and CRC. Directory members have a
+        size and CRC of zero.
+    :param base: (str) Filename of the archive this archive is incremental to;
+        empty for a full archive.
+    :param deleted: List of member names in the base state that no longer
+        exist.
+    """
+    return json.dumps({
+            "base": base,
+            "deleted": deleted,
+            "files": files,
+        }, separators=(",", ":"))
+
+def read_manifest(path):
+    """Reads the content manifest of the archive at the given path.
 
     :Returns:
-      - List of system targets that were not deleted.
+      - (dict) The manifest with the keys ``base``, ``deleted`` and ``files``
+        (see ``format_manifest()``), or None if the archive has no manifest.
     """
-    notdel = []
+    with zipfile.ZipFile(path) as zf:
+        try:
+            text = zf.read(MANIFEST)
+        except KeyError:
+            return None
+    return json.loads(text.decode("utf-8"))
 
-    # Delete files first.
+def format_journal_entry(zinfo, end):
+    """Formats the line of a creation journal recording a member committed to
+    the archive file.
+
+    :param zinfo: (ZipInfo) The member as written.
+    :param end: (int) Archive offset just past the data of the member.
+    """
+    return json.dumps([zinfo.filename, zinfo.header_offset, end,
+            zinfo.compress_type, zinfo.flag_bits, zinfo.CRC,
+            zinfo.compress_size, zinfo.file_size, list(zinfo.date_time),
+            zinfo.external_attr], separators=(",", ":")) + "\n"
+
+def read_journal(path):
+    """Reads a creation journal. The first line is a JSON object describing the
+    creation; each further line is a member formatted by
+    ``format_journal_entry()``. Reading stops at the first incomplete line, as
+    left by an interrupted write.
+
+    :Returns:
+      - Tuple with the following:
+          - (dict) The journal header.
+          - List of ``ZipInfo`` objects of the committed members.
+          - (int) Offset just past the data of the last committed member.
+      - None if the journal has no valid header.
+    """
+    zinfos = []
+    end = 0
+    with open(path, "r") as fi:
+        try:
+            header = json.loads(fi.readline())
+        except ValueError:
+            return None
+        for line in fi:
+            try:
+                (name, offset, mend, ctype, flags, crc, csize, fsize,
+                        date_time, attr) = json.loads(line)
+            except ValueError:
+                break
+            zinfo = zipfile.ZipInfo(name, tuple(date_time))
+            zinfo.header_offset = offset
+            zinfo.compress_type = ctype
+            zinfo.flag_bits = flags
+            zinfo.CRC = crc
+            zinfo.compress_size = csize
+            zinfo.file_size = fsize
+            zinfo.external_attr = attr
+            zinfos.append(zinfo)
+            end = mend
+    if not isinstance(header, dict):
+        return None
+    return (header, zinfos, end)
+
+def format_lognames(path):
+    """Returns the possible log filenames of the archive at the given path in
+    order of preference: the default log, the legacy log, then text files
+    named after the archive."""
+    base = os.path.splitext(os.path.basename(path or ""))[0]
+    return [LOGNAME, LEGACY_LOGNAME, base + ".txt", base + ".log", base + ".md"]
+
+def read_log(path):
+    """Returns the text of the log of the archive at the given path. Only the
+    records needed to locate the log and the log itself are read, so this is
+    much faster than opening the archive for large archives.
+
+    :Returns:
+      - (bytes) The log text or empty if the archive has no log.
+    """
+    with open(path, "rb") as fo:
+        entry = arcscan.find_member(fo, format_lognames(path))
+        if not entry:
+            return b""
+        return arcscan.read_member(fo, entry)
+
+def read_logs(paths, jobs=8):
+    """Reads the logs of many archives using a pool of worker threads.
+
+    :Returns:
+      - Generator of tuples, in the order of the given paths, of each path and
+        either its log text or the exception raised while reading it.
+    """
+    def read(path):
+        try:
+            return read_log(path)
+        except (OSError, zipfile.BadZipFile, NotImplementedError) as e:
+            return e
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for path, log in zip(paths, pool.map(read, paths)):
+            yield (path, log)
+
+def read_dedup_index(zfile):
+    """Returns the deduplication index (see ``DEDUP_INDEX``) of the given zip
+    file object; empty if the archive has none."""
+    try:
+        text = zfile.read(DEDUP_INDEX)
+    except KeyError:
+        return {}
+    return json.loads(text.decode("utf-8"))
+
+def member_bound(size, name, method="deflate"):
+    """Returns an upper bound of the bytes a file member of the given size and
+    name takes in an archive when compressed with the given method. It covers
+    the local header, data descriptor and central directory record with their
+    ZIP64 extras, plus the expansion of incompressible data (see
+    ``EXPANSION``)."""
+    namelen = len(name.encode("utf-8"))
+    divisor, extra = EXPANSION[method]
+    expansion = size // divisor + extra if divisor else 0
+    return size + expansion + 256 + 2 * namelen
+
+def pack_volumes(arctargets, sizes, capacity, method="deflate",
+        reserve=VOLUME_RESERVE):
+    """Packs the given archiver targets into volumes whose members are bounded
+    (see ``member_bound()``) to the given capacity. Files are placed largest
+    first into the volume with the most room left, so the number of volumes
+    stays close to the minimum. Directories go in the first volume. A file
+    larger than the capacity gets a volume of its own.
+
+    :param sizes: (dict) Maps the id of each file archiver target to its size.
+    :param capacity: (int) Capacity in bytes of each volume.
+    :param method: (str) Name of the compression method of the members.
+    :param reserve: (int) Bytes of each volume reserved for other than the
+        members.
+
+    :Returns:
+      - List of lists of archiver targets, one per volume, each in the order
+        of the given targets.
+    """
+    capacity = max(capacity - reserve, 1)
+    order = dict((id(a), i) for i, a in enumerate(arctargets))
+    volumes = [[]]
+    used = 0
+    files = []
     for a in arctargets:
-        if a in ignore:
-            continue
-        if os.path.exists(a.syspath) and os.path.isfile(a.syspath):
+        name = format_zipname(a.syspath, a.zippath, a.isdir)
+        if a.isdir:
+            volumes[0].append(a)
+            used += member_bound(0, name, method)
+        else:
+            bound = member_bound(sizes.get(id(a), 0), name, method)
+            files.append((bound, order[id(a)], a))
+
+    # The heap holds the negated room left of each volume with its index so
+    # the roomiest volume is found in logarithmic time.
+    heap = [(used - capacity, 0)]
+    for bound, _, a in sorted(files, key=lambda f: (-f[0], f[1])):
+        room, i = heap[0]
+        if -room >= bound or (not volumes[i] and 0 == i):
+            heapq.heapreplace(heap, (room + bound, i))
+        else:
+            i = len(volumes)
+            volumes.append([])
+            heapq.heappush(heap, (bound - capacity, i))
+        volumes[i].append(a)
+    return [sorted(v, key=lambda a: order[id(a)]) for v in volumes if v]
+
+def find_duplicates(arctargets):
+    """Finds archiver targets for files with identical content. Only files that
+    share their size with another file are hashed.
+
+    :Returns:
+      - Tuple with the following:
+          - List of archiver targets with unique content, in the given order.
+          - List of tuples of a duplicate archiver target and the earlier
+            archiver target with the same content.
+    """
+    bysize = collections.defaultdict(list)
+    for a in arctargets:
+        if a.isdir is False:
             try:
-                os.remove(a.syspath)
-            except:
+                bysize[os.path.getsize(a.syspath)].append(a)
+            except OSError:
                 pass
-            if os.path.exists(a.syspath):
-                notdel.append(a.syspath)
 
-    # Delete directories last.
-    for a in arctargets:
-        if a in ignore:
+    dups = {}
+    for size, group in bysize.items():
+        if size == 0 or len(group) < 2:
             continue
-        if os.path.exists(a.syspath) and os.path.isdir(a.syspath):
-            # Do not delete directories that contain subfiles.
-            if [] == expand_systarget(a.syspath, nodirs=True):
-                try:
-                    shutil.rmtree(a.syspath)
-                except:
-                    pass
-            if os.path.exists(a.syspath):
-                notdel.append(a.syspath)
+        seen = {}
+        for a in group:
+            try:
+                digest = hash_file(a.syspath)
+            except OSError:
+                continue
+            if digest in seen:
+                dups[a] = seen[digest]
+            else:
+                seen[digest] = a
+
+    unique = [a for a in arctargets if a not in dups]
+    return (unique, [(a, dups[a]) for a in arctargets if a in dups])
+
+def hash_file(syspath):
+    """Returns the SHA-256 hex digest of the given file."""
+    import hashlib
+    h = hashlib.sha256()
+    with open(syspath, "rb") as fi:
+        for chunk in iter(lambda: fi.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-    return notdel
+def crc_file(syspath):
+    """Returns the CRC-32 and size of the given file."""
+    crc = 0
+    size = 0
+    with open(syspath, "rb") as fi:
+        for chunk in iter(lambda: fi.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return (crc, size)
 
-def convert_sys2arc(targets, flatten=False, flatten_ld=True):
+def verify_archive(arcpath, jobs=1, sources=None, members=None):
+    """Verifies the archive at the given path by reading every member and
+    checking its CRC-32 and size against the central directory. The members
+    are split into contiguous runs of similar compressed size, each checked by
+    a worker thread with its own file handle (decompression releases the GIL).
+    Deduplicated members are verified through the member holding their
+    content.
+
+    :param jobs: (int) Number of worker threads.
+    :param sources: (dict) Maps member names to the system paths of the files
+        they were archived from; if given, each file is also checked against
+        the CRC-32 and size of its member.
+    :param members: Names of the members to check; all are checked if None.
+
+    :Returns:
+      - List of ``VerifyFailure`` objects; empty if the archive is intact.
+    """
+    try:
+        entries, refs = read_entries(arcpath)
+    except (OSError, ValueError, zipfile.BadZipFile, NotImplementedError) as e:
+        return [VerifyFailure("", "Archive could not be read: %s" % e)]
+    byname = dict((e.name, e) for e in entries)
+    if members is not None:
+        entries = [e for e in entries if e.name in members]
+    jobs = max(jobs, 1)
+    runs = _split_runs(entries, jobs, lambda e: e.compress_size)
+
+    srcchecks = []
+    missing = []
+    for name, syspath in (sources or {}).items():
+        entry = byname.get(refs.get(name, name))
+        if not entry:
+            missing.append(VerifyFailure(name, "Member not found."))
+        elif not name.endswith("/"):
+            srcchecks.append((name, syspath, entry))
+    failed = []
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_check_members, arcpath, run) for run in runs]
+        futures += [pool.submit(_check_source, *c) for c in srcchecks]
+        for future in futures:
+            failed.extend(future.result())
+    return failed + missing
+
+def read_entries(arcpath):
+    """Reads the central directory entries and the deduplication index of the
+    archive at the given path.
+
+    :Returns:
+      - Tuple with the following:
+          - List of ``arcscan.CdirEntry`` objects in archive order.
+          - (dict) The deduplication index (see ``DEDUP_INDEX``).
+
+    :Raises:
+      - OSError or zipfile.BadZipFile if the archive cannot be read.
+    """
+    with open(arcpath, "rb") as fo:
+        cdoffset, cdsize, _ = arcscan.find_cdir(fo)
+        entries = list(arcscan.iter_cdir(fo, cdoffset, cdsize))
+        refs = {}
+        for e in entries:
+            if DEDUP_INDEX == e.name:
+                refs = json.loads(arcscan.read_member(fo, e).decode("utf-8"))
+    return (entries, refs)
+
+def extract_members(arcpath, members, outdir, jobs=1, mtimes=None,
+        overwrite=False):
+    """Extracts the given members of the archive at the given path under the
+    given directory. Directories are created first, then files are extracted
+    by worker threads, each decompressing a contiguous run of members with its
+    own file handle. Each file's CRC-32 is checked as it is written. Member
+    names that would escape the output directory are refused.
+
+    :param members: List of tuples of the member name to extract and the
+        ``arcscan.CdirEntry`` holding its content (which differs for
+        deduplicated members).
+    :param jobs: (int) Number of worker threads.
+    :param mtimes: (dict) Maps member names to the modification times to set,
+        e.g. from the archive manifest; other members get the time recorded in
+        the archive.
+    :param overwrite: (bool) If true, existing files are overwritten;
+        otherwise they are skipped.
+
+    :Returns:
+      - Tuple with the following:
+          - List of names of extracted members.
+          - List of names of members skipped since the file exists.
+          - List of ``ExtractFailure`` objects.
+    """
+    mtimes = mtimes or {}
+    extracted = []
+    skipped = []
+    failed = []
+    dirs = []
+    files = []
+    for name, entry in members:
+        path = _safe_path(outdir, name)
+        if not path:
+            failed.append(ExtractFailure(name, "Unsafe member path."))
+        elif name.endswith("/"):
+            dirs.append((name, entry, path))
+        elif os.path.lexists(path) and not overwrite:
+            skipped.append(name)
+        else:
+            files.append((name, entry, path))
+
+    # Create all directories up front so the workers only write files.
+    parents = set(p for _, _, p in dirs)
+    parents.update(os.path.dirname(p) for _, _, p in files)
+    dirnames = dict((p, n) for n, _, p in dirs)
+    notmade = set()
+    for path in sorted(parents):
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            notmade.add(path)
+            failed.append(ExtractFailure(dirnames.get(path, path), str(e)))
+
+    # NOTE: More runs than workers are used so a run of large members does not
+    # leave the other workers idle at the end.
+    jobs = max(jobs, 1)
+    runs = _split_runs(files, 4 * jobs, lambda f: f[1].compress_size)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for done, fails in pool.map(lambda r: _extract_run(arcpath, r, mtimes), runs):
+            extracted.extend(done)
+            failed.extend(fails)
+
+    # Directory times are set last, deepest first, since extracting into a
+    # directory changes its time.
+    # Paths that could not be made directories, such as existing files, are
+    # left untouched.
+    for name, entry, path in sorted(dirs, key=lambda d: d[2], reverse=True):
+        if path in notmade or os.path.islink(path) or not os.path.isdir(path):
+            continue
+        try:
+            _set_attrs(path, entry, mtimes.get(name))
+            extracted.append(name)
+        except OSError as e:
+            failed.append(ExtractFailure(name, str(e)))
+    return (extracted, skipped, failed)
+
+def _extract_run(arcpath, run, mtimes):
+    """Extracts a run of file members of the archive at the given path.
+
+    :Returns:
+      - Tuple of the list of extracted member names and the list of
+        ``ExtractFailure`` objects.
+    """
+    done = []
+    failed = []
+    with open(arcpath, "rb") as fo:
+        for name, entry, path in run:
+            try:
+                with open(path, "wb") as out:
+                    arcscan.copy_member(fo, entry, out.write, CHUNK_SIZE)
+                _set_attrs(path, entry, mtimes.get(name))
+                done.append(name)
+            except (OSError, zipfile.BadZipFile, NotImplementedError) as e:
+                failed.append(ExtractFailure(name, str(e)))
+                _remove_path(path)
+    return (done, failed)
+
+def _safe_path(outdir, name):
+    """Returns the path the given member name is extracted to under the given
+    directory, or None if the name is absolute or climbs out of it."""
+    parts = name.replace("\\", "/").split("/")
+    if (not name or name.startswith("/") or ".." in parts or
+            os.path.splitdrive(parts[0])[0]):
+        return None
+    return os.path.join(outdir, *[p for p in parts if p])
+
+def _set_attrs(path, entry, mtime=None):
+    """Sets the modification time and, if recorded, the permissions of an
+    extracted member."""
+    mode = entry.external_attr >> 16
+    if mode and (stat.S_ISREG(mode) or stat.S_ISDIR(mode)):
+        os.chmod(path, stat.S_IMODE(mode))
+    if mtime is None:
+        mtime = time.mktime(entry.date_time + (0, 0, -1))
+    os.utime(path, (mtime, mtime))
+
+def _split_runs(items, count, size):
+    """Splits the given items into at most the given number of contiguous runs
+    of roughly equal total size.
+
+    :param size: Function returning the size of an item.
+
+    :Returns:
+      - List of non-empty lists of items.
+    """
+    runs = [[]]
+    share = sum(size(i) for i in items) / float(max(count, 1))
+    total = 0
+    for i in items:
+        if runs[-1] and total >= share * len(runs) and len(runs) < count:
+            runs.append([])
+        runs[-1].append(i)
+        total += size(i)
+    return [r for r in runs if r]
+
+def _check_members(arcpath, entries):
+    """Checks the given members of the archive at the given path.
+
+    :Returns:
+      - List of ``VerifyFailure`` objects.
+    """
+    failed = []
+    with open(arcpath, "rb") as fo:
+        for e in entries:
+            try:
+                arcscan.check_member(fo, e, CHUNK_SIZE)
+            except (zipfile.BadZipFile, NotImplementedError) as ex:
+                failed.append(VerifyFailure(e.name, str(ex)))
+    return failed
+
+def _check_source(name, syspath, entry):
+    """Checks the given source file against its archive member.
+
+    :Returns:
+      - List of ``VerifyFailure`` objects.
+    """
+    try:
+        crc, size = crc_file(syspath)
+    except OSError as e:
+        return [VerifyFailure(name, "Source could not be read: %s" % e)]
+    if (crc, size) != (entry.crc, entry.file_size):
+        return [VerifyFailure(name, "Source `%s` differs from member." % syspath)]
+    return []
+
+def format_zipname(syspath, zippath, isdir=None):
+    """Formats the member name that the zip file will use when the given system
+    target is written with the given archive path. This mirrors the name
+    normalization done by ``zipfile.ZipInfo.from_file()`` without requiring a
+    stat of the target other than the directory check.
+
+    :param syspath: (str) The filesystem path of the target.
+    :param zippath: (str) The requested archive path of the target.
+    :param isdir: (bool) True if the target is a directory; if None, the
+        filesystem is checked.
+
+    :Returns:
+      - (str) The member name as stored in the zip file.
+    """
+    name = os.path.normpath(os.path.splitdrive(zippath)[1])
+    name = name.lstrip(os.sep + (os.altsep or ""))
+    if os.sep != "/":
+        name = name.replace(os.sep, "/")
+    if isdir is None:
+        isdir = os.path.isdir(syspath)
+    if isdir:
+        name += "/"
+    return name
+
+def delete_from_filesys(arctargets, ignore=[], jobs=1):
+    """Deletes the system target referenced by each archiver target from the
+    filesystem. Files are removed first, in parallel if requested, then
+    directories are removed deepest first. A directory is only removed once
+    all of its contents listed in the targets were removed, which is tracked
+    by count rather than by walking the directory again; anything else found
+    in it makes its removal fail. Paths listed by more than one target, as
+    with overlapping targets, are deleted once.
+
+    :param arctargets: List of archiver targets.
+    :param ignore: List of archiver targets not to delete; the directories
+        containing them are not deleted either. A path is still deleted if
+        another target not ignored lists it.
+    :param jobs: (int) Number of worker threads removing files.
+
+    :Returns:
+      - List of ``DeleteFailure`` objects of the system targets that were not
+        deleted.
+    """
+    ignore = set(id(a) for a in ignore)
+    failed = []
+
+    # Map each distinct path to whether it is a directory and to be kept.
+    paths = {}
+    for a in arctargets:
+        isdir = a.isdir if a.isdir is not None else os.path.isdir(a.syspath)
+        keep = id(a) in ignore
+        if a.syspath in paths:
+            keep = keep and paths[a.syspath][1]
+        paths[a.syspath] = (isdir, keep)
+
+    # Count the listed contents of each directory.
+    remain = collections.Counter(os.path.dirname(p) for p in paths)
+
+    # Delete files first.
+    dirs = []
+    files = []
+    for path, (isdir, keep) in paths.items():
+        if not keep:
+            (dirs if isdir else files).append(path)
+    if jobs > 1 and len(files) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_remove_path, files))
+    else:
+        results = [_remove_path(f) for f in files]
+    for path, e in zip(files, results):
+        if e:
+            failed.append(DeleteFailure(path, e))
+        else:
+            remain[os.path.dirname(path)] -= 1
+
+    # Delete directories last, deepest first.
+    dirs.sort(key=lambda p: p.count(os.sep), reverse=True)
+    for path in dirs:
+        if remain[path] > 0:
+            e = OSError(errno.ENOTEMPTY, os.strerror(errno.ENOTEMPTY), path)
+        else:
+            e = _remove_path(path, os.rmdir)
+        if e:
+            failed.append(DeleteFailure(path, e))
+        else:
+            remain[os.path.dirname(path)] -= 1
+
+    return failed
+
+def _remove_path(path, remove=os.remove):
+    """Removes the given path, treating a path that no longer exists as
+    removed.
+
+    :Returns:
+      - (OSError) The error or None if the path was removed.
+    """
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        return e
+    return None
+
+def convert_sys2arc(targets, flatten=False, flatten_ld=True, onwalk=None,
+        exclude=None, cache=None):
     """Converts list of system targets to equivalent archiver targets.
 
     :param targets: List of system targets.
@@ -192,6 +1449,11 @@ def convert_sys2arc(targets, flatten=False, flatten_ld=True):
     :param flatten_ld: (bool) If true, only the leading directory will be
         flattened. This is only valid if there is one system target and it is a
         directory.
+    :param onwalk: Function called with each archiver target as it is found,
+        e.g. to report progress of a long walk.
+    :param exclude: ``arcfilter.PathFilter`` of the paths to leave out,
+        relative to each system target (see ``walk_systarget()``).
+    :param cache: ``WalkCache`` of directory listings to reuse.
 
     :Returns:
       - Tuple with the following:
@@ -203,11 +1465,15 @@ def convert_sys2arc(targets, flatten=False, flatten_ld=True):
     arctargets = []
     notfound = []
 
-    sysexpand = []
+    # NOTE: Every expanded system target starts with the absolute path of the
+    # system target it was expanded from and that path is itself part of the
+    # expansion, so the common prefix of the expansion is the common prefix of
+    # the found system targets. This allows the expansion to be streamed.
+    found = []
     for s in targets:
-        if os.path.exists(s):
-            sysexpand.extend(expand_systarget(s))
-        else:
+        if os.path.isfile(s) or os.path.isdir(s):
+            found.append(s)
+        elif not os.path.exists(s):
             notfound.append(s)
 
     # Determine the common path prefix (cpp) for the system targets. This prefix
@@ -223,13 +1489,15 @@ def convert_sys2arc(targets, flatten=False, flatten_ld=True):
             # being in the archive root rather than the directory itself.
             cpp = os.path.abspath(os.path.dirname(targets[0]))
     else:
-        cpp = os.path.dirname(os.path.commonprefix(sysexpand))
+        cpp = os.path.dirname(os.path.commonprefix(
+                [os.path.abspath(s) for s in found]))
 
     # Populate list of archiver targets from the expanded system targets.
-    for s in sysexpand:
-        a = ArcTarget(syspath=s)
+    walks = (walk_systarget(t, exclude=exclude, cache=cache) for t in found)
+    for s, isdir in (i for w in walks for i in w):
+        a = ArcTarget(syspath=s, isdir=isdir)
         if flatten:
-            if os.path.isfile(a.syspath):
+            if not isdir:
                 a.zippath = os.path.basename(a.syspath)
             else:
                 a.zippath = None
@@ -247,36 +1515,92 @@ def convert_sys2arc(targets, flatten=False, flatten_ld=True):
             else:
                 a.zippath = os.path.relpath(a.syspath, cpp)
         arctargets.append(a)
+        if onwalk:
+            onwalk(a)
 
     return (arctargets, notfound)
 
-def expand_systarget(target, nofiles=False, nodirs=False):
+def expand_systarget(target, nofiles=False, nodirs=False, cache=None):
     """Expands the given system target. For files, the result will be the
     absolute path. For directories, the result will be the absolute paths of
     all subfiles and subdirectories.
 
     :param nofiles: If true, no files will be returned.
     :param nodirs: If true, no directories will be returned.
+    :param cache: ``WalkCache`` of directory listings to reuse.
 
     :Returns:
       - List of expanded system targets.
     """
-    expanded = []
+    return [s for s, _ in walk_systarget(target, nofiles=nofiles,
+            nodirs=nodirs, cache=cache)]
+
+def walk_systarget(target, nofiles=False, nodirs=False, exclude=None,
+        cache=None):
+    """Walks the given system target, yielding the same targets in the same
+    order as ``expand_systarget()`` but lazily. Directories are read with
+    ``os.scandir()`` so the entry type is taken from the directory listing
+    rather than from additional stat calls.
+
+    :param nofiles: If true, no files will be yielded.
+    :param nodirs: If true, no directories will be yielded.
+    :param exclude: ``arcfilter.PathFilter`` of the paths to leave out. Paths
+        are matched relative to the target directory, or as the file name for
+        a file target. Excluded directories are not descended into. The target
+        itself is never excluded.
+    :param cache: ``WalkCache`` of directory listings to reuse; directories
+        are read with ``os.scandir()`` if None.
+
+    :Returns:
+      - Generator of tuples with the following:
+          - (str) Absolute path of the expanded system target.
+          - (bool) True if the system target is a directory.
+    """
     abspath = os.path.abspath(target)
 
     # Handle files.
-    if os.path.isfile(abspath) and not nofiles:
-        return [abspath]
-
-    # Handle directories.
-    if os.path.isdir(abspath):
-        if not nodirs:
-            expanded.append(abspath)
-        for i in os.listdir(abspath):
-            ipath = os.path.join(abspath, i)
-            expanded.extend(expand_systarget(ipath, nofiles=nofiles, nodirs=nodirs))
-
-    return expanded
+    if os.path.isfile(abspath):
+        if not nofiles and not (exclude and
+                exclude.excluded(os.path.basename(abspath), False)):
+            yield (abspath, False)
+        return
+
+    # Handle directories. An explicit stack of pending entries is used instead
+    # of recursion so deep trees neither hit the recursion limit nor hold a
+    # directory handle open per level.
+    if not os.path.isdir(abspath):
+        return
+    if not nodirs:
+        yield (abspath, True)
+    scan = cache.listing if cache else _read_dir
+    stack = [iter(scan(abspath))]
+    skip = len(abspath) + 1
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        path, isdir = entry
+        if exclude and exclude.excluded(path[skip:].replace(os.sep, "/"), isdir):
+            continue
+        if not isdir:
+            if not nofiles:
+                yield entry
+        else:
+            if not nodirs:
+                yield entry
+            stack.append(iter(scan(path)))
+
+def _read_dir(path):
+    """Reads the file and directory entries of the given directory; other
+    entries are left out. The directory handle is closed before returning.
+
+    :Returns:
+      - List of tuples of the entry path and true if it is a directory.
+    """
+    with os.scandir(path) as entries:
+        return [(e.path, not e.is_file())
+                for e in entries if e.is_file() or e.is_dir()]
 
 ##==============================================================#
 ## SECTION: Main Body                                           #
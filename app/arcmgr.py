@@ -8,12 +8,52 @@
 ## SECTION: Imports                                             #
 ##==============================================================#
 
+import contextlib
+import json
 import os
+import re
+import threading
 import time
+import zipfile
 
+import arcfilter
 import arclib
 import adoclib
 
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Fraction of the files compressed by ``ArcCreator.plan()`` to estimate the
+#: archive size and creation time.
+PLAN_SAMPLE = 0.02
+
+#: Minimum number of files sampled by ``ArcCreator.plan()``.
+PLAN_MIN_FILES = 50
+
+#: Maximum bytes read from each file sampled by ``ArcCreator.plan()``.
+PLAN_SAMPLE_SIZE = 1024 * 1024
+
+#: Smallest volume size in bytes (see ``ArcCreator.volume_size``). A volume
+#: must also be at least twice the room reserved for its log and end records,
+#: which is only larger for log messages over about 64 KiB.
+MIN_VOLUME_SIZE = 256 * 1024
+
+#: Bytes of each file member besides its data and name: the local header
+#: plus the central directory record.
+MEMBER_OVERHEAD = 30 + 46
+
+#: Maps batch spec flag keys to archive creator attributes.
+_SPEC_FLAGS = {
+        "delete": "delete",
+        "flatten": "flatten",
+        "flatten_ld": "flatten_ld",
+        "overwrite": "overwrite",
+        "append": "append",
+        "manifest": "manifest",
+        "dedup": "dedup",
+    }
+
 ##==============================================================#
 ## SECTION: Class Definitions                                   #
 ##==============================================================#
@@ -49,29 +89,110 @@ class ArcCreator:
         self.no_log = False
         #: True if existing archive with same name should be overwritten.
         self.overwrite = False
+        #: True if the targets should be added to an existing archive with the
+        #: same name, e.g. one named with a short timestamp. Only the new
+        #: members, the log, deduplication index and manifest are written; a
+        #: new section is appended to the log. Targets already in the archive
+        #: are not added. The archive is created if it does not exist.
+        self.append = False
+        #: Policy choosing the compression method and level of each member.
+        self.policy = arclib.CompressionPolicy()
+        #: Reader of the target files, setting the read size and caching.
+        self.reader = arclib.SourceReader()
+        #: File object to write the archive to instead of a file in ``outdir``,
+        #: e.g. ``sys.stdout.buffer``. It does not need to be seekable.
+        self.stream = None
+        #: Number of worker threads used to compress archive members; members
+        #: are compressed sequentially if not greater than one.
+        self.jobs = 1
+        #: True if a content manifest should be stored in the archive so it
+        #: can be the base of a later incremental archive.
+        self.manifest = False
+        #: Path of the previous archive to create an incremental archive
+        #: against; only targets new or changed since then will be added. The
+        #: previous archive must contain a manifest.
+        self.basearc = ""
+        #: True if files with identical content should only be stored once;
+        #: later copies are recorded in the archive deduplication index.
+        self.dedup = False
+        #: Path of a catalog database to record the created archive in; the
+        #: archive is not recorded if empty.
+        self.catalog = ""
+        #: True if members should be journaled as they are committed so that
+        #: an interrupted creation of the same archive can be resumed; the
+        #: journal is removed once the archive is complete.
+        self.resume = False
+        #: True if the archive should be verified against the targets before
+        #: they are deleted; applies only if deleting.
+        self.verify = True
+        #: Path of a cache of directory listings reused by later walks of the
+        #: same targets when the directories are unchanged (see
+        #: ``arclib.WalkCache``); no cache is used if empty.
+        self.walk_cache = ""
+        #: Maximum size in bytes of each archive file. If set, the targets are
+        #: packed into as many volumes as needed, each a complete archive
+        #: named from ``format_outname()`` with a sequence number, plus a
+        #: master log listing the members of each volume. Volumes are written
+        #: concurrently by up to ``jobs`` workers. Zero for a single archive.
+        self.volume_size = 0
+        #: List of gitignore-style patterns of paths to leave out, relative to
+        #: each system target (see ``arcfilter.PathFilter``). Excluded
+        #: directories are not walked.
+        self.exclude = []
+        #: Path of a file of exclusion patterns, one per line, applied after
+        #: those in ``exclude``; none are read if empty.
+        self.exclude_from = ""
+        #: Function called with a ``Progress`` object as the creation
+        #: progresses through its phases; no progress is reported if None.
+        self.on_progress = None
         #----}
 
         #{-- Archive post-creation attributes. --
         #: Archive file path.
         self.arcpath = ""
-        #: The log file path. Should only be populated if the log file
-        #: currently exists on the filesystem (which is temporary).
-        self.logpath = ""
         #: List of the archive targets.
         self.arctargets = []
         #: List of archive targets successfully added to the archive.
         self.added = []
         #: List of archive targets not added to the archive.
         self.notadded = []
-        #: List of targets not able to be deleted (only if requested).
+        #: List of archive targets not added to an incremental archive since
+        #: they are unchanged from the base archive.
+        self.unchanged = []
+        #: List of archive targets not added to an archive appended to since
+        #: they are already in it.
+        self.existing = []
+        #: List of ``arclib.VerifyFailure`` objects from verifying the archive
+        #: before deleting the targets (only if requested).
+        self.verifyfail = []
+        #: List of ``arclib.DeleteFailure`` objects of the targets not able to
+        #: be deleted (only if requested).
         self.notdel = []
         #: True if an existing archive with the same name was overwritten
         #: during creation.
         self.overwritten = False
+        #: True if the targets were appended to an existing archive.
+        self.appended = False
+        #: Paths of the volume archive files, if created as volumes.
+        self.volumes = []
+        #: Path of the master log listing the members of each volume, if
+        #: created as volumes.
+        self.volume_log = ""
         #: Holds error message if creation fails.
         self.errmsg = ""
         #: Holds warning messages.
         self.warnmsgs = []
+        #: Statistics about the archive creation by name; e.g.
+        #: ``dedup_bytes`` holds the bytes not stored due to deduplication and
+        #: ``phase_times`` maps each creation phase to its seconds taken and
+        #: ``peak_rss`` holds the peak resident memory in bytes, if known.
+        self.stats = {}
+        #: Progress of the archive creation.
+        self.progress = None
+        #: Event set when the archive creation is cancelled.
+        self.cancelled = threading.Event()
+        #: File object of the creation journal, if resumable.
+        self.journal = None
         #----}
 
     def guess_name(self):
@@ -109,39 +230,101 @@ class ArcCreator:
             formatted = "%s-%s" % (ts, formatted)
         return formatted + ".zip"
 
-    def _create_log(self):
-        """Creates a log file.
+    def _format_log(self, prevlog=""):
+        """Formats the log text.
 
-        :Postconditions:
-          - Log file will be created on the filesystem.
-          - Attribute `logpath`` will be populated with the path to the created
-            file, empty if no log created.
+        :param prevlog: (str) The log of the archive appended to, if any. The
+            log text is appended to it as a new section.
+
+        :Returns:
+          - (str) The log document or empty if no log is requested.
         """
-        # Bail if log already exists.
-        if self.logpath:
-            return
         # Bail if log is not requested or there is no log text.
         if not self.logtxt:
-            return
+            return prevlog
         if self.no_log:
-            return
-
-        # Create archive log file.
+            return prevlog
         log_ts = arclib.format_ts(self.ts, "expand")
-        logdoc = adoclib.format_doc(self.name, self.logtxt, date=log_ts)
-        self.logpath = os.path.join(os.path.abspath(self.outdir), self.logname)
-        with open(self.logpath, "w") as fo:
-            fo.write(logdoc + "\n")
+        if prevlog:
+            return "%s\n%s\n" % (prevlog, adoclib.format_section(log_ts, self.logtxt))
+        return adoclib.format_doc(self.name, self.logtxt, date=log_ts) + "\n"
 
-    def _delete_log(self):
-        """Deletes the previously created log file.
+    def _skip_unchanged(self, targets, states, basefiles):
+        """Determines which archiver targets are unchanged from the base state.
 
         :Postconditions:
-          - If a log was created on the filesystem, it will be deleted.
+          - Attribute ``unchanged`` is populated.
+
+        :Returns:
+          - List of archiver targets that are new or changed.
         """
-        if self.logpath:
-            os.remove(self.logpath)
-            self.logpath = ""
+        changed = []
+        for a in targets:
+            name = arclib.format_zipname(a.syspath, a.zippath, a.isdir)
+            prev = basefiles.get(name)
+            state = states.get(name)
+            if prev and state and (a.isdir or prev[:2] == state[:2]):
+                self.unchanged.append(a)
+            else:
+                changed.append(a)
+        return changed
+
+    def _add_duplicates(self, dups):
+        """Adds duplicate archiver targets as references to the member holding
+        their content. If that member was not added, the duplicate is added
+        normally.
+
+        :param dups: List of tuples of a duplicate archiver target and the
+            archiver target with the same content.
+
+        :Postconditions:
+          - The deduplication index is added to the archive.
+          - Stats ``dedup_files`` and ``dedup_bytes`` are populated.
+        """
+        saved_files = 0
+        saved_bytes = 0
+        for a, orig in dups:
+            name = arclib.format_zipname(orig.syspath, orig.zippath, orig.isdir)
+            if self.arc.add_ref(a, name):
+                self.added.append(a)
+                stored = self.arc.refs.get(name, name)
+                saved_files += 1
+                saved_bytes += self.arc.zfile.getinfo(stored).compress_size
+            elif self.arc.add(a):
+                self.added.append(a)
+            else:
+                self.notadded.append(a)
+        self.arc.add_dedup_index()
+        self.stats['dedup_files'] = saved_files
+        self.stats['dedup_bytes'] = saved_bytes
+
+    def _add_manifest(self, states, base=None, prev=None):
+        """Adds the content manifest to the archive.
+
+        :param states: (dict) Maps member names of the current targets to their
+            size and modification time.
+        :param base: (dict) The manifest of the base archive, if incremental.
+        :param prev: (dict) The manifest of the archive appended to, if any;
+            its files are kept.
+        """
+        basefiles = base["files"] if base else {}
+        added = {}
+        for a in self.added:
+            added[arclib.format_zipname(a.syspath, a.zippath, a.isdir)] = a
+        files = dict(prev["files"]) if prev else {}
+        for name, state in states.items():
+            if name in added:
+                info = self.arc.zfile.getinfo(self.arc.refs.get(name, name))
+                files[name] = state + [info.CRC]
+            elif name in basefiles:
+                files[name] = basefiles[name]
+        deleted = [n for n in basefiles if n not in states]
+        basename = os.path.basename(self.basearc) if base else ""
+        if prev and not base:
+            deleted = prev["deleted"]
+            basename = prev["base"]
+        text = arclib.format_manifest(files, base=basename, deleted=deleted)
+        self.arc.add_text(arclib.MANIFEST, text)
 
     def create_archive(self):
         """Creates an archive file.
@@ -160,10 +343,39 @@ class ArcCreator:
             self.errmsg = "No system targets specified."
             return False
 
+        if not self._check_settings():
+            return False
+        pathfilter = self._compile_filter()
+        if pathfilter is None:
+            return False
+        if self.volume_size:
+            return self._create_volumes(pathfilter)
+
+        # Read the journal of an interrupted creation to resume.
+        resumed = None
+        if self.resume:
+            if self.stream:
+                self.errmsg = "Resuming requires an output archive file."
+                return False
+            if self.append:
+                self.errmsg = "Resuming is not supported when appending."
+                return False
+            resumed = self._read_journal()
+            if self.errmsg:
+                return False
+        if self.append and self.stream:
+            self.errmsg = "Appending requires an output archive file."
+            return False
+
         # Prepare output path.
         outname = self.format_outname()
-        self.arcpath = os.path.join(os.path.abspath(self.outdir), outname)
-        if os.path.exists(self.arcpath):
+        self.arcpath = ""
+        if not self.stream:
+            self.arcpath = os.path.join(os.path.abspath(self.outdir), outname)
+        if resumed and not os.path.isfile(self.arcpath):
+            resumed = None
+        if (self.arcpath and os.path.exists(self.arcpath) and not resumed and
+                not self.append):
             if not self.overwrite:
                 self.errmsg = "Archive with same name exists and overwrite flag is not set."
                 return False
@@ -172,29 +384,440 @@ class ArcCreator:
                 self.overwritten = True
 
         # Create archive.
-        self._create_log()
-        self.arc = arclib.Archive(self.arcpath)
-        self.arc.create()
+        base = None
+        if self.basearc:
+            base = arclib.read_manifest(self.basearc)
+            if base is None:
+                self.errmsg = "Base archive has no manifest."
+                return False
+        self.progress = Progress(self.on_progress, self.cancelled)
+        self.stats['phase_times'] = self.progress.times
+        try:
+            self.arc = arclib.Archive(self.arcpath)
+        except (OSError, zipfile.BadZipFile) as e:
+            self.errmsg = "Archive to append to could not be read: %s" % e
+            return False
+        self.arc.reader = self.reader
+        prev = None
+        if resumed:
+            self.arc.policy = self.policy
+            self.arc.restore(*resumed[1:])
+        elif self.append and self.arc.zfile:
+            self.appended = True
+            self.arc.policy = self.policy
+            prev = self._open_append()
+        else:
+            try:
+                self.arc.create(policy=self.policy, stream=self.stream)
+            except OSError as e:
+                self.errmsg = "Archive file could not be created: %s" % e
+                return False
+        if self.resume:
+            self._open_journal(resumed)
+        try:
+            notfound = self._write_archive(base, pathfilter, prev)
+        except CreationCancelled:
+            self._discard(prev)
+            self.errmsg = "Archive creation was cancelled."
+            return False
+        except OSError as e:
+            # E.g. a target that exists but cannot be read.
+            self._abort(prev)
+            self.errmsg = "Archive could not be created: %s" % e
+            return False
+        except Exception:
+            self._abort(prev)
+            raise
+        self._close_journal()
+
+        # Errors from here on keep the complete archive.
+        try:
+            if self.delete and not self._delete_targets():
+                return False
+        except CreationCancelled:
+            self._discard(prev)
+            self.errmsg = "Archive creation was cancelled."
+            return False
+        self._check_warnings(notfound)
+
+        # Check that the archive file exists.
+        if self.arcpath and not os.path.exists(self.arcpath):
+            self.errmsg = "Archive file could not be located."
+            return False
+
+        # Record the archive in the catalog.
+        if self.catalog and self.arcpath:
+            self._add_to_catalog()
+        return True
+
+    def plan(self, fraction=PLAN_SAMPLE):
+        """Plans the archive creation without writing anything. The targets
+        are walked and a random sample of the files is compressed as it would
+        be added, up to ``PLAN_SAMPLE_SIZE`` bytes of each, to estimate the
+        archive size and the time taken. Progress is reported through the
+        ``walk`` and ``sample`` phases.
+
+        :param fraction: (float) Fraction of the files sampled; at least
+            ``PLAN_MIN_FILES`` are sampled if there are as many.
+
+        :Postconditions:
+          - Attribute ``arctargets`` is populated.
+
+        :Returns:
+          - (dict) The plan or None on error. It holds the output filename
+            (``outname``), the number of ``files`` and ``dirs``, the total
+            ``bytes_in``, the number of targets ``notfound``, the
+            ``sampled_files`` and ``sampled_bytes``, and the estimated
+            ``est_bytes_out`` and ``est_seconds``. With volumes, it also
+            holds the number of ``volumes``.
+        """
+        if not self.systargets:
+            self.errmsg = "No system targets specified."
+            return None
+        pathfilter = self._compile_filter()
+        if pathfilter is None:
+            return None
+        if not self._check_settings():
+            return None
+        self.progress = Progress(self.on_progress, self.cancelled)
+        self.stats['phase_times'] = self.progress.times
+        try:
+            self.progress.begin("walk")
+            t0 = time.perf_counter()
+            notfound = self._walk(pathfilter)
+            walk_s = time.perf_counter() - t0
+            targets = [i for i in self.arctargets if i.zippath]
+            files = [a for a in targets if not a.isdir]
+            sizes = _size_targets(files)
+            self.progress.end()
+
+            # Each sampled file is scaled up to its full size, so both the time
+            # per file and the time per byte are accounted for.
+            count = min(len(files), max(PLAN_MIN_FILES, int(len(files) * fraction)))
+            import random
+            sample = random.Random(0).sample(files, count)
+            self.progress.begin("sample", count)
+            sampled_bytes = 0
+            size_in = 0
+            size_out = 0.0
+            seconds = 0.0
+            for a in sample:
+                size = sizes.get(id(a), 0)
+                t0 = time.perf_counter()
+                try:
+                    nread, nout = arclib.sample_compression(a.syspath,
+                            self.policy, PLAN_SAMPLE_SIZE)
+                except OSError:
+                    self.progress.update()
+                    continue
+                scale = size / float(nread) if nread else 1.0
+                seconds += (time.perf_counter() - t0) * scale
+                sampled_bytes += nread
+                size_in += size
+                size_out += nout * scale
+                self.progress.update()
+            self.progress.end()
+        except CreationCancelled:
+            self.errmsg = "Planning was cancelled."
+            return None
+
+        bytes_in = sum(sizes.values())
+        ratio = size_out / size_in if size_in else 1.0
+        names = sum(len(arclib.format_zipname(a.syspath, a.zippath, a.isdir).encode("utf-8"))
+                for a in targets)
+        workers = max(1, min(self.jobs, os.cpu_count() or 1))
+        scale = len(files) / float(len(sample)) if sample else 0.0
+        plan = {
+                "outname": self.format_outname(),
+                "files": len(files),
+                "dirs": len(targets) - len(files),
+                "bytes_in": bytes_in,
+                "notfound": len(notfound),
+                "sampled_files": len(sample),
+                "sampled_bytes": sampled_bytes,
+                "est_bytes_out": int(bytes_in * ratio + len(targets) * MEMBER_OVERHEAD + 2 * names),
+                "est_seconds": walk_s + seconds * scale / workers,
+            }
+        if self.volume_size:
+            plan["volumes"] = len(arclib.pack_volumes(targets, sizes,
+                    self.volume_size, self.policy.method, self._volume_reserve()))
+        return plan
+
+    def _check_settings(self):
+        """Checks the compression method and level of ``policy``, the chunk
+        size of ``reader`` and the ``volume_size``.
+
+        :Returns:
+          - (bool) True if the settings are valid, false otherwise.
+        """
+        if self.reader.chunk_size <= 0:
+            self.errmsg = "Chunk size must be positive."
+            return False
+        method = self.policy.method
+        level = self.policy.level
+        if method not in arclib.METHODS:
+            self.errmsg = "Unknown compression method `%s`." % method
+            return False
+        if level is not None and method in arclib.LEVELS:
+            if level not in arclib.LEVELS[method]:
+                levels = arclib.LEVELS[method]
+                self.errmsg = "Compression level for `%s` must be %d to %d." % (
+                        method, levels[0], levels[-1])
+                return False
+        minsize = max(MIN_VOLUME_SIZE, 2 * self._volume_reserve())
+        if self.volume_size and self.volume_size < minsize:
+            self.errmsg = "Volume size must be at least %s." % format_size(minsize)
+            return False
+        return True
+
+    def _volume_reserve(self):
+        """Returns the bytes of each volume reserved for its log and central
+        directory end records."""
+        logsize = len((self.logtxt or "").encode("utf-8"))
+        return arclib.VOLUME_RESERVE + arclib.member_bound(logsize,
+                self.logname, self.policy.method)
+
+    def _exceeds_volume(self, arctarget, sizes):
+        """Returns true if the bound of the member of the given file archiver
+        target exceeds the room of a volume."""
+        name = arclib.format_zipname(arctarget.syspath, arctarget.zippath,
+                arctarget.isdir)
+        bound = arclib.member_bound(sizes[id(arctarget)], name, self.policy.method)
+        return bound > self.volume_size - self._volume_reserve()
+
+    def _compile_filter(self):
+        """Compiles the exclusion patterns.
+
+        :Returns:
+          - ``arcfilter.PathFilter`` or None on error.
+        """
+        pathfilter = arcfilter.PathFilter()
+        try:
+            for p in self.exclude:
+                pathfilter.add(p)
+            if self.exclude_from:
+                pathfilter.load(self.exclude_from)
+        except OSError as e:
+            self.errmsg = "Exclusion patterns could not be read: %s" % e
+            return None
+        except re.error as e:
+            self.errmsg = "Invalid exclusion pattern: %s" % e
+            return None
+        return pathfilter
+
+    def _create_volumes(self, pathfilter):
+        """Creates the archive as volumes of at most ``volume_size`` bytes
+        each. The targets are walked and packed into volumes before any is
+        written, then the volumes are written concurrently, each by one
+        worker. The master log is written to ``outdir`` next to the volumes.
+
+        :param pathfilter: ``arcfilter.PathFilter`` of the paths to leave out.
+
+        :Postconditions:
+          - Attributes ``volumes`` and ``volume_log`` are set.
+
+        :Returns:
+          - (bool) True if the volumes were created, false otherwise.
+        """
+        if (self.stream or self.resume or self.append or self.dedup or
+                self.manifest or self.basearc):
+            self.errmsg = ("Volumes cannot be streamed, resumed, appended to, "
+                    "deduplicated or incremental.")
+            return False
+        self.progress = Progress(self.on_progress, self.cancelled)
+        self.stats['phase_times'] = self.progress.times
+        outdir = os.path.abspath(self.outdir)
+        stem = os.path.splitext(self.format_outname())[0]
+        self.volume_log = os.path.join(outdir, stem + ".txt")
+        self.volumes = []
+        try:
+            self.progress.begin("walk")
+            notfound = self._walk(pathfilter)
+            targets = [i for i in self.arctargets if i.zippath]
+            sizes = _size_targets(targets)
+            packs = arclib.pack_volumes(targets, sizes, self.volume_size,
+                    self.policy.method, self._volume_reserve())
+            self.progress.end()
+
+            paths = [os.path.join(outdir, "%s-%03d.zip" % (stem, i + 1))
+                    for i in range(len(packs))]
+            existing = [p for p in paths + [self.volume_log] if os.path.exists(p)]
+            if existing and not self.overwrite:
+                self.errmsg = "Volume with same name exists and overwrite flag is not set."
+                return False
+            for p in existing:
+                os.remove(p)
+                self.overwritten = True
+            self.volumes = paths
+
+            self.progress.begin("compress", len(targets), sum(sizes.values()))
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max(self.jobs, 1)) as pool:
+                futures = [pool.submit(self._write_volume, i, p)
+                        for i, p in enumerate(packs)]
+                for pack, future in zip(packs, futures):
+                    added, notadded = future.result()
+                    self.added.extend(added)
+                    self.notadded.extend(notadded)
+                    self.progress.update(len(pack),
+                            sum(sizes.get(id(a), 0) for a in pack))
+            self.progress.end()
+
+            self.progress.begin("log")
+            self._write_volume_log(packs)
+            self.stats['files_added'] = len(self.added)
+            self.stats['bytes_in'] = sum(sizes.get(id(a), 0) for a in self.added)
+            self.stats['bytes_out'] = sum(os.path.getsize(p) for p in self.volumes)
+            self.stats['peak_rss'] = arclib.peak_rss()
+            self.progress.end()
+        except CreationCancelled:
+            self._remove_volumes()
+            self.errmsg = "Archive creation was cancelled."
+            return False
+        except OSError as e:
+            self._remove_volumes()
+            self.errmsg = "Archive could not be created: %s" % e
+            return False
+
+        # Errors from here on keep the complete volumes.
+        try:
+            if self.delete and not self._delete_targets(packs):
+                return False
+        except CreationCancelled:
+            self._remove_volumes()
+            self.errmsg = "Archive creation was cancelled."
+            return False
+        self._check_warnings(notfound)
+        if any(self._exceeds_volume(a, sizes) for a in targets if id(a) in sizes):
+            self.warnmsgs.append("Some targets exceed the volume size; each has a volume of its own.")
+        if self.catalog:
+            self._add_to_catalog()
+        return True
+
+    def _walk(self, pathfilter=None):
+        """Walks the system targets, using and updating the walk cache if
+        one is set.
+
+        :Postconditions:
+          - Attribute ``arctargets`` is populated.
+          - Stats ``walk_cache_hits`` and ``walk_cache_misses`` are populated
+            if a walk cache is used.
+
+        :Returns:
+          - List of system targets not found.
+
+        :Raises:
+          - CreationCancelled if the creation is cancelled.
+        """
+        cache = None
+        if self.walk_cache:
+            cache = arclib.WalkCache(self.walk_cache)
+            cache.load()
+        onwalk = lambda a: self.progress.update(0 if a.isdir else 1)
         self.arctargets, notfound = arclib.convert_sys2arc(
                 self.systargets,
                 flatten=self.flatten,
-                flatten_ld=self.flatten_ld)
-        if self.logpath:
-            self.arctargets.append(arclib.ArcTarget(self.logpath, self.logname))
-        # Iterate only through archive targets that have valid zip file paths.
-        for a in [i for i in self.arctargets if i.zippath]:
-            if self.arc.add(a):
-                self.added.append(a)
-            else:
-                self.notadded.append(a)
-        self._delete_log()
+                flatten_ld=self.flatten_ld,
+                onwalk=onwalk,
+                exclude=pathfilter,
+                cache=cache)
+        if cache:
+            self.stats['walk_cache_hits'] = cache.hits
+            self.stats['walk_cache_misses'] = cache.misses
+            try:
+                cache.save()
+            except OSError:
+                self.warnmsgs.append("Walk cache could not be saved.")
+        return notfound
+
+    def _remove_volumes(self):
+        """Removes the volumes and master log written so far."""
+        for p in self.volumes + [self.volume_log]:
+            if os.path.exists(p):
+                os.remove(p)
+
+    def _write_volume(self, num, targets):
+        """Writes the volume with the given index holding the given archiver
+        targets; called by the volume workers.
+
+        :Returns:
+          - Tuple of the lists of archiver targets added and not added.
+
+        :Raises:
+          - CreationCancelled if the creation is cancelled.
+        """
+        arc = arclib.Archive(self.volumes[num])
+        arc.reader = self.reader
+        arc.create(policy=self.policy)
+        added = []
+        notadded = []
+        try:
+            for a in targets:
+                if self.cancelled.is_set():
+                    raise CreationCancelled()
+                if arc.add(a):
+                    added.append(a)
+                else:
+                    notadded.append(a)
+            logdoc = self._format_log()
+            if logdoc:
+                logdoc += "\n" + adoclib.format_section(
+                        "Volume %d of %d" % (num + 1, len(self.volumes)),
+                        "The members of each volume are listed in `%s`.\n" %
+                        os.path.basename(self.volume_log))
+                if arc.add_text(self.logname, logdoc):
+                    arc.hint(self.logname)
+        finally:
+            arc.close()
+        return (added, notadded)
+
+    def _write_volume_log(self, packs):
+        """Writes the master log of the volumes, listing the added members of
+        each volume in a section of its own."""
+        added = set(id(a) for a in self.added)
+        sections = [self.logtxt + "\n"] if self.logtxt else []
+        for path, pack in zip(self.volumes, packs):
+            names = [arclib.format_zipname(a.syspath, a.zippath, a.isdir)
+                    for a in pack if id(a) in added]
+            sections.append(adoclib.format_section(os.path.basename(path),
+                    "".join("* %s\n" % n for n in names)))
+        log_ts = arclib.format_ts(self.ts, "expand")
+        with open(self.volume_log, "w", encoding="utf-8") as fo:
+            fo.write(adoclib.format_doc(self.name, "\n".join(sections), date=log_ts))
+
+    def _delete_targets(self, packs=None):
+        """Deletes the added targets from the filesystem, only once the archive
+        is verified (if requested). Creation can no longer be cancelled once
+        deletion begins.
+
+        :param packs: Lists of the archiver targets of each volume, if created
+            as volumes.
+
+        :Postconditions:
+          - Attribute ``notdel`` is populated.
 
-        # Delete added targets from the filesystem.
+        :Returns:
+          - (bool) True if the targets were deleted, false if verification
+            failed.
+        """
         self.notdel = []
-        if self.delete:
-            self.notdel = arclib.delete_from_filesys(self.arctargets, self.notadded)
+        if self.verify and not self._verify_archive(packs):
+            return False
+        self.progress.begin("delete", len(self.arctargets))
+        # Targets skipped as unchanged or already in an archive appended to
+        # were not written or verified now so are kept.
+        keep = self.notadded + self.unchanged + self.existing
+        self.notdel = arclib.delete_from_filesys(self.arctargets, keep,
+                jobs=self.jobs)
+        self.progress.files_done = len(self.arctargets)
+        self.progress.end()
+        return True
 
-        # Check for warnings during creation.
+    def _check_warnings(self, notfound):
+        """Adds warnings for the targets not found, added or deleted.
+
+        :param notfound: List of system targets not found.
+        """
         if notfound:
             self.warnmsgs.append("Some system targets not found.")
         if self.notadded:
@@ -202,12 +825,856 @@ class ArcCreator:
         if self.notdel:
             self.warnmsgs.append("Some system targets not deleted as requested.")
 
-        # Check that the archive file exists.
-        if not os.path.exists(self.arcpath):
-            self.errmsg = "Archive file could not be located."
+    def _write_archive(self, base, pathfilter=None, prev=None):
+        """Walks the system targets and writes the archive members and log.
+
+        :param base: (dict) Manifest of the base archive or None.
+        :param pathfilter: ``arcfilter.PathFilter`` of the paths to leave out.
+        :param prev: Tuple of the log and manifest of the archive appended to
+            (see ``_open_append()``) or None.
+
+        :Returns:
+          - List of system targets not found.
+
+        :Raises:
+          - CreationCancelled if the creation is cancelled.
+        """
+        self.progress.begin("walk")
+        notfound = self._walk(pathfilter)
+        # Iterate only through archive targets that have valid zip file paths.
+        targets = [i for i in self.arctargets if i.zippath]
+
+        # Targets committed before an interrupted creation are not added
+        # again, nor are targets already in an archive appended to.
+        done = []
+        if self.arc.index:
+            todo = []
+            for a in targets:
+                if arclib.format_zipname(a.syspath, a.zippath, a.isdir) in self.arc.index:
+                    done.append(a)
+                else:
+                    todo.append(a)
+            targets = todo
+            (self.existing if self.appended else self.added).extend(done)
+        prevlog, prevmanifest = prev or ("", None)
+        states = {}
+        if self.manifest or base or prevmanifest:
+            # Committed targets are listed in the manifest of a resumed
+            # archive, while targets already in an archive appended to keep
+            # their previous entries.
+            states = _stat_targets(targets if self.appended else targets + done)
+        if base:
+            targets = self._skip_unchanged(targets, states, base["files"])
+        dups = []
+        if self.dedup:
+            targets, dups = arclib.find_duplicates(targets)
+        sizes = {}
+        if self.on_progress:
+            sizes = _size_targets(targets)
+        self.progress.end()
+
+        self.progress.begin("compress", len(targets), sum(sizes.values()))
+        adds = self.arc.add_all(targets, jobs=self.jobs)
+        with contextlib.closing(adds):
+            for a, ok in adds:
+                if ok:
+                    self.added.append(a)
+                    if self.journal:
+                        self._checkpoint(a)
+                else:
+                    self.notadded.append(a)
+                self.progress.update(1, sizes.get(id(a), 0))
+        self.progress.end()
+
+        # The log is added from memory so no temporary file is needed.
+        self.progress.begin("log")
+        logdoc = self._format_log(prevlog)
+        if logdoc:
+            if self.arc.add_text(self.logname, logdoc):
+                self.arc.hint(self.logname)
+            else:
+                self.warnmsgs.append("Log not added to archive.")
+        if self.dedup:
+            self._add_duplicates(dups)
+        elif self.arc.refs:
+            self.arc.add_dedup_index()
+        if self.manifest or base or prevmanifest:
+            self._add_manifest(states, base, prevmanifest)
+        infos = self.arc.zfile.infolist() if self.arc.zfile else []
+        self.stats['files_added'] = len(self.added)
+        self.stats['bytes_in'] = sum(i.file_size for i in infos)
+        self.stats['bytes_out'] = sum(i.compress_size for i in infos)
+        self.stats['peak_rss'] = arclib.peak_rss()
+        self.arc.close()
+        self.progress.end()
+        return notfound
+
+    def _open_append(self):
+        """Prepares the existing archive for appending. Its log, deduplication
+        index and manifest are taken out of the archive since they are
+        rewritten after the new members are added; as they are normally at the
+        end of the archive, the new members are written over them.
+
+        :Postconditions:
+          - Attribute ``logname`` is set to the name of the existing log.
+
+        :Returns:
+          - Tuple of the existing log text (str) and manifest (dict or None).
+        """
+        log = ""
+        oldname = self.arc.logname()
+        if oldname:
+            log = self.arc.read_log().decode("utf-8", "replace")
+            self.logname = oldname
+        manifest = None
+        if arclib.MANIFEST in self.arc.index:
+            manifest = json.loads(self.arc.read(arclib.MANIFEST).decode("utf-8"))
+        self.arc.drop([oldname, arclib.DEDUP_INDEX, arclib.MANIFEST])
+        return (log, manifest)
+
+    def _verify_archive(self, packs=None):
+        """Verifies the written archive and checks the added targets against
+        their members.
+
+        :param packs: Lists of the archiver targets of each volume, if created
+            as volumes; each volume is verified.
+
+        :Postconditions:
+          - Attribute ``verifyfail`` is populated.
+
+        :Returns:
+          - (bool) True if the archive was verified, false otherwise.
+        """
+        if not self.arcpath and not packs:
+            self.warnmsgs.append("Archive written to stream not verified.")
+            return True
+        added = set(id(a) for a in self.added)
+        parts = [(self.arcpath, self.added)]
+        if packs:
+            parts = [(p, [a for a in pack if id(a) in added])
+                    for p, pack in zip(self.volumes, packs)]
+        self.progress.begin("verify", len(self.added))
+        self.verifyfail = []
+        for path, arctargets in parts:
+            sources = dict((arclib.format_zipname(a.syspath, a.zippath, a.isdir),
+                    a.syspath) for a in arctargets)
+            # Only the members written now are checked when appending.
+            members = None
+            if self.appended:
+                members = set(self.arc.refs.get(n, n) for n in sources)
+                members.update([self.logname, arclib.DEDUP_INDEX, arclib.MANIFEST])
+            self.verifyfail += arclib.verify_archive(path, jobs=self.jobs,
+                    sources=sources, members=members)
+            self.progress.update(len(sources))
+        self.progress.end()
+        if self.verifyfail:
+            self.errmsg = "Archive failed verification; targets not deleted."
             return False
         return True
 
+    def cancel(self):
+        """Cancels an archive creation in progress; may be called from another
+        thread. The creation stops at its next member and the partial archive
+        is removed. Has no effect once deletion of the targets has begun."""
+        self.cancelled.set()
+
+    def _discard(self, prev=None):
+        """Closes and removes the partially written archive and its journal.
+        An archive appended to is instead restored to its previous members.
+
+        :param prev: Tuple of the log and manifest of the archive appended to
+            (see ``_open_append()``) or None.
+        """
+        if self.appended:
+            log, manifest = prev
+            if self.arc.zfile.fp is None:
+                # Cancelled once the archive was closed, e.g. while verifying;
+                # it is reopened to take out what was written.
+                self.arc = arclib.Archive(self.arcpath)
+            names = set(arclib.format_zipname(a.syspath, a.zippath, a.isdir)
+                    for a in self.added)
+            names.update([self.logname, arclib.DEDUP_INDEX, arclib.MANIFEST])
+            self.arc.drop(names)
+            for name in names.intersection(self.arc.refs):
+                del self.arc.refs[name]
+                self.arc.index.pop(name, None)
+            if log and self.arc.add_text(self.logname, log):
+                self.arc.hint(self.logname)
+            self.arc.add_dedup_index()
+            if manifest:
+                self.arc.add_text(arclib.MANIFEST, arclib.format_manifest(
+                        manifest["files"], manifest["base"], manifest["deleted"]))
+            self.arc.close()
+            return
+        self.arc.close()
+        if self.arcpath and os.path.exists(self.arcpath):
+            os.remove(self.arcpath)
+        self._close_journal()
+
+    def _abort(self, prev=None):
+        """Cleans up after an error raised while creating the archive so no
+        file is left open. A journaled archive is closed as it is so the
+        creation can be resumed; any other is discarded as if cancelled.
+
+        :param prev: See ``_discard()``.
+        """
+        try:
+            if self.journal and not self.appended:
+                self.journal.close()
+                self.journal = None
+                self.arc.close()
+            else:
+                self._discard(prev)
+        except Exception:
+            # The original error is the one reported.
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+            if self.arc.zfile and self.arc.zfile.fp:
+                self.arc.zfile.fp.close()
+
+    def journal_path(self):
+        """Returns the path of the creation journal. The path does not include
+        the timestamp so a later run can find the journal to resume."""
+        if not self.name:
+            self.guess_name()
+        return os.path.join(os.path.abspath(self.outdir), self.name + ".arcjournal")
+
+    def _read_journal(self):
+        """Reads the journal of an interrupted creation of the archive, if any.
+
+        :Postconditions:
+          - Attribute ``ts`` is set to the timestamp of the interrupted creation.
+          - Attribute ``errmsg`` is set if the journal is for other targets
+            or was made with other options (see ``_journal_options()``).
+
+        :Returns:
+          - Tuple of the journal header, the ``ZipInfo`` objects of the
+            committed members and the offset past the last one; None if there
+            is no valid journal.
+        """
+        path = self.journal_path()
+        if not os.path.isfile(path):
+            return None
+        resumed = arclib.read_journal(path)
+        if not resumed:
+            return None
+        header = resumed[0]
+        if header.get("systargets") != self.systargets:
+            self.errmsg = "Journal `%s` is for other targets." % path
+            return None
+        if header.get("options") != self._journal_options():
+            self.errmsg = "Journal `%s` was made with other options." % path
+            return None
+        self.ts = header.get("ts", self.ts)
+        return resumed
+
+    def _open_journal(self, resumed):
+        """Opens the creation journal, continuing the given resumed journal or
+        starting a new one."""
+        path = self.journal_path()
+        if resumed:
+            # Rewrite the journal without any incomplete trailing line; each
+            # member ends where the next begins. The journal is replaced
+            # atomically so an interruption now does not lose it.
+            header, zinfos, end = resumed
+            ends = [z.header_offset for z in zinfos[1:]] + [end]
+            with open(path + ".tmp", "w") as fo:
+                fo.write(json.dumps(header) + "\n")
+                fo.writelines(arclib.format_journal_entry(z, e)
+                        for z, e in zip(zinfos, ends))
+            os.replace(path + ".tmp", path)
+            self.journal = open(path, "a")
+        else:
+            header = {"ts": self.ts, "systargets": self.systargets,
+                    "options": self._journal_options()}
+            self.journal = open(path, "w")
+            self.journal.write(json.dumps(header) + "\n")
+            self.journal.flush()
+
+    def _journal_options(self):
+        """Returns the options recorded in the creation journal; a creation
+        is only resumed with the same options, since they decide which members
+        are added and how they are stored."""
+        return {
+                "method": self.policy.method,
+                "level": self.policy.level,
+                "sample": self.policy.sample,
+                "flatten": self.flatten,
+                "flatten_ld": self.flatten_ld,
+                "exclude": list(self.exclude),
+                "exclude_from": self.exclude_from and os.path.abspath(self.exclude_from),
+                "basearc": self.basearc and os.path.abspath(self.basearc),
+                "dedup": self.dedup,
+                "manifest": self.manifest,
+                "no_log": self.no_log,
+            }
+
+    def _checkpoint(self, arctarget):
+        """Journals the given archiver target once its member is committed to
+        the archive file."""
+        name = arclib.format_zipname(arctarget.syspath, arctarget.zippath,
+                arctarget.isdir)
+        zinfo = self.arc.zfile.NameToInfo.get(name)
+        if not zinfo:
+            return
+        self.arc.zfile.fp.flush()
+        self.journal.write(arclib.format_journal_entry(zinfo,
+                self.arc.zfile.start_dir))
+        self.journal.flush()
+
+    def _close_journal(self):
+        """Closes and removes the creation journal, if open."""
+        if not self.journal:
+            return
+        self.journal.close()
+        self.journal = None
+        os.remove(self.journal_path())
+
+    def _add_to_catalog(self):
+        """Records the created archive, or each of its volumes, in the catalog
+        database."""
+        import sqlite3
+        import arccatalog
+        try:
+            catalog = arccatalog.Catalog(self.catalog)
+            try:
+                for path in self.volumes or [self.arcpath]:
+                    catalog.add(path)
+            finally:
+                catalog.close()
+        except (OSError, ValueError, sqlite3.Error, zipfile.BadZipFile,
+                NotImplementedError):
+            self.warnmsgs.append("Archive not recorded in catalog.")
+
+class CreationCancelled(Exception):
+    """Raised within an archive creation when it has been cancelled."""
+
+class Progress:
+    """Tracks the progress of an archive creation through its phases (walk,
+    compress, log, delete) and reports it to a callback."""
+
+    def __init__(self, callback=None, cancelled=None):
+        #: Function called with this object whenever progress is made; it
+        #: should return quickly.
+        self.callback = callback
+        #: Event that, once set, makes the next progress raise
+        #: ``CreationCancelled``.
+        self.cancelled = cancelled
+        #: Name of the current phase.
+        self.phase = ""
+        #: Number of files processed in the current phase.
+        self.files_done = 0
+        #: Number of files to process in the current phase; zero if unknown.
+        self.files_total = 0
+        #: Number of bytes processed in the current phase.
+        self.bytes_done = 0
+        #: Number of bytes to process in the current phase; zero if unknown.
+        self.bytes_total = 0
+        #: Maps the name of each completed phase to its seconds taken.
+        self.times = {}
+        #: Time the current phase began.
+        self.started = 0.0
+        #: True once the current phase has ended.
+        self.ended = False
+
+    def begin(self, phase, files_total=0, bytes_total=0):
+        """Begins the given phase.
+
+        :Raises:
+          - CreationCancelled if the creation has been cancelled.
+        """
+        self._check_cancelled()
+        self.phase = phase
+        self.files_done = 0
+        self.files_total = files_total
+        self.bytes_done = 0
+        self.bytes_total = bytes_total
+        self.started = time.perf_counter()
+        self.ended = False
+        self._report()
+
+    def update(self, files=1, nbytes=0):
+        """Records progress in the current phase.
+
+        :Raises:
+          - CreationCancelled if the creation has been cancelled.
+        """
+        self._check_cancelled()
+        self.files_done += files
+        self.bytes_done += nbytes
+        self._report()
+
+    def end(self):
+        """Ends the current phase, recording its time taken."""
+        self.times[self.phase] = self.times.get(self.phase, 0.0) + self.elapsed()
+        self.ended = True
+        self._report()
+
+    def elapsed(self):
+        """Returns the seconds since the current phase began."""
+        return time.perf_counter() - self.started
+
+    def rate(self):
+        """Returns the rate of the current phase in bytes per second, or in
+        files per second if the phase has no byte total."""
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        done = self.bytes_done if self.bytes_total else self.files_done
+        return done / elapsed
+
+    def eta(self):
+        """Returns the estimated seconds remaining in the current phase or None
+        if it cannot be estimated."""
+        rate = self.rate()
+        if self.bytes_total:
+            remain = self.bytes_total - self.bytes_done
+        elif self.files_total:
+            remain = self.files_total - self.files_done
+        else:
+            return None
+        if rate <= 0:
+            return None
+        return max(remain, 0) / rate
+
+    def _check_cancelled(self):
+        """Raises ``CreationCancelled`` if the creation has been cancelled."""
+        if self.cancelled and self.cancelled.is_set():
+            raise CreationCancelled()
+
+    def _report(self):
+        """Calls the callback, if any."""
+        if self.callback:
+            self.callback(self)
+
+class SnapshotBuilder:
+    """Rebuilds a full archive from a chain of incremental archives."""
+
+    def __init__(self, arcpath="", outpath=""):
+        #: Path of the newest incremental archive in the chain. The chain is
+        #: followed through the base archive named in each manifest, which is
+        #: expected in the same directory.
+        self.arcpath = arcpath
+        #: Path of the full archive to create.
+        self.outpath = outpath
+
+        #: Paths of the archives in the chain, newest first.
+        self.chain = []
+        #: Member names in the newest manifest not found in any archive of the
+        #: chain.
+        self.missing = []
+        #: Holds error message if the rebuild fails.
+        self.errmsg = ""
+
+    def resolve_chain(self):
+        """Resolves the chain of archives from the newest archive back to the
+        full archive it is based on.
+
+        :Returns:
+          - (dict) The manifest of the newest archive or None on error.
+        """
+        self.chain = []
+        newest = None
+        path = self.arcpath
+        while path:
+            if path in self.chain:
+                self.errmsg = "Archive chain loops back to `%s`." % path
+                return None
+            if not os.path.exists(path):
+                self.errmsg = "Archive `%s` in chain not found." % path
+                return None
+            manifest = arclib.read_manifest(path)
+            if manifest is None:
+                self.errmsg = "Archive `%s` has no manifest." % path
+                return None
+            self.chain.append(path)
+            newest = newest or manifest
+            if manifest["base"]:
+                path = os.path.join(os.path.dirname(path), manifest["base"])
+            else:
+                path = ""
+        return newest
+
+    def build(self):
+        """Builds the full archive.
+
+        :Postconditions:
+          - Attributes ``chain`` and ``missing`` are populated.
+
+        :Returns:
+          - (bool) True if the archive was built, false otherwise.
+        """
+        if os.path.exists(self.outpath):
+            self.errmsg = "Output archive already exists."
+            return False
+        manifest = self.resolve_chain()
+        if manifest is None:
+            return False
+
+        # Map each member name to the newest archive containing it.
+        zfiles = [zipfile.ZipFile(p) for p in self.chain]
+        sources = {}
+        for zf in reversed(zfiles):
+            for info in zf.infolist():
+                sources[info.filename] = (zf, info)
+            for name, stored in arclib.read_dedup_index(zf).items():
+                sources[name] = (zf, zf.getinfo(stored))
+
+        self.missing = []
+        with zipfile.ZipFile(self.outpath, "w") as out:
+            for name in list(manifest["files"]) + [arclib.LOGNAME]:
+                if name not in sources:
+                    if name != arclib.LOGNAME:
+                        self.missing.append(name)
+                    continue
+                _copy_member(out, name, *sources[name])
+            out.writestr(arclib.MANIFEST, arclib.format_manifest(manifest["files"]))
+        for zf in zfiles:
+            zf.close()
+        return True
+
+class ArcExtractor:
+    """Manages the extraction of an archive."""
+
+    def __init__(self, arcpath="", outdir="."):
+        #: Path of the archive to extract.
+        self.arcpath = arcpath
+        #: Directory to extract the archive into.
+        self.outdir = outdir
+        #: List of patterns; if any are given, only members matching one of
+        #: them are extracted. Patterns are globs matched against the full
+        #: member name unless prefixed with `re:`, in which case the rest is a
+        #: regular expression searched for in the name.
+        self.include = []
+        #: List of patterns; members matching any of them are not extracted.
+        self.exclude = []
+        #: Flag indicating if the archive log is also extracted.
+        self.with_log = False
+        #: Flag indicating if existing files are overwritten; otherwise they
+        #: are skipped.
+        self.overwrite = False
+        #: Number of parallel decompression workers.
+        self.jobs = 1
+
+        #: List of names of the extracted members.
+        self.extracted = []
+        #: List of names of members skipped since the file already exists.
+        self.skipped = []
+        #: List of ``arclib.ExtractFailure`` objects for members that could
+        #: not be extracted.
+        self.failed = []
+        #: Holds error message if the extraction fails.
+        self.errmsg = ""
+
+    def extract(self):
+        """Extracts the archive. The modification times recorded in the
+        archive manifest are restored if it has one; otherwise those of the
+        zip entries are used.
+
+        :Postconditions:
+          - Attributes ``extracted``, ``skipped`` and ``failed`` are
+            populated.
+
+        :Returns:
+          - (bool) True if every selected member was extracted, false
+            otherwise.
+        """
+        try:
+            include = _compile_patterns(self.include)
+            exclude = _compile_patterns(self.exclude)
+        except re.error as e:
+            self.errmsg = "Invalid pattern: %s" % e
+            return False
+        try:
+            entries, refs = arclib.read_entries(self.arcpath)
+            manifest = None
+            if any(arclib.MANIFEST == e.name for e in entries):
+                manifest = arclib.read_manifest(self.arcpath)
+        except (OSError, ValueError, zipfile.BadZipFile, NotImplementedError) as e:
+            self.errmsg = "Archive could not be read: %s" % e
+            return False
+
+        skip = set([arclib.MANIFEST, arclib.DEDUP_INDEX])
+        if not self.with_log:
+            skip.update(arclib.format_lognames(self.arcpath))
+        byname = dict((e.name, e) for e in entries)
+        members = [(e.name, e) for e in entries]
+        members += [(n, byname[s]) for n, s in refs.items() if s in byname]
+        members = [(n, e) for n, e in members if n not in skip and
+                (not include or _match_any(n, include)) and
+                not _match_any(n, exclude)]
+        mtimes = {}
+        if manifest:
+            mtimes = dict((n, v[1]) for n, v in manifest["files"].items())
+        self.extracted, self.skipped, self.failed = arclib.extract_members(
+                self.arcpath, members, self.outdir, jobs=self.jobs,
+                mtimes=mtimes, overwrite=self.overwrite)
+        if self.failed:
+            self.errmsg = "%d member(s) could not be extracted." % len(self.failed)
+            return False
+        return True
+
+class ArcBatch:
+    """Manages the creation of many archives in one process."""
+
+    def __init__(self):
+        #: List of archive creators to run, one per archive.
+        self.arcctrs = []
+        #: Number of archives created in parallel by worker threads.
+        self.workers = 1
+
+        #: List of archive creators whose archive could not be created.
+        self.failed = []
+        #: Holds error message if loading a batch manifest fails.
+        self.errmsg = ""
+
+    def add(self, arcctr):
+        """Adds an archive creator to the batch."""
+        self.arcctrs.append(arcctr)
+
+    def load(self, path, factory=None):
+        """Loads archive specs from a batch manifest and adds an archive creator
+        for each. The manifest is either JSON lines (one object per line) or,
+        if the path ends with ``.csv``, CSV with a header row. See
+        ``apply_spec()`` for the spec keys.
+
+        :param factory: Callable returning a new archive creator with default
+            settings applied; ``ArcCreator`` if not given.
+
+        :Returns:
+          - (bool) True if all specs were loaded, false otherwise.
+        """
+        factory = factory or ArcCreator
+        try:
+            import csv
+            with open(path, newline="") as fi:
+                if path.lower().endswith(".csv"):
+                    specs = list(csv.DictReader(fi))
+                else:
+                    specs = [json.loads(l) for l in fi if l.strip()]
+            for spec in specs:
+                arcctr = factory()
+                apply_spec(arcctr, spec)
+                self.add(arcctr)
+        except (OSError, ValueError) as e:
+            self.errmsg = "Batch manifest could not be loaded: %s" % e
+            return False
+        return True
+
+    def run(self):
+        """Creates the archives of the batch. With more than one worker, the
+        archives are created concurrently but still yielded in order.
+
+        :Postconditions:
+          - Attribute ``failed`` is populated.
+
+        :Returns:
+          - Generator of tuples of each archive creator and the result of its
+            ``create_archive()``.
+        """
+        self.failed = []
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as pool:
+            results = pool.map(self._create, self.arcctrs)
+            for arcctr, ok in zip(self.arcctrs, results):
+                if not ok:
+                    self.failed.append(arcctr)
+                yield (arcctr, ok)
+
+    def _create(self, arcctr):
+        """Creates the archive of the given archive creator. An error raised
+        while creating one archive fails that archive rather than the batch.
+
+        :Returns:
+          - (bool) True if the archive was created, false otherwise.
+        """
+        try:
+            return arcctr.create_archive()
+        except Exception as e:
+            # The creator has already closed or discarded its archive.
+            arcctr.errmsg = "Archive could not be created: %s" % e
+            return False
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def apply_spec(arcctr, spec):
+    """Applies an archive spec from a batch manifest to an archive creator.
+
+    The spec keys are ``targets`` (list of paths, or a string of paths
+    separated by ``;``), ``name``, ``log``, ``outdir``, ``ts`` (timestamp
+    style), ``method``, ``level``, ``jobs``, ``base`` and the flags
+    ``delete``, ``flatten``, ``flatten_ld``, ``overwrite``, ``sample``,
+    ``manifest``, ``dedup`` and ``append``, plus ``exclude`` (list of
+    patterns, or a string of patterns separated by ``;``), ``exclude_from``
+    and ``walk_cache``. Missing or empty values keep the existing setting.
+
+    :Raises:
+      - ValueError if the spec has an unknown key or bad value.
+    """
+    for key, val in spec.items():
+        if val is None or "" == val:
+            continue
+        if key in _SPEC_FLAGS:
+            setattr(arcctr, _SPEC_FLAGS[key], _spec_bool(val))
+        elif "sample" == key:
+            arcctr.policy.sample = _spec_bool(val)
+        elif "targets" == key:
+            if isinstance(val, str):
+                val = [t for t in val.split(";") if t]
+            arcctr.systargets = [os.path.abspath(t) for t in val]
+        elif "exclude" == key:
+            if isinstance(val, str):
+                val = [p for p in val.split(";") if p]
+            arcctr.exclude = list(val)
+        elif key in ("name", "outdir", "exclude_from", "walk_cache"):
+            setattr(arcctr, key, val)
+        elif "log" == key:
+            arcctr.logtxt = val
+        elif "ts" == key:
+            arcctr.ts_style = val
+        elif "base" == key:
+            arcctr.basearc = val
+        elif "jobs" == key:
+            arcctr.jobs = int(val)
+        elif "method" == key:
+            arcctr.policy.method = val
+        elif "level" == key:
+            arcctr.policy.level = int(val)
+        else:
+            raise ValueError("unknown spec key `%s`" % key)
+
+def format_result(arcctr, ok):
+    """Formats a record of the result of an archive creation.
+
+    :Returns:
+      - (dict) The result record.
+    """
+    return {
+            "name": arcctr.name,
+            "arcpath": arcctr.arcpath,
+            "ok": ok,
+            "errmsg": arcctr.errmsg,
+            "warnings": arcctr.warnmsgs,
+            "added": len(arcctr.added),
+            "notadded": len(arcctr.notadded),
+            "notdel": [f.path for f in arcctr.notdel],
+            "volumes": arcctr.volumes,
+            "stats": arcctr.stats,
+        }
+
+def format_size(nbytes):
+    """Formats the given number of bytes for display."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if nbytes < 1024:
+            break
+        nbytes /= 1024.0
+    else:
+        unit = "TiB"
+    return "%.1f %s" % (nbytes, unit)
+
+def format_plan(plan):
+    """Formats a one line summary of a plan from ``ArcCreator.plan()``."""
+    text = "%d files, %s; about %s archived in %d:%02d" % (plan["files"],
+            format_size(plan["bytes_in"]), format_size(plan["est_bytes_out"]),
+            *divmod(int(plan["est_seconds"]), 60))
+    if "volumes" in plan:
+        text += " (%d volumes)" % plan["volumes"]
+    return text
+
+def verify_archive(arcpath, jobs=1, srcdir=""):
+    """Verifies the archive at the given path, optionally checking its members
+    against the files under the given source directory they were archived
+    from. The log, manifest and deduplication index are not checked against
+    the source directory.
+
+    :Returns:
+      - List of ``arclib.VerifyFailure`` objects; empty if verified.
+    """
+    sources = None
+    if srcdir:
+        try:
+            with zipfile.ZipFile(arcpath) as zf:
+                names = zf.namelist() + list(arclib.read_dedup_index(zf))
+        except (OSError, zipfile.BadZipFile) as e:
+            return [arclib.VerifyFailure("", "Archive could not be read: %s" % e)]
+        skip = set(arclib.format_lognames(arcpath) +
+                [arclib.MANIFEST, arclib.DEDUP_INDEX])
+        sources = dict((n, os.path.join(srcdir, n)) for n in names
+                if n not in skip)
+    return arclib.verify_archive(arcpath, jobs=jobs, sources=sources)
+
+def _compile_patterns(patterns):
+    """Compiles extraction filter patterns (see ``ArcExtractor.include``) to a
+    list of match functions.
+
+    :Raises:
+      - re.error if a regular expression is invalid.
+    """
+    import fnmatch
+    matchers = []
+    for p in patterns:
+        if p.startswith("re:"):
+            matchers.append(re.compile(p[3:]).search)
+        else:
+            matchers.append(re.compile(fnmatch.translate(p)).match)
+    return matchers
+
+def _match_any(name, matchers):
+    """Returns true if the given member name matches any of the matchers."""
+    return any(m(name) for m in matchers)
+
+def _spec_bool(val):
+    """Converts a spec flag value, which may be text from a CSV file, to a
+    bool."""
+    if isinstance(val, bool):
+        return val
+    return str(val).lower() in ("1", "true", "yes", "y")
+
+def _stat_targets(arctargets):
+    """Returns a dict mapping the member names of the given archiver targets to
+    lists of their size and modification time. Targets that cannot be stat'd
+    are left out."""
+    states = {}
+    for a in arctargets:
+        name = arclib.format_zipname(a.syspath, a.zippath, a.isdir)
+        try:
+            st = os.stat(a.syspath)
+        except OSError:
+            continue
+        size = 0 if name.endswith("/") else st.st_size
+        states.setdefault(name, [size, st.st_mtime])
+    return states
+
+def _size_targets(arctargets):
+    """Returns a dict mapping the id of each of the given file archiver targets
+    to its size. Targets that cannot be stat'd are left out."""
+    sizes = {}
+    for a in arctargets:
+        if a.isdir:
+            continue
+        try:
+            sizes[id(a)] = os.path.getsize(a.syspath)
+        except OSError:
+            pass
+    return sizes
+
+def _copy_member(out, name, zf, info):
+    """Copies a member of one zip file into another under the given name,
+    keeping its metadata and compression method."""
+    zinfo = zipfile.ZipInfo(name, info.date_time)
+    zinfo.external_attr = info.external_attr
+    zinfo.compress_type = info.compress_type
+    if info.is_dir():
+        out.writestr(zinfo, b"")
+        return
+    zinfo.file_size = info.file_size
+    import shutil
+    with zf.open(info) as fi, out.open(zinfo, "w") as fo:
+        shutil.copyfileobj(fi, fo, arclib.CHUNK_SIZE)
+
 ##==============================================================#
 ## SECTION: Main Body                                           #
 ##==============================================================#
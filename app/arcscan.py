@@ -0,0 +1,340 @@
+"""Low-level scanning of zip archive structures. These functions read only the
+records they need from the archive file rather than parsing the whole central
+directory like the ``zipfile`` module does on open."""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+##==============================================================#
+## SECTION: Imports                                             #
+##==============================================================#
+
+import bz2
+import collections
+import lzma
+import os
+import struct
+import zipfile
+import zlib
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Prefix of the zip comment recording the offset of a member's local header
+#: so that it can be read without scanning the central directory.
+HINT_PREFIX = b"archint:"
+
+#: Size in bytes of reads while scanning the central directory.
+SCAN_SIZE = 64 * 1024
+
+_EOCD = struct.Struct("<4s4H2LH")
+_EOCD_SIG = b"PK\x05\x06"
+_EOCD64_LOC = struct.Struct("<4sLQL")
+_EOCD64_LOC_SIG = b"PK\x06\x07"
+_EOCD64 = struct.Struct("<4sQ2H2L4Q")
+_CDIR = struct.Struct("<4s4B4HL2L5H2L")
+_CDIR_SIG = b"PK\x01\x02"
+_LOCAL = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIG = b"PK\x03\x04"
+
+#: A central directory entry. The ``date_time`` is a tuple like that of
+#: ``zipfile.ZipInfo``; the ``external_attr`` is zero for entries read from a
+#: local header.
+CdirEntry = collections.namedtuple("CdirEntry",
+        "name flag_bits compress_type crc compress_size file_size header_offset "
+        "date_time external_attr")
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def format_hint(offset):
+    """Formats the zip comment recording the given member header offset."""
+    return HINT_PREFIX + str(offset).encode("ascii")
+
+def find_cdir(fo):
+    """Locates the central directory of the given zip file object.
+
+    :Returns:
+      - Tuple with the following:
+          - (int) Offset of the central directory.
+          - (int) Size of the central directory.
+          - (bytes) The archive comment.
+
+    :Raises:
+      - zipfile.BadZipFile if no end of central directory record is found.
+    """
+    fo.seek(0, os.SEEK_END)
+    fsize = fo.tell()
+    tail = min(fsize, _EOCD.size + 0xFFFF)
+    fo.seek(fsize - tail)
+    data = fo.read(tail)
+    pos = data.rfind(_EOCD_SIG)
+    if pos < 0 or len(data) - pos < _EOCD.size:
+        raise zipfile.BadZipFile("End of central directory not found.")
+    eocd = _EOCD.unpack_from(data, pos)
+    cdsize, cdoffset, clen = eocd[5], eocd[6], eocd[7]
+    comment = data[pos + _EOCD.size:pos + _EOCD.size + clen]
+
+    # Use the ZIP64 record if present.
+    loc = pos - _EOCD64_LOC.size
+    if loc >= 0 and data[loc:loc + 4] == _EOCD64_LOC_SIG:
+        offset64 = _EOCD64_LOC.unpack_from(data, loc)[2]
+        fo.seek(offset64)
+        eocd64 = _EOCD64.unpack(fo.read(_EOCD64.size))
+        cdsize, cdoffset = eocd64[8], eocd64[9]
+    return (cdoffset, cdsize, comment)
+
+def iter_cdir(fo, cdoffset, cdsize):
+    """Iterates over the central directory entries of the given zip file
+    object. The directory is read in blocks so iteration can stop early without
+    reading the rest.
+
+    :Returns:
+      - Generator of ``CdirEntry`` objects.
+    """
+    fo.seek(cdoffset)
+    remain = cdsize
+    buf = b""
+    pos = 0
+    while True:
+        # Make sure the fixed part of the record is buffered.
+        if len(buf) - pos < _CDIR.size and remain:
+            buf, remain = _refill(fo, buf[pos:], remain)
+            pos = 0
+        if len(buf) - pos < _CDIR.size:
+            return
+        rec = _CDIR.unpack_from(buf, pos)
+        if rec[0] != _CDIR_SIG:
+            raise zipfile.BadZipFile("Bad central directory record.")
+        nlen, elen, clen = rec[12], rec[13], rec[14]
+        total = _CDIR.size + nlen + elen + clen
+        while len(buf) - pos < total and remain:
+            buf, remain = _refill(fo, buf[pos:], remain)
+            pos = 0
+        start = pos + _CDIR.size
+        raw = buf[start:start + nlen]
+        extra = buf[start + nlen:start + nlen + elen]
+        pos += total
+        flags = rec[5]
+        name = raw.decode("utf-8" if flags & 0x800 else "cp437")
+        csize, fsize, offset = _zip64_values(extra, rec[10], rec[11], rec[18])
+        yield CdirEntry(name, flags, rec[6], rec[9], csize, fsize, offset,
+                _date_time(rec[8], rec[7]), rec[17])
+
+def read_member(fo, entry):
+    """Reads and decompresses the data of the given member.
+
+    :param entry: (CdirEntry) The central directory entry of the member.
+
+    :Raises:
+      - zipfile.BadZipFile if the member is corrupt.
+      - NotImplementedError if the compression method is not supported.
+    """
+    fo.seek(entry.header_offset)
+    rec = _LOCAL.unpack(fo.read(_LOCAL.size))
+    if rec[0] != _LOCAL_SIG:
+        raise zipfile.BadZipFile("Bad local file header.")
+    fo.seek(rec[10] + rec[11], os.SEEK_CUR)
+    data = fo.read(entry.compress_size)
+    if zipfile.ZIP_DEFLATED == entry.compress_type:
+        data = zlib.decompress(data, -15)
+    elif zipfile.ZIP_BZIP2 == entry.compress_type:
+        data = bz2.decompress(data)
+    elif zipfile.ZIP_LZMA == entry.compress_type:
+        data = zipfile.LZMADecompressor().decompress(data)
+    elif zipfile.ZIP_STORED != entry.compress_type:
+        raise NotImplementedError("Compression method not supported.")
+    if zlib.crc32(data) != entry.crc:
+        raise zipfile.BadZipFile("Bad CRC-32 for member `%s`." % entry.name)
+    return data
+
+def check_member(fo, entry, chunk_size=SCAN_SIZE):
+    """Reads the data of the given member in blocks, checking its CRC-32 and
+    size against the central directory entry. The decompressed data is not
+    kept, so members of any size can be checked in bounded memory.
+
+    :param entry: (CdirEntry) The central directory entry of the member.
+
+    :Raises:
+      - zipfile.BadZipFile if the member is corrupt.
+      - NotImplementedError if the member is encrypted or its compression
+        method is not supported.
+    """
+    copy_member(fo, entry, None, chunk_size)
+
+def copy_member(fo, entry, write, chunk_size=SCAN_SIZE):
+    """Decompresses the data of the given member in blocks, passing each block
+    to the given write function, then checks its CRC-32 and size against the
+    central directory entry.
+
+    :param entry: (CdirEntry) The central directory entry of the member.
+    :param write: Function called with each block of data; may be None.
+
+    :Raises:
+      - zipfile.BadZipFile if the member is corrupt.
+      - NotImplementedError if the member is encrypted or its compression
+        method is not supported.
+    """
+    if entry.flag_bits & 0x01:
+        raise NotImplementedError("Encrypted members not supported.")
+    fo.seek(entry.header_offset)
+    data = fo.read(_LOCAL.size)
+    rec = _LOCAL.unpack(data) if len(data) == _LOCAL.size else None
+    if not rec or rec[0] != _LOCAL_SIG:
+        raise zipfile.BadZipFile("Bad local file header for member `%s`." % entry.name)
+    fo.seek(rec[10] + rec[11], os.SEEK_CUR)
+    if zipfile.ZIP_DEFLATED == entry.compress_type:
+        decomp = zlib.decompressobj(-15).decompress
+    elif zipfile.ZIP_BZIP2 == entry.compress_type:
+        decomp = bz2.BZ2Decompressor().decompress
+    elif zipfile.ZIP_LZMA == entry.compress_type:
+        decomp = zipfile.LZMADecompressor().decompress
+    elif zipfile.ZIP_STORED == entry.compress_type:
+        decomp = bytes
+    else:
+        raise NotImplementedError("Compression method not supported.")
+    crc = 0
+    size = 0
+    remain = entry.compress_size
+    while remain:
+        block = fo.read(min(chunk_size, remain))
+        if not block:
+            raise zipfile.BadZipFile("Member `%s` is truncated." % entry.name)
+        remain -= len(block)
+        try:
+            data = decomp(block)
+        except (zlib.error, OSError, EOFError, lzma.LZMAError) as e:
+            raise zipfile.BadZipFile("Bad compressed data for member `%s`: %s" %
+                    (entry.name, e))
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        if write:
+            write(data)
+    if size != entry.file_size:
+        raise zipfile.BadZipFile("Bad size for member `%s`." % entry.name)
+    if crc != entry.crc:
+        raise zipfile.BadZipFile("Bad CRC-32 for member `%s`." % entry.name)
+
+def find_member(fo, names):
+    """Finds the central directory entry of the first of the given member names
+    present in the archive. If the archive comment holds a hint for the first
+    name, only that member's local header is read. Otherwise the raw central
+    directory is searched block by block for the names, stopping as soon as the
+    first name is found; records are only decoded where a name matches.
+
+    :param names: List of member names in order of preference.
+
+    :Returns:
+      - (CdirEntry) The entry of the member or None if no name is present.
+    """
+    cdoffset, cdsize, comment = find_cdir(fo)
+    if comment.startswith(HINT_PREFIX):
+        try:
+            offset = int(comment[len(HINT_PREFIX):])
+        except ValueError:
+            offset = -1
+        if 0 <= offset < cdoffset:
+            entry = _read_local_entry(fo, offset)
+            if entry and entry.name == names[0]:
+                return entry
+
+    encoded = [n.encode("utf-8") for n in names]
+    keep = _CDIR.size + max(len(e) for e in encoded)
+    cdend = cdoffset + cdsize
+    best = None
+    rank = len(names)
+    bufoffset = cdoffset
+    buf = b""
+    fo.seek(cdoffset)
+    while bufoffset + len(buf) < cdend:
+        readpos = bufoffset + len(buf)
+        buf += fo.read(min(SCAN_SIZE, cdend - readpos))
+        if bufoffset + len(buf) == readpos:
+            break
+        for i, name in enumerate(encoded[:rank]):
+            entry = _search_cdir(fo, buf, bufoffset, cdend, name)
+            if entry and i < rank:
+                best = entry
+                rank = i
+        if 0 == rank:
+            break
+        # Keep enough of the buffer tail to match records split across blocks.
+        fo.seek(bufoffset + len(buf))
+        bufoffset += max(len(buf) - keep, 0)
+        buf = buf[-keep:]
+    return best
+
+def _search_cdir(fo, buf, bufoffset, cdend, name):
+    """Searches a block of the central directory for the record of the given
+    encoded member name.
+
+    :param bufoffset: (int) Archive offset of the start of the block.
+
+    :Returns:
+      - (CdirEntry) The entry or None if not found in the block.
+    """
+    i = buf.find(name)
+    while i >= 0:
+        start = i - _CDIR.size
+        if (start >= 0 and buf[start:start + 4] == _CDIR_SIG and
+                struct.unpack_from("<H", buf, start + 28)[0] == len(name)):
+            offset = bufoffset + start
+            return next(iter_cdir(fo, offset, cdend - offset), None)
+        i = buf.find(name, i + 1)
+    return None
+
+def _refill(fo, buf, remain):
+    """Appends the next block of at most ``remain`` bytes to the given buffer.
+
+    :Returns:
+      - Tuple of the new buffer and the bytes remaining.
+    """
+    chunk = fo.read(min(SCAN_SIZE, remain))
+    if not chunk:
+        return (buf, 0)
+    return (buf + chunk, remain - len(chunk))
+
+def _read_local_entry(fo, offset):
+    """Reads the local file header at the given offset as a central directory
+    entry. Returns None if there is no valid header at the offset or its sizes
+    are deferred to a data descriptor."""
+    fo.seek(offset)
+    data = fo.read(_LOCAL.size)
+    if len(data) < _LOCAL.size:
+        return None
+    rec = _LOCAL.unpack(data)
+    if rec[0] != _LOCAL_SIG or rec[3] & 0x08:
+        return None
+    raw = fo.read(rec[10])
+    extra = fo.read(rec[11])
+    name = raw.decode("utf-8" if rec[3] & 0x800 else "cp437")
+    csize, fsize, _ = _zip64_values(extra, rec[8], rec[9], offset)
+    return CdirEntry(name, rec[3], rec[4], rec[7], csize, fsize, offset,
+            _date_time(rec[6], rec[5]), 0)
+
+def _date_time(dosdate, dostime):
+    """Decodes an MS-DOS date and time into a date time tuple."""
+    return ((dosdate >> 9) + 1980, (dosdate >> 5) & 0xF, dosdate & 0x1F,
+            dostime >> 11, (dostime >> 5) & 0x3F, (dostime & 0x1F) * 2)
+
+def _zip64_values(extra, csize, fsize, offset):
+    """Returns the compressed size, file size and header offset of a record,
+    replacing values saturated at 0xFFFFFFFF with those from the ZIP64 extra
+    field."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack_from("<2H", extra, pos)
+        if 0x0001 == tag:
+            values = list(struct.unpack_from("<%dQ" % (size // 8), extra, pos + 4))
+            if 0xFFFFFFFF == fsize and values:
+                fsize = values.pop(0)
+            if 0xFFFFFFFF == csize and values:
+                csize = values.pop(0)
+            if 0xFFFFFFFF == offset and values:
+                offset = values.pop(0)
+            break
+        pos += 4 + size
+    return (csize, fsize, offset)
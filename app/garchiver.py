@@ -13,6 +13,8 @@ Target files and directories are passes as arguments to this utility.
 
 import os
 import sys
+import threading
+import time
 
 import wx
 
@@ -27,6 +29,19 @@ from appinfo import GARCHIVER_NAME, GARCHIVER_VER
 #: Combined application name and version string.
 NAMEVER = "%s %s" % (GARCHIVER_NAME, GARCHIVER_VER)
 
+#: Minimum seconds between progress display updates.
+PROGRESS_INTERVAL = 0.1
+
+#: Labels of the archive creation phases shown with the progress.
+PHASES = {
+        "walk": "Finding files",
+        "sample": "Sampling files",
+        "compress": "Compressing",
+        "log": "Writing log",
+        "verify": "Verifying archive",
+        "delete": "Deleting originals",
+    }
+
 CASELABEL = "Update Name Case"
 NAMECASE = {
         "lower_case": lambda x: x.lower().replace(" ", "_").replace("-", "_"),
@@ -41,6 +56,13 @@ NAMECASE = {
 class ArchiverApp(wx.App):
     def OnInit(self):
         self.arcctr = arcmgr.ArcCreator()
+        self.arcctr.on_progress = self.update_progress
+        self.last_progress = 0.0
+        #: Thread creating the archive; None until creation starts.
+        self.worker = None
+        #: Archive creator planning the archive for the preview; separate
+        #: from ``arcctr`` so planning does not interfere with creation.
+        self.planctr = arcmgr.ArcCreator()
         cases = [CASELABEL] + list(NAMECASE.keys())
         self.mainwin = garcview.MainWindow(None, NAMEVER, cases)
 
@@ -49,12 +71,13 @@ class ArchiverApp(wx.App):
 
         # Bind events to the methods containing the logic.
         self.Bind(wx.EVT_BUTTON, self.create_archive, self.panel.ok_button)
-        self.Bind(wx.EVT_BUTTON, self.quit, self.panel.cancel_button)
+        self.Bind(wx.EVT_BUTTON, self.cancel_archive, self.panel.cancel_button)
         self.Bind(wx.EVT_CHECKBOX, self.update_ofile, self.panel.no_ts_cb)
         self.Bind(wx.EVT_CHECKBOX, self.update_ofile, self.panel.short_ts_cb)
         self.Bind(wx.EVT_TEXT, self.update_ofile, self.panel.name_text)
         self.Bind(wx.EVT_COMBOBOX, self.update_case, self.panel.name_cbox)
         self.Bind(wx.EVT_KEY_DOWN, self.handle_keydown)
+        self.mainwin.Bind(wx.EVT_CLOSE, self.handle_close)
         return True
 
     def handle_keydown(self, event):
@@ -65,8 +88,25 @@ class ArchiverApp(wx.App):
         else:
             event.Skip()
 
+    def handle_close(self, event):
+        """Handles the main window close event. Closing during creation cancels
+        it instead; the window closes once the worker thread has stopped."""
+        if self.is_creating() and event.CanVeto():
+            self.cancel_archive()
+            event.Veto()
+        else:
+            event.Skip()
+
+    def is_creating(self):
+        """Returns true if the archive is being created."""
+        return bool(self.worker) and self.worker.is_alive()
+
     def create_archive(self, event=None):
-        """Create the archive and quits the application."""
+        """Starts creating the archive in a worker thread; the application
+        quits once it finishes."""
+        if self.worker:
+            return
+        self.planctr.cancel()
         # Update ArcMgr from view.
         self.arcctr.outdir = self.panel.odir_text.GetValue()
         self.arcctr.flatten = self.panel.flat_cb.GetValue()
@@ -74,11 +114,52 @@ class ArchiverApp(wx.App):
         self.arcctr.delete = self.panel.del_cb.GetValue()
         self.arcctr.logtxt = self.panel.log_text.GetValue()
 
-        # Create archive.
+        # Create archive. The window itself and the cancel button stay enabled
+        # so creation can be cancelled.
         self.mainwin.disable()
-        wait = wx.BusyInfo("Creating archive, please wait...")
-        if not self.arcctr.create_archive():
-            self.mainwin.show_error(NAMEVER, "Archive could not be created!")
+        self.mainwin.Enable()
+        self.panel.cancel_button.Enable()
+        self.worker = threading.Thread(target=self.run_archive)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def run_archive(self):
+        """Creates the archive; runs in the worker thread. The result is always
+        reported, also if the creation raises."""
+        ok = False
+        try:
+            ok = self.arcctr.create_archive()
+        except Exception as e:
+            # The creator has already closed or discarded its archive.
+            self.arcctr.errmsg = "Archive could not be created: %s" % e
+        finally:
+            wx.CallAfter(self.finish_archive, ok)
+
+    def run_plan(self):
+        """Plans the archive for the preview; runs in its own thread so the
+        walk does not block the window."""
+        self.planctr.systargets = self.arcctr.systargets
+        self.planctr.policy = self.arcctr.policy
+        plan = self.planctr.plan()
+        text = arcmgr.format_plan(plan) if plan else ""
+        wx.CallAfter(self.mainwin.show_plan, text)
+
+    def cancel_archive(self, event=None):
+        """Cancels the archive creation, or quits if not creating."""
+        if not self.is_creating():
+            self.quit()
+            return
+        self.arcctr.cancel()
+        self.panel.cancel_button.Disable()
+        self.mainwin.show_progress("Cancelling...", 0)
+
+    def finish_archive(self, ok):
+        """Reports the result of the archive creation and quits the
+        application; runs in the main thread."""
+        self.worker.join()
+        if not ok and not self.arcctr.cancelled.is_set():
+            self.mainwin.show_error(NAMEVER,
+                    "Archive could not be created!\n%s" % self.arcctr.errmsg)
         warning = ""
         if self.arcctr.warnmsgs:
             for w in self.arcctr.warnmsgs:
@@ -86,6 +167,25 @@ class ArchiverApp(wx.App):
             self.mainwin.show_warning(NAMEVER, warning)
         self.quit()
 
+    def update_progress(self, progress):
+        """Shows the archive creation progress on the main window; runs in the
+        worker thread so the display is updated through the main thread."""
+        now = time.perf_counter()
+        if now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        text = PHASES.get(progress.phase, progress.phase)
+        fraction = None
+        if progress.bytes_total:
+            fraction = progress.bytes_done / float(progress.bytes_total)
+        elif progress.files_total:
+            fraction = progress.files_done / float(progress.files_total)
+        text += " (%d files)" % progress.files_done
+        eta = progress.eta()
+        if eta is not None:
+            text += ", %d:%02d remaining" % divmod(int(eta), 60)
+        wx.CallAfter(self.mainwin.show_progress, text, fraction)
+
     def update_ofile(self, event=None):
         """Updates the output name TextCtrl on the main window."""
         # Update ArcMgr from view.
@@ -128,6 +228,10 @@ class ArchiverApp(wx.App):
         self.update_name()
         self.guess_odir()
         self.update_ofile()
+        self.mainwin.show_plan("Estimating archive size...")
+        planner = threading.Thread(target=self.run_plan)
+        planner.daemon = True
+        planner.start()
         self.mainwin.show()
 
     def run_loop(self):
@@ -18,6 +18,8 @@ import wx
 MIN_X_SZ = 340
 #: Defines the main window border for various UI elements in pixels.
 WIN_BORDER = 20
+#: Defines the range of the progress gauge.
+GAUGE_RANGE = 1000
 
 ##==============================================================#
 ## SECTION: Class Definitions                                   #
@@ -39,6 +41,7 @@ class MainPanel(wx.Panel):
         ltxt_sizer = wx.BoxSizer(wx.VERTICAL)
         opts_sizer = wx.BoxSizer(wx.VERTICAL)
         oprv_sizer = wx.BoxSizer(wx.VERTICAL)
+        prog_sizer = wx.BoxSizer(wx.VERTICAL)
         bttn_sizer = wx.BoxSizer(wx.HORIZONTAL)
 
         # Create text input for the archive name.
@@ -81,8 +84,16 @@ class MainPanel(wx.Panel):
         self.ofile_text = wx.TextCtrl(self, size=(-1,-1), style=wx.TE_READONLY)
         oprv_sizer.Add(odir_label)
         oprv_sizer.Add(self.odir_text, flag=wx.EXPAND)
+        self.plan_text = wx.StaticText(self, label="")
         oprv_sizer.Add(ofile_label)
         oprv_sizer.Add(self.ofile_text, flag=wx.EXPAND)
+        oprv_sizer.Add(self.plan_text, flag=wx.EXPAND)
+
+        # Create progress display.
+        self.prog_text = wx.StaticText(self, label="")
+        self.prog_gauge = wx.Gauge(self, range=GAUGE_RANGE)
+        prog_sizer.Add(self.prog_text, flag=wx.EXPAND)
+        prog_sizer.Add(self.prog_gauge, flag=wx.EXPAND)
 
         # Create main control buttons and add to sizer.
         self.ok_button = wx.Button(self, wx.ID_OK)
@@ -97,6 +108,7 @@ class MainPanel(wx.Panel):
         main_sizer.Add(ltxt_sizer, 5, sflags, WIN_BORDER)
         main_sizer.Add(opts_sizer, 0, sflags, WIN_BORDER)
         main_sizer.Add(oprv_sizer, 0, sflags, WIN_BORDER)
+        main_sizer.Add(prog_sizer, 0, sflags, WIN_BORDER)
         main_sizer.Add(bttn_sizer, 1, sflags, WIN_BORDER)
         main_sizer.AddSpacer(WIN_BORDER)
         self.SetSizerAndFit(main_sizer)
@@ -137,6 +149,19 @@ class MainWindow(wx.Frame):
         for widget in self.mainpanel.GetChildren():
             widget.Disable()
 
+    def show_progress(self, text, fraction=None):
+        """Shows the given progress text and fills the progress gauge to the
+        given fraction; the gauge pulses if the fraction is None."""
+        self.mainpanel.prog_text.SetLabel(text)
+        if fraction is None:
+            self.mainpanel.prog_gauge.Pulse()
+        else:
+            self.mainpanel.prog_gauge.SetValue(int(fraction * GAUGE_RANGE))
+
+    def show_plan(self, text):
+        """Shows the given archive plan summary in the output preview."""
+        self.mainpanel.plan_text.SetLabel(text)
+
     def show(self):
         """Shows the main window."""
         self.Show(True)
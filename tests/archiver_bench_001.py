@@ -0,0 +1,53 @@
+"""This script benchmarks adding members to an archive. The add throughput
+should stay flat as the archive grows; a falling rate means membership checks
+are scaling with the archive size.
+
+Usage: python archiver_bench_001.py [COUNT] [BATCH]
+"""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import arclib
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def bench_add(count, batch):
+    """Adds `count` members to a new archive and prints the add rate for each
+    batch of `batch` members."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmpdir, "src.txt")
+        with open(src, "w") as f:
+            f.write("benchmark data\n")
+        arc = arclib.Archive(os.path.join(tmpdir, "bench.zip"))
+        arc.create(compressed=False)
+        print("%10s %12s" % ("members", "adds/sec"))
+        for start in range(0, count, batch):
+            t0 = time.perf_counter()
+            for i in range(start, start + batch):
+                arc.add(arclib.ArcTarget(src, "d%d/f%d.txt" % (i // 1000, i)))
+            elapsed = time.perf_counter() - t0
+            print("%10d %12.0f" % (start + batch, batch / elapsed))
+        arc.zfile.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    bench_add(count, batch)
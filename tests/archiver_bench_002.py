@@ -0,0 +1,277 @@
+"""This script benchmarks archiving synthetic trees of configurable shape. It
+measures the walk time, add throughput, peak memory and verify time, and checks
+that the archive is intact. Results are appended to a JSON lines file and
+compared against the previous result for the same configuration so that
+regressions between releases are visible.
+
+The `many` preset exceeds the 65535 member limit and the `large` preset holds
+a member over 4 GiB, both requiring ZIP64 records. The `huge` preset stores
+that member uncompressed so the archive itself exceeds 4 GiB; it needs that
+much free disk space. Large files are created sparse so generating them is
+fast.
+
+Usage:
+  archiver_bench_002.py [options] [PRESET]
+
+Arguments:
+  PRESET   Tree shape (small|many|deep|large|huge) [default: small].
+
+Options:
+  --files=NUM      Number of files; overrides the preset.
+  --depth=NUM      Directory depth of the tree; overrides the preset.
+  --fanout=NUM     Subdirectories per directory; overrides the preset.
+  --size=BYTES     Typical file size; overrides the preset.
+  --dist=DIST      File size distribution (fixed|uniform|lognormal); overrides
+                   the preset.
+  --ratio=RATIO    Fraction of each file that is incompressible, 0 to 1;
+                   overrides the preset.
+  --method=METHOD  Compression method; overrides the preset.
+  --jobs=JOBS      Number of parallel workers [default: 1].
+  --seed=SEED      Random seed for the tree [default: 1].
+  --results=FILE   JSON lines file results are appended to.
+  --tmpdir=DIR     Directory the tree and archive are generated in.
+  --keep           Keep the generated tree and archive.
+"""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import arclib
+import arcmgr
+import arcscan
+from appinfo import ARCHIVER_VER
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Tree shapes by preset name.
+PRESETS = {
+        "small": dict(files=2000, depth=3, fanout=4, size=8192,
+                dist="lognormal", ratio=0.5, method="deflate"),
+        "many": dict(files=70000, depth=2, fanout=16, size=64,
+                dist="fixed", ratio=0.5, method="deflate"),
+        "deep": dict(files=5000, depth=200, fanout=1, size=1024,
+                dist="uniform", ratio=0.5, method="deflate"),
+        "large": dict(files=1, depth=1, fanout=1, size=4608 * 1024 * 1024,
+                dist="fixed", ratio=0.0, method="deflate"),
+        "huge": dict(files=1, depth=1, fanout=1, size=4608 * 1024 * 1024,
+                dist="fixed", ratio=0.0, method="store"),
+    }
+
+#: Files at least this size are created sparse (all zeros) regardless of the
+#: requested ratio.
+SPARSE_SIZE = 256 * 1024 * 1024
+
+#: Size in bytes of the random data pool file content is sliced from.
+POOL_SIZE = 4 * 1024 * 1024
+
+#: Relative change of a metric reported as a regression.
+REGRESSION = 0.10
+
+#: Metrics checked for regressions, mapped to true if larger values are
+#: better and false if smaller values are better.
+CHECKED = {
+        "walk_s": False,
+        "add_s": False,
+        "create_s": False,
+        "verify_s": False,
+        "add_mib_s": True,
+        "add_files_s": True,
+        "peak_rss": False,
+    }
+
+#: Default results file.
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "archiver_bench_results.jsonl")
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def parse_config(args):
+    """Returns the tree configuration from the preset and the overriding
+    options."""
+    preset = args['PRESET'] or "small"
+    if preset not in PRESETS:
+        sys.exit("Unknown preset `%s`." % preset)
+    config = dict(PRESETS[preset])
+    for key in ("files", "depth", "fanout", "size"):
+        if args['--' + key]:
+            config[key] = int(args['--' + key])
+    for key in ("dist", "method"):
+        if args['--' + key]:
+            config[key] = args['--' + key]
+    if args['--ratio']:
+        config['ratio'] = float(args['--ratio'])
+    config['jobs'] = int(args['--jobs'])
+    config['seed'] = int(args['--seed'])
+    return (preset, config)
+
+def make_tree(root, config):
+    """Generates a synthetic tree under the given directory.
+
+    :Returns:
+      - (int) Total bytes of the generated files.
+    """
+    rng = random.Random(config['seed'])
+    pool = rng.getrandbits(8 * POOL_SIZE).to_bytes(POOL_SIZE, "little")
+    total = 0
+    fanout = max(config['fanout'], 1)
+    for i in range(config['files']):
+        # The digits of the file number in base fanout select its directory,
+        # so the tree has the requested depth without empty directories.
+        parts = ["d%d" % ((i // fanout ** l) % fanout) for l in range(config['depth'])]
+        dirpath = os.path.join(root, *parts)
+        os.makedirs(dirpath, exist_ok=True)
+        size = file_size(rng, config)
+        path = os.path.join(dirpath, "f%d.dat" % i)
+        with open(path, "wb") as fo:
+            if size >= SPARSE_SIZE:
+                fo.truncate(size)
+            else:
+                nrand = int(size * config['ratio'])
+                start = rng.randrange(0, POOL_SIZE - nrand + 1)
+                fo.write(pool[start:start + nrand])
+                fo.write(b"a" * (size - nrand))
+        total += size
+    return total
+
+def file_size(rng, config):
+    """Returns the size of the next generated file."""
+    size = config['size']
+    if "uniform" == config['dist']:
+        return rng.randint(0, 2 * size)
+    if "lognormal" == config['dist']:
+        return min(int(rng.lognormvariate(math.log(max(size, 1)), 1.0)), 64 * size)
+    return size
+
+def run(tmpdir, config):
+    """Runs the benchmark in the given directory.
+
+    :Returns:
+      - (dict) The measured metrics.
+    """
+    root = os.path.join(tmpdir, "tree")
+    os.mkdir(root)
+    t0 = time.perf_counter()
+    nbytes = make_tree(root, config)
+    metrics = {"gen_s": time.perf_counter() - t0, "bytes": nbytes}
+
+    t0 = time.perf_counter()
+    arctargets, _ = arclib.convert_sys2arc([root])
+    metrics['walk_s'] = time.perf_counter() - t0
+    metrics['entries'] = len(arctargets)
+    del arctargets
+
+    arcctr = arcmgr.ArcCreator()
+    arcctr.systargets = [root]
+    arcctr.outdir = tmpdir
+    arcctr.name = "bench"
+    arcctr.ts_style = "none"
+    arcctr.jobs = config['jobs']
+    arcctr.policy.method = config['method']
+    t0 = time.perf_counter()
+    if not arcctr.create_archive():
+        sys.exit("Archive could not be created! %s" % arcctr.errmsg)
+    metrics['create_s'] = time.perf_counter() - t0
+    compress_s = arcctr.stats['phase_times'].get("compress", 0.0)
+    metrics['add_s'] = compress_s
+    metrics['add_mib_s'] = nbytes / 1048576.0 / compress_s if compress_s else 0.0
+    metrics['add_files_s'] = config['files'] / compress_s if compress_s else 0.0
+    metrics['archive_bytes'] = os.path.getsize(arcctr.arcpath)
+
+    t0 = time.perf_counter()
+    failed = arclib.verify_archive(arcctr.arcpath, jobs=config['jobs'])
+    metrics['verify_s'] = time.perf_counter() - t0
+    metrics['verify_failures'] = len(failed)
+    with open(arcctr.arcpath, "rb") as fo:
+        cdoffset, cdsize, _ = arcscan.find_cdir(fo)
+        metrics['members'] = sum(1 for _ in arcscan.iter_cdir(fo, cdoffset, cdsize))
+    metrics['zip64'] = (metrics['members'] > 0xFFFF or
+            metrics['archive_bytes'] > 0xFFFFFFFF or nbytes > 0xFFFFFFFF)
+    metrics['peak_rss'] = arclib.peak_rss()
+    return metrics
+
+def load_results(path):
+    """Returns the list of results recorded in the given file."""
+    if not os.path.isfile(path):
+        return []
+    with open(path) as fi:
+        return [json.loads(line) for line in fi if line.strip()]
+
+def compare(prev, cur, checked=CHECKED):
+    """Prints the metrics of the current result against the previous one,
+    flagging changes for the worse beyond ``REGRESSION`` in the checked
+    metrics."""
+    print("%-16s %14s %14s %8s" % ("metric", "previous", "current", "change"))
+    for key in sorted(cur['metrics']):
+        new = cur['metrics'][key]
+        old = prev['metrics'].get(key) if prev else None
+        if isinstance(new, bool) or not isinstance(new, (int, float)):
+            print("%-16s %14s %14s" % (key, old, new))
+            continue
+        change = ""
+        flag = ""
+        if isinstance(old, (int, float)) and old:
+            rel = (new - old) / float(old)
+            change = "%+.1f%%" % (rel * 100)
+            worse = -rel if checked.get(key) else rel
+            if key in checked and worse > REGRESSION:
+                flag = "  REGRESSION"
+        if old is None:
+            old = float("nan")
+        print("%-16s %14.6g %14.6g %8s%s" % (key, old, new, change, flag))
+
+def main():
+    """Runs the benchmark, records the result and compares it with the
+    previous result for the same configuration."""
+    args = docopt(__doc__)
+    preset, config = parse_config(args)
+    tmpdir = tempfile.mkdtemp(dir=args['--tmpdir'])
+    try:
+        metrics = run(tmpdir, config)
+    finally:
+        if args['--keep']:
+            print("Kept `%s`." % tmpdir)
+        else:
+            shutil.rmtree(tmpdir)
+
+    result = {
+            "date": datetime.datetime.now().isoformat(),
+            "version": ARCHIVER_VER,
+            "python": platform.python_version(),
+            "preset": preset,
+            "config": config,
+            "metrics": metrics,
+        }
+    path = args['--results'] or RESULTS
+    prev = [r for r in load_results(path) if r['config'] == config]
+    with open(path, "a") as fo:
+        fo.write(json.dumps(result, sort_keys=True) + "\n")
+    print("%s %s" % (preset, json.dumps(config, sort_keys=True)))
+    compare(prev[-1] if prev else None, result)
+    if metrics['verify_failures']:
+        sys.exit("Archive failed verification!")
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    main()
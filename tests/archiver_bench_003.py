@@ -0,0 +1,169 @@
+"""This script benchmarks the startup cost of the archiver CLI, which dominates
+short runs such as archiving a single small file. It measures the wall time of
+a bare interpreter, of printing the version, of archiving one small file
+directly and through a warm server via `arcclient.py`, and the time spent
+importing the archiver as reported by `python -X importtime`. Results are
+appended to the same JSON lines file as `archiver_bench_002.py` and compared
+against the previous startup result.
+
+Usage:
+  archiver_bench_003.py [options]
+
+Options:
+  --runs=NUM      Number of runs each time is the median of [default: 20].
+  --results=FILE  JSON lines file results are appended to.
+"""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+import archiver_bench_002 as bench
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from appinfo import ARCHIVER_VER
+
+##==============================================================#
+## SECTION: Global Definitions                                  #
+##==============================================================#
+
+#: Directory holding the archiver scripts.
+APPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+#: Metrics checked for regressions; smaller values are better for all of them.
+CHECKED = {
+        "import_s": False,
+        "version_s": False,
+        "archive_s": False,
+        "client_s": False,
+    }
+
+#: Seconds to wait for the server socket to appear.
+SERVER_TIMEOUT = 10.0
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def time_command(cmd, runs, env=None):
+    """Runs the given command the given number of times.
+
+    :Returns:
+      - (float) Median wall time in seconds of the runs.
+    """
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run([c.format(i=i) for c in cmd], env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        times.append(time.perf_counter() - t0)
+        if proc.returncode or proc.stderr:
+            sys.exit("Command failed! %s\n%s" % (" ".join(cmd), proc.stderr.decode()))
+    return statistics.median(times)
+
+def import_time(runs):
+    """Returns the median seconds spent importing the archiver as reported by
+    `python -X importtime`."""
+    times = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import archiver"],
+                cwd=APPDIR, stderr=subprocess.PIPE, universal_newlines=True)
+        for line in proc.stderr.splitlines():
+            # Lines are `import time: self [us] | cumulative | name`.
+            fields = line.split("|")
+            if len(fields) == 3 and "archiver" == fields[2].strip():
+                times.append(int(fields[1]) / 1e6)
+    return statistics.median(times)
+
+def start_server(sockpath):
+    """Starts the archiver server on the given socket path and waits for it to
+    listen.
+
+    :Returns:
+      - (Popen) The server process.
+    """
+    proc = subprocess.Popen([sys.executable, os.path.join(APPDIR, "archiver.py"),
+            "--serve=%s" % sockpath])
+    deadline = time.perf_counter() + SERVER_TIMEOUT
+    while not os.path.exists(sockpath):
+        if proc.poll() is not None or time.perf_counter() > deadline:
+            proc.kill()
+            sys.exit("Server could not be started!")
+        time.sleep(0.01)
+    return proc
+
+def run(tmpdir, runs):
+    """Runs the benchmark in the given directory.
+
+    :Returns:
+      - (dict) The measured metrics.
+    """
+    src = os.path.join(tmpdir, "hook.txt")
+    with open(src, "w") as fo:
+        fo.write("startup benchmark\n")
+    archiver = os.path.join(APPDIR, "archiver.py")
+    client = os.path.join(APPDIR, "arcclient.py")
+    # Each run writes a differently named archive so none already exists.
+    create = ["--no_ts", "--outdir=%s" % tmpdir, "-m", "hook", src]
+    metrics = {}
+    metrics['python_s'] = time_command([sys.executable, "-c", "pass"], runs)
+    metrics['import_s'] = import_time(runs)
+    metrics['version_s'] = time_command([sys.executable, archiver, "--version"], runs)
+    metrics['archive_s'] = time_command([sys.executable, archiver,
+            "--name=cli{i}"] + create, runs)
+
+    sockpath = os.path.join(tmpdir, "archiver.sock")
+    env = dict(os.environ, ARCHIVER_SOCKET=sockpath)
+    server = start_server(sockpath)
+    try:
+        metrics['client_s'] = time_command([sys.executable, client,
+                "--name=srv{i}"] + create, runs, env)
+    finally:
+        server.terminate()
+        server.wait()
+    return metrics
+
+def main():
+    """Runs the benchmark, records the result and compares it with the
+    previous startup result."""
+    args = docopt(__doc__)
+    config = {"bench": "startup", "runs": int(args['--runs'])}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        metrics = run(tmpdir, config['runs'])
+    finally:
+        shutil.rmtree(tmpdir)
+
+    result = {
+            "date": datetime.datetime.now().isoformat(),
+            "version": ARCHIVER_VER,
+            "python": platform.python_version(),
+            "preset": "startup",
+            "config": config,
+            "metrics": metrics,
+        }
+    path = args['--results'] or bench.RESULTS
+    prev = [r for r in bench.load_results(path) if r['config'] == config]
+    with open(path, "a") as fo:
+        fo.write(json.dumps(result, sort_keys=True) + "\n")
+    print("startup %s" % json.dumps(config, sort_keys=True))
+    bench.compare(prev[-1] if prev else None, result, CHECKED)
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    main()
@@ -126,6 +126,28 @@ class TestCases(unittest.TestCase):
         os.remove(arcpath)
         os.remove("bar/temp1.txt")
 
+    def testcase5(test):
+        """Checks for proper `--jobs` option behavior."""
+        ts = time.strftime("%Y%m%d%H%M")
+        arcpath = ts + "-foo.zip"
+        test.assertFalse(os.path.exists(arcpath))
+
+        # Create archive using option.
+        os.system("python ../app/archiver.py --jobs=4 foo.txt bar/baz.txt")
+        test.assertTrue(os.path.exists(arcpath))
+
+        # Check contents of archive.
+        arc = zipfile.ZipFile(arcpath)
+        arclist = arc.namelist()
+        test.assertTrue(2 == len(arclist))
+        test.assertTrue("foo.txt" in arclist)
+        test.assertTrue("bar/baz.txt" in arclist)
+        test.assertTrue(None == arc.testzip())
+
+        # Cleanup.
+        arc.close()
+        os.remove(arcpath)
+
 ##==============================================================#
 ## SECTION: Main Body                                           #
 ##==============================================================#
@@ -0,0 +1,723 @@
+"""This script provides a unit test of the Archiver utility."""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import arcclient
+import arcmgr
+
+##==============================================================#
+## SECTION: Class Definitions                                   #
+##==============================================================#
+
+class TestCases(unittest.TestCase):
+    def testcase1(test):
+        """Checks for proper `--base` and `--snapshot` option behavior."""
+        fullpath = "temp_full.zip"
+        deltapath = "temp_delta.zip"
+        snappath = "temp_snap.zip"
+        test.assertFalse(os.path.exists(fullpath))
+
+        # Create temp files.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+        with open("tempdir/temp2.txt", "w") as f:
+            f.write("temp file here")
+
+        # Create full archive with manifest.
+        os.system("python ../app/archiver.py --manifest --no_ts --name=temp_full tempdir")
+        test.assertTrue(os.path.exists(fullpath))
+
+        # Change temp files then create incremental archive.
+        os.remove("tempdir/temp2.txt")
+        with open("tempdir/temp3.txt", "w") as f:
+            f.write("new temp file here")
+        os.system("python ../app/archiver.py --base=temp_full.zip --no_ts --name=temp_delta tempdir")
+        test.assertTrue(os.path.exists(deltapath))
+
+        # Check contents of incremental archive.
+        arc = zipfile.ZipFile(deltapath)
+        arclist = arc.namelist()
+        test.assertTrue(2 == len(arclist))
+        test.assertTrue("tempdir/temp3.txt" in arclist)
+        test.assertTrue("__arc_manifest__.json" in arclist)
+        arc.close()
+
+        # Rebuild full snapshot and check contents.
+        os.system("python ../app/archiver.py --snapshot=temp_snap.zip temp_delta.zip")
+        test.assertTrue(os.path.exists(snappath))
+        arc = zipfile.ZipFile(snappath)
+        arclist = arc.namelist()
+        test.assertTrue("tempdir/temp1.txt" in arclist)
+        test.assertTrue("tempdir/temp3.txt" in arclist)
+        test.assertFalse("tempdir/temp2.txt" in arclist)
+        test.assertTrue(b"new temp file here" == arc.read("tempdir/temp3.txt"))
+
+        # Cleanup.
+        arc.close()
+        for path in (fullpath, deltapath, snappath):
+            os.remove(path)
+        os.remove("tempdir/temp1.txt")
+        os.remove("tempdir/temp3.txt")
+        os.rmdir("tempdir")
+
+    def testcase2(test):
+        """Checks for proper `--batch` option behavior."""
+        test.assertFalse(os.path.exists("temp1.zip"))
+        test.assertFalse(os.path.exists("temp2.zip"))
+
+        # Create batch manifest.
+        with open("temp_batch.jsonl", "w") as f:
+            f.write('{"targets": ["foo.txt"], "name": "temp1", "log": "one"}\n')
+            f.write('{"targets": ["bar/baz.txt"], "name": "temp2"}\n')
+
+        # Create archives using option.
+        os.system("python ../app/archiver.py --no_ts --workers=2 --batch=temp_batch.jsonl")
+        test.assertTrue(os.path.exists("temp1.zip"))
+        test.assertTrue(os.path.exists("temp2.zip"))
+
+        # Check contents of archives.
+        arc = zipfile.ZipFile("temp1.zip")
+        arclist = arc.namelist()
+        test.assertTrue(2 == len(arclist))
+        test.assertTrue("foo.txt" in arclist)
+        test.assertTrue("__arc_info__.txt" in arclist)
+        arc.close()
+        arc = zipfile.ZipFile("temp2.zip")
+        arclist = arc.namelist()
+        test.assertTrue(1 == len(arclist))
+        test.assertTrue("baz.txt" in arclist)
+
+        # Cleanup.
+        arc.close()
+        os.remove("temp1.zip")
+        os.remove("temp2.zip")
+        os.remove("temp_batch.jsonl")
+
+    def testcase3(test):
+        """Checks that `--base` with `--delete` keeps unchanged targets."""
+        test.assertFalse(os.path.exists("temp_full.zip"))
+
+        # Create temp files and full archive with manifest.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+        os.system("python ../app/archiver.py --manifest --no_ts --name=temp_full tempdir")
+
+        # Add a file then create incremental archive deleting the targets.
+        with open("tempdir/temp2.txt", "w") as f:
+            f.write("new temp file here")
+        os.system("python ../app/archiver.py --base=temp_full.zip --delete --no_ts --name=temp_delta tempdir")
+        arc = zipfile.ZipFile("temp_delta.zip")
+        test.assertTrue("tempdir/temp2.txt" in arc.namelist())
+        test.assertFalse("tempdir/temp1.txt" in arc.namelist())
+        test.assertTrue(os.path.exists("tempdir/temp1.txt"))
+        test.assertFalse(os.path.exists("tempdir/temp2.txt"))
+
+        # Cleanup.
+        arc.close()
+        os.remove("temp_full.zip")
+        os.remove("temp_delta.zip")
+        os.remove("tempdir/temp1.txt")
+        os.rmdir("tempdir")
+
+    def testcase4(test):
+        """Checks for proper `--dedup` option behavior."""
+        test.assertFalse(os.path.exists("temp_dedup.zip"))
+
+        # Create temp files, two with the same content.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("same temp file here")
+        with open("tempdir/temp2.txt", "w") as f:
+            f.write("same temp file here")
+        with open("tempdir/temp3.txt", "w") as f:
+            f.write("other temp file here")
+        os.system("python ../app/archiver.py --dedup --no_ts --name=temp_dedup tempdir")
+
+        # Check the duplicate is stored once and referenced in the index.
+        arc = zipfile.ZipFile("temp_dedup.zip")
+        arclist = arc.namelist()
+        test.assertTrue("tempdir/temp3.txt" in arclist)
+        test.assertTrue("__arc_dedup__.json" in arclist)
+        test.assertTrue(1 == len([n for n in arclist if n in
+                ("tempdir/temp1.txt", "tempdir/temp2.txt")]))
+        refs = json.loads(arc.read("__arc_dedup__.json").decode("utf-8"))
+        test.assertTrue(1 == len(refs))
+        name, target = list(refs.items())[0]
+        test.assertTrue(target in arclist)
+        test.assertFalse(name in arclist)
+        arc.close()
+
+        # Check extraction resolves the reference.
+        os.system("python ../app/archiver.py --extract=tempout temp_dedup.zip")
+        for name in ("temp1.txt", "temp2.txt"):
+            with open(os.path.join("tempout/tempdir", name)) as f:
+                test.assertTrue("same temp file here" == f.read())
+        test.assertFalse(os.path.exists("tempout/__arc_dedup__.json"))
+
+        # Cleanup.
+        os.remove("temp_dedup.zip")
+        shutil.rmtree("tempdir")
+        shutil.rmtree("tempout")
+
+    def testcase5(test):
+        """Checks that `--batch` continues past an archive that fails."""
+        test.assertFalse(os.path.exists("temp2.zip"))
+
+        # Create batch manifest whose first output directory does not exist.
+        with open("temp_batch.jsonl", "w") as f:
+            f.write('{"targets": ["foo.txt"], "name": "temp1", "outdir": "tempnone/dir"}\n')
+            f.write('{"targets": ["bar/baz.txt"], "name": "temp2"}\n')
+
+        # Create archives and check a result is recorded for each.
+        with os.popen("python ../app/archiver.py --no_ts --workers=2 --batch=temp_batch.jsonl") as p:
+            results = [json.loads(l) for l in p if l.strip()]
+        test.assertTrue(2 == len(results))
+        test.assertFalse(results[0]['ok'])
+        test.assertTrue(results[0]['errmsg'])
+        test.assertTrue(results[1]['ok'])
+        test.assertTrue(os.path.exists("temp2.zip"))
+
+        # Cleanup.
+        os.remove("temp2.zip")
+        os.remove("temp_batch.jsonl")
+
+    def testcase6(test):
+        """Checks for proper `--verify` and `--srcdir` option behavior."""
+        test.assertFalse(os.path.exists("temp_verify.zip"))
+
+        # Create temp files and archive.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+        os.system("python ../app/archiver.py --no_ts --name=temp_verify tempdir")
+
+        # Check the intact archive verifies, also against its sources.
+        test.assertTrue(0 == os.system("python ../app/archiver.py --verify temp_verify.zip"))
+        test.assertTrue(0 == os.system("python ../app/archiver.py --verify --srcdir=. temp_verify.zip"))
+
+        # Check a changed source fails against the source directory.
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("changed temp file here")
+        test.assertTrue(0 != os.system("python ../app/archiver.py --verify --srcdir=. temp_verify.zip"))
+
+        # Check a corrupted member fails.
+        with open("temp_verify.zip", "r+b") as f:
+            data = f.read()
+            f.seek(data.index(b"temp1.txt") + len(b"temp1.txt"))
+            f.write(b"\xff" * 4)
+        test.assertTrue(0 != os.system("python ../app/archiver.py --verify temp_verify.zip"))
+
+        # Cleanup.
+        os.remove("temp_verify.zip")
+        shutil.rmtree("tempdir")
+
+    def testcase7(test):
+        """Checks that a failed verification prevents `--delete`."""
+        test.assertFalse(os.path.exists("temp_verify.zip"))
+
+        # Create temp files.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+
+        # Change the source after it is archived but before verification.
+        def on_progress(progress):
+            if "verify" == progress.phase:
+                with open("tempdir/temp1.txt", "a") as f:
+                    f.write(" changed")
+        arcctr = arcmgr.ArcCreator()
+        arcctr.systargets = [os.path.abspath("tempdir")]
+        arcctr.name = "temp_verify"
+        arcctr.ts_style = "none"
+        arcctr.delete = True
+        arcctr.on_progress = on_progress
+        test.assertFalse(arcctr.create_archive())
+        test.assertTrue(arcctr.verifyfail)
+        test.assertTrue(os.path.exists("tempdir/temp1.txt"))
+
+        # Cleanup.
+        os.remove("temp_verify.zip")
+        shutil.rmtree("tempdir")
+
+    def testcase8(test):
+        """Checks that a resumed archive lists every member in its manifest."""
+        test.assertFalse(os.path.exists("temp_resume.zip"))
+
+        # Create temp files.
+        os.mkdir("tempdir")
+        for i in range(10):
+            with open("tempdir/temp%d.txt" % i, "w") as f:
+                f.write("temp file %d here" % i)
+
+        # Interrupt the creation once some members are committed.
+        class Interrupted(Exception):
+            pass
+        def on_progress(progress):
+            if "compress" == progress.phase and progress.files_done >= 4:
+                raise Interrupted()
+        def creator():
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir")]
+            arcctr.name = "temp_resume"
+            arcctr.ts_style = "none"
+            arcctr.manifest = True
+            arcctr.resume = True
+            return arcctr
+        arcctr = creator()
+        arcctr.on_progress = on_progress
+        test.assertRaises(Interrupted, arcctr.create_archive)
+        # The files are closed but the journal is kept to resume from.
+        test.assertTrue(None == arcctr.journal)
+        test.assertTrue(None == arcctr.arc.zfile.fp)
+        test.assertTrue(os.path.exists(arcctr.journal_path()))
+
+        # Resume the creation and check the manifest.
+        arcctr = creator()
+        test.assertTrue(arcctr.create_archive())
+        test.assertFalse(os.path.exists(arcctr.journal_path()))
+        arc = zipfile.ZipFile("temp_resume.zip")
+        test.assertTrue(None == arc.testzip())
+        manifest = json.loads(arc.read("__arc_manifest__.json").decode("utf-8"))
+        for i in range(10):
+            test.assertTrue("tempdir/temp%d.txt" % i in arc.namelist())
+            test.assertTrue("tempdir/temp%d.txt" % i in manifest['files'])
+
+        # Cleanup.
+        arc.close()
+        os.remove("temp_resume.zip")
+        shutil.rmtree("tempdir")
+
+    def testcase9(test):
+        """Checks for proper `--extract` option behavior."""
+        test.assertFalse(os.path.exists("temp_extract.zip"))
+
+        # Create temp files with known times and archive with manifest.
+        os.makedirs("tempdir/sub")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+        with open("tempdir/sub/temp2.dat", "w") as f:
+            f.write("other temp file here")
+        os.utime("tempdir/temp1.txt", (1000000001, 1000000001))
+        os.utime("tempdir/sub/temp2.dat", (1000000003, 1000000003))
+        os.system("python ../app/archiver.py --manifest -m hello --no_ts --name=temp_extract tempdir")
+
+        # Extract and check the contents, times and log.
+        os.system("python ../app/archiver.py --extract=tempout temp_extract.zip")
+        with open("tempout/tempdir/temp1.txt") as f:
+            test.assertTrue("temp file here" == f.read())
+        with open("tempout/tempdir/sub/temp2.dat") as f:
+            test.assertTrue("other temp file here" == f.read())
+        test.assertTrue(1000000001 == os.path.getmtime("tempout/tempdir/temp1.txt"))
+        test.assertTrue(1000000003 == os.path.getmtime("tempout/tempdir/sub/temp2.dat"))
+        test.assertFalse(os.path.exists("tempout/__arc_info__.txt"))
+        test.assertFalse(os.path.exists("tempout/__arc_manifest__.json"))
+
+        # Existing files are only replaced with `--overwrite`.
+        with open("tempout/tempdir/temp1.txt", "w") as f:
+            f.write("changed")
+        os.system("python ../app/archiver.py --extract=tempout temp_extract.zip")
+        with open("tempout/tempdir/temp1.txt") as f:
+            test.assertTrue("changed" == f.read())
+        os.system("python ../app/archiver.py --extract=tempout --overwrite --with_log temp_extract.zip")
+        with open("tempout/tempdir/temp1.txt") as f:
+            test.assertTrue("temp file here" == f.read())
+        test.assertTrue(os.path.exists("tempout/__arc_info__.txt"))
+
+        # A directory member blocked by an existing file is not extracted and
+        # leaves the file untouched.
+        shutil.rmtree("tempout")
+        os.makedirs("tempout/tempdir")
+        with open("tempout/tempdir/sub", "w") as f:
+            f.write("blocking file")
+        os.utime("tempout/tempdir/sub", (1000000005, 1000000005))
+        os.system("python ../app/archiver.py --extract=tempout temp_extract.zip")
+        test.assertTrue(os.path.isfile("tempout/tempdir/sub"))
+        test.assertTrue(1000000005 == os.path.getmtime("tempout/tempdir/sub"))
+        test.assertTrue(os.path.exists("tempout/tempdir/temp1.txt"))
+
+        # Cleanup.
+        os.remove("temp_extract.zip")
+        shutil.rmtree("tempdir")
+        shutil.rmtree("tempout")
+
+    def testcase10(test):
+        """Checks for proper `--include` and `--exclude` option behavior when
+        extracting."""
+        test.assertFalse(os.path.exists("temp_extract.zip"))
+
+        # Create temp files and archive.
+        os.makedirs("tempdir/sub")
+        for name in ("temp1.txt", "temp2.dat", "sub/temp3.txt", "sub/temp4.dat"):
+            with open(os.path.join("tempdir", name), "w") as f:
+                f.write("temp file here")
+        os.system("python ../app/archiver.py --no_ts --name=temp_extract tempdir")
+
+        # Extract only the text files except those in the subdirectory.
+        os.system("python ../app/archiver.py --extract=tempout --include=*.txt --exclude=tempdir/sub/* temp_extract.zip")
+        test.assertTrue(os.path.exists("tempout/tempdir/temp1.txt"))
+        test.assertFalse(os.path.exists("tempout/tempdir/temp2.dat"))
+        test.assertFalse(os.path.exists("tempout/tempdir/sub/temp3.txt"))
+        test.assertFalse(os.path.exists("tempout/tempdir/sub/temp4.dat"))
+        shutil.rmtree("tempout")
+
+        # Extract with a regular expression.
+        os.system("python ../app/archiver.py --extract=tempout --include=re:temp[34] temp_extract.zip")
+        test.assertFalse(os.path.exists("tempout/tempdir/temp1.txt"))
+        test.assertTrue(os.path.exists("tempout/tempdir/sub/temp3.txt"))
+        test.assertTrue(os.path.exists("tempout/tempdir/sub/temp4.dat"))
+
+        # Cleanup.
+        os.remove("temp_extract.zip")
+        shutil.rmtree("tempdir")
+        shutil.rmtree("tempout")
+
+    def testcase11(test):
+        """Checks for proper `--exclude` and `--exclude_from` option behavior
+        when archiving."""
+        test.assertFalse(os.path.exists("temp_exclude.zip"))
+
+        # Create temp files.
+        os.makedirs("tempdir/build/sub")
+        os.makedirs("tempdir/src")
+        for name in ("keep.txt", "skip.log", "keep.log", "build/out.txt",
+                "build/sub/out.txt", "src/main.txt", "src/main.tmp"):
+            with open(os.path.join("tempdir", name), "w") as f:
+                f.write("temp file here")
+        with open("temp_exclude.txt", "w") as f:
+            f.write("# Comment line.\n*.tmp\n\n")
+
+        # Create archive leaving out the excluded paths.
+        os.system("python ../app/archiver.py --no_ts --name=temp_exclude --exclude=*.log --exclude=!keep.log --exclude=build/ --exclude_from=temp_exclude.txt tempdir")
+        arc = zipfile.ZipFile("temp_exclude.zip")
+        arclist = arc.namelist()
+        test.assertTrue("tempdir/keep.txt" in arclist)
+        test.assertTrue("tempdir/keep.log" in arclist)
+        test.assertTrue("tempdir/src/main.txt" in arclist)
+        test.assertFalse("tempdir/skip.log" in arclist)
+        test.assertFalse("tempdir/src/main.tmp" in arclist)
+        test.assertFalse([n for n in arclist if "build" in n])
+
+        # Cleanup.
+        arc.close()
+        os.remove("temp_exclude.zip")
+        os.remove("temp_exclude.txt")
+        shutil.rmtree("tempdir")
+
+    def testcase12(test):
+        """Checks for proper `--append` option behavior."""
+        test.assertFalse(os.path.exists("temp_append.zip"))
+
+        # Create temp files and archive.
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.txt", "w") as f:
+            f.write("temp file here")
+        os.system("python ../app/archiver.py -m one --manifest --no_ts --name=temp_append tempdir")
+
+        # Add a file then append it without warnings.
+        with open("tempdir/temp2.txt", "w") as f:
+            f.write("new temp file here")
+        with os.popen("python ../app/archiver.py -m two --append --no_ts --name=temp_append tempdir 2>&1") as p:
+            test.assertTrue("" == p.read())
+        arc = zipfile.ZipFile("temp_append.zip")
+        test.assertTrue(None == arc.testzip())
+        arclist = arc.namelist()
+        test.assertTrue("tempdir/temp1.txt" in arclist)
+        test.assertTrue("tempdir/temp2.txt" in arclist)
+        test.assertTrue(1 == arclist.count("__arc_info__.txt"))
+        log = arc.read("__arc_info__.txt").decode("utf-8")
+        test.assertTrue("one" in log and "two" in log)
+        manifest = json.loads(arc.read("__arc_manifest__.json").decode("utf-8"))
+        test.assertTrue("tempdir/temp2.txt" in manifest['files'])
+        arc.close()
+
+        # Cancel an append while verifying before deleting the targets.
+        with open("tempdir/temp3.txt", "w") as f:
+            f.write("another temp file here")
+        arcctr = arcmgr.ArcCreator()
+        def on_progress(progress):
+            if "verify" == progress.phase:
+                arcctr.cancel()
+        arcctr.systargets = [os.path.abspath("tempdir")]
+        arcctr.name = "temp_append"
+        arcctr.ts_style = "none"
+        arcctr.append = True
+        arcctr.delete = True
+        arcctr.on_progress = on_progress
+        test.assertFalse(arcctr.create_archive())
+        arc = zipfile.ZipFile("temp_append.zip")
+        test.assertTrue(None == arc.testzip())
+        test.assertTrue(sorted(arclist) == sorted(arc.namelist()))
+        test.assertTrue(log == arc.read("__arc_info__.txt").decode("utf-8"))
+        test.assertTrue(os.path.exists("tempdir/temp3.txt"))
+
+        # Cleanup.
+        arc.close()
+        os.remove("temp_append.zip")
+        shutil.rmtree("tempdir")
+
+    def testcase13(test):
+        """Checks for proper `--stdout` option behavior through a pipe."""
+        proc = subprocess.run([sys.executable, "../app/archiver.py", "--stdout",
+                "-m", "piped", "--name=temp_stdout", "foo.txt", "bar"],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        test.assertTrue(0 == proc.returncode)
+        test.assertFalse(proc.stderr.startswith(b"ERROR"))
+        test.assertFalse([n for n in os.listdir(".") if "temp_stdout" in n])
+
+        # Check the streamed archive is readable.
+        arc = zipfile.ZipFile(io.BytesIO(proc.stdout))
+        test.assertTrue(None == arc.testzip())
+        test.assertTrue(b"foo" in arc.read("foo.txt"))
+        test.assertTrue("bar/baz.txt" in arc.namelist())
+        test.assertTrue(b"piped" in arc.read("__arc_info__.txt"))
+        arc.close()
+
+    def testcase14(test):
+        """Checks that the log is written from memory, leaving no log file in
+        the output directory, even a read-only one."""
+        os.mkdir("tempout")
+        try:
+            # The archive is streamed so the output directory is read-only.
+            os.chmod("tempout", 0o555)
+            proc = subprocess.run([sys.executable, "../app/archiver.py",
+                    "--stdout", "--outdir=tempout", "-m", "in memory", "foo.txt"],
+                    stdout=subprocess.PIPE)
+            test.assertTrue(0 == proc.returncode)
+            arc = zipfile.ZipFile(io.BytesIO(proc.stdout))
+            test.assertTrue(b"in memory" in arc.read("__arc_info__.txt"))
+            arc.close()
+            test.assertTrue([] == os.listdir("tempout"))
+            os.chmod("tempout", 0o755)
+
+            # No log file appears in the output directory while creating.
+            seen = set()
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("foo.txt")]
+            arcctr.outdir = "tempout"
+            arcctr.name = "temp_log"
+            arcctr.ts_style = "none"
+            arcctr.logtxt = "in memory"
+            arcctr.on_progress = lambda p: seen.update(os.listdir("tempout"))
+            test.assertTrue(arcctr.create_archive())
+            test.assertTrue(seen <= set(["temp_log.zip"]))
+            test.assertTrue(["temp_log.zip"] == os.listdir("tempout"))
+            with zipfile.ZipFile("tempout/temp_log.zip") as arc:
+                test.assertTrue(b"in memory" in arc.read("__arc_info__.txt"))
+        finally:
+            # Cleanup.
+            os.chmod("tempout", 0o755)
+            shutil.rmtree("tempout")
+
+    def testcase15(test):
+        """Checks that `--catalog` records the archive and that `arcfind`
+        finds it by member and log, crawls and shows logs."""
+        os.makedirs("tempdir/arcs")
+        try:
+            with open("tempdir/temp1.txt", "w") as f:
+                f.write("temp file here")
+            test.assertTrue(0 == os.system("python ../app/archiver.py --no_ts "
+                    "--outdir=tempdir/arcs --catalog=tempdir/temp.db "
+                    "-m \"temp catalog log\" tempdir/temp1.txt"))
+            arcpath = os.path.abspath("tempdir/arcs/temp1.zip")
+            shutil.copy(arcpath, "tempdir/arcs/temp2.zip")
+            def arcfind(*args):
+                proc = subprocess.run([sys.executable, "../app/arcfind.py",
+                        "--catalog=tempdir/temp.db"] + list(args),
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True)
+                test.assertTrue(0 == proc.returncode)
+                return proc.stdout
+
+            test.assertTrue(arcpath in arcfind("member", "*temp1.txt"))
+            test.assertTrue(arcpath in arcfind("log", "catalog"))
+            test.assertFalse(arcfind("log", "nothing"))
+            test.assertTrue("1 archive(s) updated." in arcfind("crawl", "tempdir/arcs"))
+            test.assertTrue(2 == len(arcfind("member", "*temp1.txt").splitlines()))
+            out = arcfind("show", "tempdir/arcs/temp1.zip", "tempdir/arcs/temp2.zip")
+            test.assertTrue(2 == out.count("temp catalog log"))
+        finally:
+            # Cleanup.
+            shutil.rmtree("tempdir")
+
+    def testcase16(test):
+        """Checks that `--progress` prints the end of every phase and that
+        `--stats_json` records the creation."""
+        os.mkdir("tempdir")
+        try:
+            for i in range(200):
+                with open("tempdir/temp%d.txt" % i, "w") as f:
+                    f.write("temp file %d here" % i)
+            proc = subprocess.run([sys.executable, "../app/archiver.py",
+                    "--no_ts", "--name=temp_progress", "--progress",
+                    "--stats_json=temp_stats.json", "tempdir"],
+                    stderr=subprocess.PIPE, universal_newlines=True)
+            test.assertTrue(0 == proc.returncode)
+            lines = proc.stderr.splitlines()
+            # Updates within a phase are throttled but its end is printed.
+            test.assertTrue(len(lines) < 20)
+            last = dict((l.split()[0], l) for l in lines)
+            test.assertTrue(last['walk'].startswith("walk     200 files"))
+            test.assertTrue(last['compress'].startswith("compress 201/201 files"))
+            test.assertTrue("log" in last)
+            with open("temp_stats.json") as f:
+                stats = json.load(f)
+            # The directory itself is also added.
+            test.assertTrue(201 == stats['files_added'])
+            test.assertTrue(sum(len("temp file %d here" % i) for i in range(200)) ==
+                    stats['bytes_in'])
+            test.assertTrue(os.path.getsize("temp_progress.zip") >=
+                    stats['bytes_out'] > 0)
+            test.assertTrue(set(["walk", "compress", "log"]) <= set(stats['phase_times']))
+        finally:
+            # Cleanup.
+            shutil.rmtree("tempdir")
+            for path in ("temp_progress.zip", "temp_stats.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def testcase17(test):
+        """Checks that `--plan` counts what a creation with the same filters
+        adds, writes nothing to the output directory and writes the plan to
+        `--stats_json`."""
+        os.makedirs("tempdir/sub")
+        os.mkdir("tempout")
+        try:
+            for i in range(30):
+                with open("tempdir/%stemp%d.%s" % ("sub/" * (i % 2), i,
+                        ("txt", "log")[i % 3 == 0]), "w") as f:
+                    f.write("temp file %d here\n" % i * (i + 1))
+            opts = ["--no_ts", "--name=temp_plan", "--outdir=tempout",
+                    "--exclude=*.log", "tempdir"]
+            proc = subprocess.run([sys.executable, "../app/archiver.py", "--plan",
+                    "--stats_json=temp_plan.json"] + opts,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True)
+            test.assertTrue(0 == proc.returncode)
+            test.assertFalse(proc.stderr)
+            test.assertTrue("temp_plan.zip" in proc.stdout)
+            test.assertFalse(os.listdir("tempout"))
+            with open("temp_plan.json") as f:
+                plan = json.load(f)
+            test.assertTrue(20 == plan['files'])
+            test.assertTrue(2 == plan['dirs'])
+            test.assertTrue("Files:      20 (2 directories)" in proc.stdout)
+
+            test.assertTrue(0 == os.system("python ../app/archiver.py "
+                    "--stats_json=temp_plan.json " + " ".join(opts)))
+            with open("temp_plan.json") as f:
+                stats = json.load(f)
+            test.assertTrue(plan['files'] + plan['dirs'] == stats['files_added'])
+            test.assertTrue(plan['bytes_in'] == stats['bytes_in'])
+            size = os.path.getsize("tempout/temp_plan.zip")
+            test.assertTrue(size / 2 < plan['est_bytes_out'] < size * 2)
+        finally:
+            # Cleanup.
+            shutil.rmtree("tempdir")
+            shutil.rmtree("tempout")
+            if os.path.exists("temp_plan.json"):
+                os.remove("temp_plan.json")
+
+    def testcase18(test):
+        """Checks that starting the archiver does not import the modules only
+        some operations need, which would slow down short runs."""
+        deferred = ["arccatalog", "concurrent.futures", "csv", "hashlib", "mmap",
+                "random", "signal", "socket", "sqlite3", "traceback"]
+        proc = subprocess.run([sys.executable, "-c", "import sys, archiver; "
+                "print(' '.join(sys.modules))"], cwd="../app",
+                stdout=subprocess.PIPE, universal_newlines=True)
+        test.assertTrue(0 == proc.returncode)
+        imported = set(proc.stdout.split())
+        test.assertTrue("archiver" in imported)
+        test.assertTrue([] == [m for m in deferred if m in imported])
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets not supported.")
+    def testcase19(test):
+        """Checks that `--serve` runs requests sent by `arcclient.py`, which
+        runs them itself when no server listens, and that terminating the
+        server lets the request in progress finish."""
+        sockpath = os.path.abspath("temp_serve.sock")
+        env = dict(os.environ, ARCHIVER_SOCKET=sockpath)
+        client = [sys.executable, os.path.abspath("../app/arcclient.py"), "--no_ts"]
+        os.mkdir("tempdir")
+        with open("tempdir/temp1.bin", "wb") as f:
+            f.write(os.urandom(16 * 1024 * 1024))
+        server = None
+        try:
+            # Without a server, the client runs the request itself.
+            test.assertTrue(None == arcclient.request(["--version"], sockpath))
+            proc = subprocess.run(client + ["--name=temp_local", "foo.txt"], env=env)
+            test.assertTrue(0 == proc.returncode)
+            test.assertTrue(os.path.exists("temp_local.zip"))
+
+            server = subprocess.Popen([sys.executable, "../app/archiver.py",
+                    "--serve=%s" % sockpath])
+            deadline = time.time() + 10
+            while not os.path.exists(sockpath):
+                test.assertTrue(None == server.poll() and time.time() < deadline)
+                time.sleep(0.01)
+
+            # Requests run in the working directory of the client.
+            proc = subprocess.run(client + ["--name=temp_srv", "../foo.txt"], env=env,
+                    cwd="tempdir", stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            test.assertTrue(0 == proc.returncode)
+            test.assertFalse(proc.stderr)
+            with zipfile.ZipFile("tempdir/temp_srv.zip") as arc:
+                test.assertTrue("foo.txt" in arc.namelist())
+            reply = arcclient.request(["--no_ts", "--outdir=tempdir",
+                    "--name=temp_srv", "foo.txt"], sockpath)
+            test.assertTrue("ERROR: Archive could not be created!" in reply['stderr'])
+            reply = arcclient.request(["--stdout", "foo.txt"], sockpath)
+            test.assertTrue(2 == reply['status'])
+            reply = arcclient.request(["--bad_option"], sockpath)
+            test.assertTrue(0 != reply['status'] and "Usage:" in reply['stdout'] + reply['stderr'])
+
+            # Terminate the server while a request is archiving.
+            replies = []
+            request = threading.Thread(target=lambda: replies.append(arcclient.request(
+                    ["--no_ts", "--name=temp_slow", "--method=bzip2", "tempdir"], sockpath)))
+            request.start()
+            deadline = time.time() + 10
+            while not os.path.exists("temp_slow.zip") and time.time() < deadline:
+                time.sleep(0.01)
+            server.send_signal(signal.SIGTERM)
+            request.join()
+            test.assertTrue(0 == server.wait(10))
+            test.assertTrue(0 == replies[0]['status'])
+            with zipfile.ZipFile("temp_slow.zip") as arc:
+                test.assertTrue(None == arc.testzip())
+                test.assertTrue("tempdir/temp1.bin" in arc.namelist())
+            test.assertFalse(os.path.exists(sockpath))
+        finally:
+            # Cleanup.
+            if server and None == server.poll():
+                server.kill()
+                server.wait()
+            shutil.rmtree("tempdir")
+            for path in ("temp_local.zip", "temp_slow.zip", sockpath):
+                if os.path.exists(path):
+                    os.remove(path)
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,597 @@
+"""This script provides a unit test of the archive library."""
+
+##==============================================================#
+## DEVELOPED 2018, REVISED 2018, Jeff Rimko.                    #
+##==============================================================#
+
+import errno
+import json
+import os
+import random
+import shutil
+import sys
+import time
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import arccatalog
+import arclib
+import arcmgr
+import arcscan
+
+##==============================================================#
+## SECTION: Function Definitions                                #
+##==============================================================#
+
+def make_files(root, count=12, seed=1):
+    """Creates files of mixed content under the given directory: text that
+    deflates, random data and files with stored extensions."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "sub"))
+    for i in range(count):
+        ext = (".txt", ".bin", ".jpg")[i % 3]
+        path = os.path.join(root, "sub" if i % 2 else "", "temp%d%s" % (i, ext))
+        size = rng.randint(0, 200000)
+        with open(path, "wb") as f:
+            if ".txt" == ext:
+                f.write((b"temp file here %d\n" % i) * (size // 16))
+            else:
+                f.write(bytes(rng.getrandbits(8) for _ in range(size // 8)))
+
+def create(arcpath, root, jobs=1, reader=None, policy=None):
+    """Creates an archive of the given directory using the library.
+
+    :Returns:
+      - List of the results of adding each archiver target.
+    """
+    arctargets, _ = arclib.convert_sys2arc([root])
+    arc = arclib.Archive(arcpath)
+    if reader:
+        arc.reader = reader
+    arc.create(policy=policy)
+    results = list(arc.add_all(arctargets, jobs=jobs))
+    arc.close()
+    return results
+
+def describe(arcpath):
+    """Returns the name, method, CRC, size and content of each member of the
+    given archive, in order."""
+    with zipfile.ZipFile(arcpath) as zf:
+        test = zf.testzip()
+        return (test, [(i.filename, i.compress_type, i.CRC, i.file_size,
+                zf.read(i)) for i in zf.infolist()])
+
+def make_zip(arcpath, count, comment=b""):
+    """Creates a zip file of the given number of small text members plus a log
+    and returns the offset of the log's local header."""
+    with zipfile.ZipFile(arcpath, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(count):
+            zf.writestr("dir/temp%d.txt" % i, "temp file %d here" % i)
+        offset = zf.fp.tell()
+        zf.writestr(arclib.LOGNAME, "temp log here")
+        zf.writestr("dir/temp.log", "temp other log here")
+        zf.comment = comment
+    return offset
+
+##==============================================================#
+## SECTION: Class Definitions                                   #
+##==============================================================#
+
+class TestCases(unittest.TestCase):
+    def setUp(test):
+        test.assertFalse(os.path.exists("tempdir"))
+        os.mkdir("tempdir")
+        make_files("tempdir/src")
+
+    def tearDown(test):
+        shutil.rmtree("tempdir")
+
+    def testcase1(test):
+        """Checks that archives created with parallel jobs match those created
+        sequentially, also with a small in-flight budget."""
+        policy = arclib.CompressionPolicy()
+        policy.sample = True
+        create("tempdir/seq.zip", "tempdir/src", policy=policy)
+        seq = describe("tempdir/seq.zip")
+        test.assertTrue(None == seq[0])
+        methods = set(m[1] for m in seq[1] if not m[0].endswith("/"))
+        test.assertTrue(zipfile.ZIP_STORED in methods)
+        test.assertTrue(zipfile.ZIP_DEFLATED in methods)
+
+        create("tempdir/par.zip", "tempdir/src", jobs=4, policy=policy)
+        test.assertTrue(seq == describe("tempdir/par.zip"))
+
+        budget = arclib.PARALLEL_BUDGET
+        arclib.PARALLEL_BUDGET = 100000
+        try:
+            create("tempdir/small.zip", "tempdir/src", jobs=4, policy=policy)
+        finally:
+            arclib.PARALLEL_BUDGET = budget
+        test.assertTrue(seq == describe("tempdir/small.zip"))
+
+    def testcase2(test):
+        """Checks the compression policy chosen for each member."""
+        for name in ("temp.jpg", "temp.GZ", "temp.txt", "temp.bin"):
+            with open(os.path.join("tempdir", name), "wb") as f:
+                if name.endswith(".bin"):
+                    f.write(os.urandom(100000))
+                else:
+                    f.write(b"temp file here\n" * 1000)
+        policy = arclib.CompressionPolicy("bzip2", 5)
+        choose = lambda n: policy.choose(os.path.join("tempdir", n))
+        test.assertTrue((zipfile.ZIP_STORED, None) == choose("temp.jpg"))
+        test.assertTrue((zipfile.ZIP_STORED, None) == choose("temp.GZ"))
+        test.assertTrue((zipfile.ZIP_BZIP2, 5) == choose("temp.txt"))
+        test.assertTrue((zipfile.ZIP_BZIP2, 5) == choose("temp.bin"))
+
+        # Incompressible files are only stored when sampled.
+        policy.sample = True
+        test.assertTrue((zipfile.ZIP_STORED, None) == choose("temp.bin"))
+        test.assertTrue((zipfile.ZIP_BZIP2, 5) == choose("temp.txt"))
+        policy = arclib.CompressionPolicy("store")
+        test.assertTrue((zipfile.ZIP_STORED, None) == choose("temp.txt"))
+
+    def testcase3(test):
+        """Checks that an unknown compression method or a bad level fails the
+        creation before an archive is written."""
+        for method, level in (("zip9", None), ("deflate", 12), ("bzip2", 0)):
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/src")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = "temp"
+            arcctr.ts_style = "none"
+            arcctr.policy.method = method
+            arcctr.policy.level = level
+            test.assertFalse(arcctr.create_archive())
+            test.assertTrue(arcctr.errmsg)
+            test.assertFalse(os.path.exists("tempdir/temp.zip"))
+
+    def testcase4(test):
+        """Checks that an archive of a batch failing with an unexpected error
+        is closed and removed, and that the batch continues."""
+        def on_progress(progress):
+            if "compress" == progress.phase and progress.files_done >= 2:
+                raise RuntimeError("temp error")
+        def creator(name, resume=False):
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/src")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = name
+            arcctr.ts_style = "none"
+            arcctr.resume = resume
+            return arcctr
+        batch = arcmgr.ArcBatch()
+        for arcctr in (creator("temp1"), creator("temp2"), creator("temp3", True)):
+            batch.add(arcctr)
+        batch.arcctrs[0].on_progress = on_progress
+        batch.arcctrs[2].on_progress = on_progress
+        results = list(batch.run())
+        test.assertTrue([False, True, False] == [ok for _, ok in results])
+        test.assertTrue("temp error" in batch.arcctrs[0].errmsg)
+        for arcctr in batch.arcctrs:
+            test.assertTrue(None == arcctr.arc.zfile.fp)
+            test.assertTrue(None == arcctr.journal)
+        test.assertFalse(os.path.exists("tempdir/temp1.zip"))
+        test.assertTrue(None == describe("tempdir/temp2.zip")[0])
+
+        # A journaled archive is kept and can be resumed.
+        test.assertTrue(os.path.exists(batch.arcctrs[2].journal_path()))
+        arcctr = creator("temp3", True)
+        test.assertTrue(arcctr.create_archive())
+        test.assertFalse(os.path.exists(arcctr.journal_path()))
+        test.assertTrue(describe("tempdir/temp2.zip")[1] == describe("tempdir/temp3.zip")[1])
+
+    def testcase5(test):
+        """Checks that the central directory is read as by ``zipfile``, also
+        from ZIP64 records and in small blocks."""
+        limit = zipfile.ZIP64_LIMIT
+        scan = arcscan.SCAN_SIZE
+        for zip64, size in ((False, scan), (True, scan), (False, 100)):
+            zipfile.ZIP64_LIMIT = 100 if zip64 else limit
+            arcscan.SCAN_SIZE = size
+            try:
+                make_zip("tempdir/temp.zip", 50, b"temp comment")
+            finally:
+                zipfile.ZIP64_LIMIT = limit
+                arcscan.SCAN_SIZE = scan
+            with open("tempdir/temp.zip", "rb") as fo:
+                data = fo.read()
+                test.assertTrue(zip64 == (b"PK\x06\x06" in data))
+                cdoffset, cdsize, comment = arcscan.find_cdir(fo)
+                test.assertTrue(b"temp comment" == comment)
+                entries = list(arcscan.iter_cdir(fo, cdoffset, cdsize))
+            with zipfile.ZipFile("tempdir/temp.zip") as zf:
+                test.assertTrue(zf.start_dir == cdoffset)
+                expected = [(i.filename, i.CRC, i.compress_size, i.file_size,
+                        i.header_offset, i.date_time) for i in zf.infolist()]
+            test.assertTrue(expected == [(e.name, e.crc, e.compress_size,
+                    e.file_size, e.header_offset, e.date_time) for e in entries])
+
+        with open("tempdir/temp.zip", "wb") as fo:
+            fo.write(b"temp file here")
+        with open("tempdir/temp.zip", "rb") as fo:
+            test.assertRaises(zipfile.BadZipFile, arcscan.find_cdir, fo)
+
+    def testcase6(test):
+        """Checks that a member is found through a hint and that a stale or
+        bad hint falls back to searching the central directory."""
+        names = [arclib.LOGNAME, "dir/temp.log"]
+        offset = make_zip("tempdir/temp.zip", 400)
+        for comment in (arcscan.format_hint(offset), arcscan.format_hint(0),
+                arcscan.format_hint(10 ** 9), b"archint:temp", b""):
+            with open("tempdir/temp.zip", "r+b") as fo:
+                with zipfile.ZipFile(fo, "a") as zf:
+                    zf.comment = comment
+                fo.seek(0)
+                for size in (arcscan.SCAN_SIZE, 100):
+                    arcscan.SCAN_SIZE, scan = size, arcscan.SCAN_SIZE
+                    try:
+                        entry = arcscan.find_member(fo, names)
+                        other = arcscan.find_member(fo, ["temp.txt", names[1]])
+                        missing = arcscan.find_member(fo, ["temp.txt"])
+                    finally:
+                        arcscan.SCAN_SIZE = scan
+                    test.assertTrue(arclib.LOGNAME == entry.name)
+                    test.assertTrue(offset == entry.header_offset)
+                    test.assertTrue(b"temp log here" == arcscan.read_member(fo, entry))
+                    test.assertTrue("dir/temp.log" == other.name)
+                    test.assertTrue(None == missing)
+
+    def testcase7(test):
+        """Checks that logs are read in bulk in the given order."""
+        paths = []
+        for i in range(5):
+            paths.append("tempdir/temp%d.zip" % i)
+            make_zip(paths[-1], i)
+        paths.insert(2, "tempdir/none.zip")
+        results = list(arclib.read_logs(paths, jobs=3))
+        test.assertTrue(paths == [p for p, _ in results])
+        for path, log in results:
+            if "tempdir/none.zip" == path:
+                test.assertTrue(isinstance(log, OSError))
+            else:
+                test.assertTrue(b"temp log here" == log)
+
+    def testcase8(test):
+        """Checks that archives are recorded in the catalog and found by their
+        members and logs, also with deduplicated members."""
+        os.mkdir("tempdir/arcs")
+        make_zip("tempdir/arcs/temp1.zip", 3)
+        with zipfile.ZipFile("tempdir/arcs/temp2.zip", "w") as zf:
+            zf.writestr("temp.txt", "temp file here")
+            zf.writestr(arclib.LOGNAME, "temp other log here")
+            # One reference has lost the member holding its content.
+            zf.writestr(arclib.DEDUP_INDEX, json.dumps(
+                    {"copy.txt": "temp.txt", "lost.txt": "none.txt"}))
+        with open("tempdir/arcs/temp3.zip", "w") as f:
+            f.write("temp file here")
+
+        catalog = arccatalog.Catalog("tempdir/temp.db")
+        try:
+            updated, failed = catalog.crawl(["tempdir/arcs"])
+            test.assertTrue(2 == len(updated))
+            test.assertTrue(["temp3.zip"] == [os.path.basename(p) for p, _ in failed])
+            found = catalog.find_members("*.txt")
+            # Three files and a log, then a file, its copy and a log.
+            test.assertTrue(7 == len(found))
+            copy = [m for m in found if m[1] in ("temp.txt", "copy.txt")]
+            test.assertTrue(2 == len(copy) and copy[0][2:] == copy[1][2:])
+            test.assertFalse(catalog.find_members("lost.txt"))
+            test.assertTrue(4 == len(catalog.find_members("dir/*")))
+            test.assertTrue(2 == len(catalog.search_logs("log")))
+            query = '"other log"' if catalog.fts else "other log"
+            result = catalog.search_logs(query)
+            test.assertTrue(["temp2.zip"] == [os.path.basename(r[0]) for r in result])
+
+            # Unchanged archives are not read again and removed ones dropped.
+            os.remove("tempdir/arcs/temp1.zip")
+            updated, _ = catalog.crawl(["tempdir/arcs"])
+            test.assertFalse(updated)
+            test.assertFalse(catalog.find_members("dir/*"))
+            test.assertTrue(1 == len(catalog.search_logs("log")))
+
+            # Logs are also searched without a full-text index.
+            catalog.fts = False
+            result = catalog.search_logs("other log")
+            test.assertTrue(["temp2.zip"] == [os.path.basename(r[0]) for r in result])
+        finally:
+            catalog.close()
+
+    def testcase9(test):
+        """Checks the deletion of overlapping targets, of directories that
+        gained a file after the walk and of targets to keep."""
+        src = os.path.abspath("tempdir/src")
+        sub = os.path.join(src, "sub")
+        for jobs in (1, 4):
+            # A directory together with some of its contents is deleted once.
+            arctargets, _ = arclib.convert_sys2arc([src, sub,
+                    os.path.join(sub, "temp1.bin")])
+            test.assertFalse(arclib.delete_from_filesys(arctargets, jobs=jobs))
+            test.assertFalse(os.path.exists(src))
+            make_files(src)
+
+        # A file created after the walk fails its directories but is kept.
+        arctargets, _ = arclib.convert_sys2arc([src])
+        with open(os.path.join(sub, "new.txt"), "w") as f:
+            f.write("temp file here")
+        failed = arclib.delete_from_filesys(arctargets)
+        test.assertTrue([sub, src] == [f.path for f in failed])
+        for f in failed:
+            test.assertTrue(isinstance(f, arclib.DeleteFailure))
+            test.assertTrue(f.error.errno in (errno.ENOTEMPTY, errno.EEXIST))
+        test.assertTrue(["new.txt"] == os.listdir(sub))
+        test.assertTrue(["sub"] == os.listdir(src))
+        shutil.rmtree(src)
+        make_files(src)
+
+        # A target to keep fails only its directories, unless also listed
+        # by a target not kept.
+        arctargets, _ = arclib.convert_sys2arc([src])
+        keep = [a for a in arctargets if a.syspath.endswith("temp1.bin")]
+        failed = arclib.delete_from_filesys(arctargets, keep)
+        test.assertTrue([sub, src] == [f.path for f in failed])
+        test.assertTrue(["temp1.bin"] == os.listdir(sub))
+        arctargets += arclib.convert_sys2arc([src])[0]
+        test.assertFalse(arclib.delete_from_filesys(arctargets, keep))
+        test.assertFalse(os.path.exists(src))
+
+    def testcase10(test):
+        """Checks that an interrupted creation is only resumed with the options
+        it was started with."""
+        def on_progress(progress):
+            if "compress" == progress.phase and progress.files_done >= 4:
+                raise RuntimeError("temp error")
+        def creator():
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/src")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = "temp"
+            arcctr.ts_style = "none"
+            arcctr.resume = True
+            return arcctr
+        arcctr = creator()
+        arcctr.on_progress = on_progress
+        test.assertRaises(RuntimeError, arcctr.create_archive)
+        journal = arcctr.journal_path()
+        size = os.path.getsize("tempdir/temp.zip")
+
+        for name, value in (("method", "bzip2"), ("level", 9), ("flatten", True),
+                ("exclude", ["*.jpg"]), ("dedup", True)):
+            arcctr = creator()
+            if name in ("method", "level"):
+                setattr(arcctr.policy, name, value)
+            else:
+                setattr(arcctr, name, value)
+            test.assertFalse(arcctr.create_archive())
+            test.assertTrue("other options" in arcctr.errmsg)
+            test.assertTrue(os.path.exists(journal))
+            test.assertTrue(size == os.path.getsize("tempdir/temp.zip"))
+
+        arcctr = creator()
+        test.assertTrue(arcctr.create_archive())
+        test.assertFalse(os.path.exists(journal))
+        arcctr = creator()
+        arcctr.name = "full"
+        test.assertTrue(arcctr.create_archive())
+        members = lambda p: [m for m in describe(p)[1] if m[0] != arclib.LOGNAME]
+        test.assertTrue(members("tempdir/full.zip") == members("tempdir/temp.zip"))
+
+    def testcase11(test):
+        """Checks that a target that cannot be read, from the start or partway,
+        fails the creation and leaves no member behind."""
+        class FailingReader(arclib.SourceReader):
+            def copy_from(self, fi, write):
+                def fail(chunk):
+                    write(chunk)
+                    if fi.name.endswith("temp1.bin"):
+                        raise OSError(errno.EIO, "temp error")
+                return arclib.SourceReader.copy_from(self, fi, fail)
+        reader = FailingReader(chunk_size=1024)
+        path = os.path.abspath("tempdir/src/sub/temp1.bin")
+        test.assertTrue(os.path.getsize(path) > 1024)
+
+        # The archive stays valid without the member.
+        arctargets, _ = arclib.convert_sys2arc([os.path.abspath("tempdir/src")])
+        arc = arclib.Archive("tempdir/temp.zip")
+        arc.reader = reader
+        arc.create()
+        for a in arctargets:
+            if a.syspath == path:
+                test.assertRaises(OSError, arc.add, a)
+            else:
+                test.assertTrue(arc.add(a))
+        arc.close()
+        test_, members = describe("tempdir/temp.zip")
+        test.assertTrue(None == test_)
+        test.assertTrue(len([a for a in arctargets if a.zippath]) - 1 == len(members))
+        test.assertFalse([m for m in members if m[0].endswith("temp1.bin")])
+        os.remove("tempdir/temp.zip")
+
+        def replace(progress):
+            # The file turns into a directory once walked.
+            if "compress" == progress.phase and os.path.isfile(path):
+                os.remove(path)
+                os.mkdir(path)
+        for jobs, volume_size, failing in ((1, 0, True), (4, 0, True),
+                (2, 10 ** 6, True), (1, 0, False), (4, 0, False), (2, 10 ** 6, False)):
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/src")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = "temp"
+            arcctr.ts_style = "none"
+            arcctr.jobs = jobs
+            arcctr.volume_size = volume_size
+            if failing:
+                arcctr.reader = reader
+            else:
+                arcctr.on_progress = replace
+            test.assertFalse(arcctr.create_archive())
+            test.assertTrue("could not be created" in arcctr.errmsg)
+            test.assertTrue(["src"] == os.listdir("tempdir"))
+            if not failing:
+                os.rmdir(path)
+                make_files("tempdir/other", seed=1)
+                os.rename("tempdir/other/sub/temp1.bin", path)
+                shutil.rmtree("tempdir/other")
+
+    def testcase12(test):
+        """Checks that archives are the same whatever the read size and whether
+        files are memory mapped or dropped from the cache."""
+        create("tempdir/default.zip", "tempdir/src")
+        expected = describe("tempdir/default.zip")
+        for chunk_size in (1, 4096, 10 ** 7):
+            for use_mmap in (False, True):
+                for jobs in (1, 4):
+                    reader = arclib.SourceReader(chunk_size, use_mmap, use_mmap)
+                    create("tempdir/temp.zip", "tempdir/src", jobs, reader)
+                    test.assertTrue(expected == describe("tempdir/temp.zip"))
+
+    def testcase13(test):
+        """Checks that volumes are packed within the volume size, each with its
+        log plus a master log, that too small a size is rejected and that an
+        oversize file gets a volume of its own with a warning."""
+        os.mkdir("tempdir/vol")
+        for i in range(9):
+            with open("tempdir/vol/temp%d.bin" % i, "wb") as f:
+                f.write(os.urandom(60000))
+        with open("tempdir/vol/big.bin", "wb") as f:
+            f.write(os.urandom(300000))
+        def creator(volume_size, logtxt="temp log here"):
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/vol")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = "temp"
+            arcctr.ts_style = "none"
+            arcctr.logtxt = logtxt
+            arcctr.volume_size = volume_size
+            arcctr.jobs = 2
+            return arcctr
+
+        # Too small a size is rejected before anything is written.
+        for volume_size, logtxt in ((128 * 1024, ""),
+                (arcmgr.MIN_VOLUME_SIZE - 1, "temp log here"),
+                (arcmgr.MIN_VOLUME_SIZE, "x" * 100000)):
+            arcctr = creator(volume_size, logtxt)
+            test.assertFalse(arcctr.create_archive())
+            test.assertTrue(arcctr.errmsg.startswith("Volume size must be at least"))
+            test.assertTrue(sorted(["src", "vol"]) == sorted(os.listdir("tempdir")))
+
+        arcctr = creator(arcmgr.MIN_VOLUME_SIZE)
+        test.assertTrue(arcctr.create_archive())
+        test.assertTrue(4 == len(arcctr.volumes))
+        test.assertTrue(any("exceed the volume size" in w for w in arcctr.warnmsgs))
+        with open(arcctr.volume_log, encoding="utf-8") as f:
+            master = f.read()
+        test.assertTrue("temp log here" in master)
+        seen = []
+        for num, path in enumerate(arcctr.volumes):
+            result, members = describe(path)
+            test.assertTrue(None == result)
+            names = [m[0] for m in members if m[0] != arclib.LOGNAME]
+            test.assertTrue(names)
+            if "vol/big.bin" in names:
+                test.assertTrue(["vol/big.bin"] == names)
+            else:
+                test.assertTrue(os.path.getsize(path) <= arcmgr.MIN_VOLUME_SIZE)
+            log = dict((m[0], m[4]) for m in members)[arclib.LOGNAME]
+            test.assertTrue(b"temp log here" in log)
+            test.assertTrue(b"Volume %d of 4" % (num + 1) in log)
+            # The master log lists the members of the volume in its section.
+            section = master.split(os.path.basename(path))[1].split(".zip")[0]
+            for name in names:
+                test.assertTrue("* %s\n" % name in section)
+            seen += names
+        expected = ["vol/"] + ["vol/temp%d.bin" % i for i in range(9)] + ["vol/big.bin"]
+        test.assertTrue(sorted(expected) == sorted(seen))
+
+    def testcase14(test):
+        """Checks that the walk cache reuses the listings of unchanged
+        directories only, skips recently changed ones and evicts the least
+        recently used."""
+        def age(path, ns=None):
+            # Listings changed within the last seconds are not cached.
+            ns = ns or time.time_ns() - 60 * 10 ** 9
+            os.utime(path, ns=(ns, ns))
+            return ns
+        dirs = []
+        for name in ("a", "b", "c"):
+            dirs.append(os.path.abspath(os.path.join("tempdir", name)))
+            os.mkdir(dirs[-1])
+            for i in range(3):
+                with open(os.path.join(dirs[-1], "temp%d.txt" % i), "w") as f:
+                    f.write("temp file here")
+            age(dirs[-1])
+        a, b, c = dirs
+
+        cache = arclib.WalkCache(max_entries=6)
+        listed = sorted(cache.listing(a))
+        test.assertTrue(3 == len(listed) and (0, 1) == (cache.hits, cache.misses))
+        test.assertTrue(listed == sorted(cache.listing(a)))
+        test.assertTrue((1, 1) == (cache.hits, cache.misses))
+
+        # A changed directory is read again, but not cached while recent.
+        with open(os.path.join(a, "new.txt"), "w") as f:
+            f.write("temp file here")
+        test.assertTrue(4 == len(cache.listing(a)))
+        test.assertFalse(a in cache.dirs)
+        cache.listing(a)
+        test.assertTrue((1, 3) == (cache.hits, cache.misses))
+        ns = age(a)
+        cache.listing(a)
+        cache.listing(a)
+        test.assertTrue((2, 4) == (cache.hits, cache.misses))
+
+        # A directory replaced by another with the same time is read again.
+        os.rename(a, a + "old")
+        os.mkdir(a)
+        age(a, ns)
+        test.assertFalse(cache.listing(a))
+        test.assertTrue((2, 5) == (cache.hits, cache.misses))
+        shutil.rmtree(a)
+        os.rename(a + "old", a)
+        cache.listing(a)
+
+        # The least recently used listing is evicted past the bound.
+        cache.listing(b)
+        test.assertTrue([b] == list(cache.dirs))
+        cache = arclib.WalkCache(os.path.abspath("tempdir/temp.json"), 7)
+        for path in (a, b, a, c):
+            cache.listing(path)
+        test.assertTrue([a, c] == list(cache.dirs))
+        test.assertTrue(7 == cache.size)
+        cache.save()
+        cache = arclib.WalkCache(cache.path, 7)
+        test.assertTrue(cache.load())
+        cache.listing(c)
+        cache.listing(b)
+        test.assertTrue((1, 1) == (cache.hits, cache.misses))
+
+    def testcase15(test):
+        """Checks that a creation using the walk cache reuses listings and
+        archives the same members."""
+        for root, subdirs, _ in os.walk("tempdir/src"):
+            for d in subdirs + [""]:
+                path = os.path.join(root, d)
+                ns = time.time_ns() - 60 * 10 ** 9
+                os.utime(path, ns=(ns, ns))
+        names = []
+        for i in range(2):
+            arcctr = arcmgr.ArcCreator()
+            arcctr.systargets = [os.path.abspath("tempdir/src")]
+            arcctr.outdir = "tempdir"
+            arcctr.name = "temp%d" % i
+            arcctr.ts_style = "none"
+            arcctr.walk_cache = "tempdir/temp.json"
+            test.assertTrue(arcctr.create_archive())
+            test.assertTrue((i * 2, 2 - i * 2) == (arcctr.stats['walk_cache_hits'],
+                    arcctr.stats['walk_cache_misses']))
+            names.append([m[0] for m in describe("tempdir/temp%d.zip" % i)[1]])
+        test.assertTrue(names[0] == names[1])
+
+##==============================================================#
+## SECTION: Main Body                                           #
+##==============================================================#
+
+if __name__ == '__main__':
+    unittest.main()